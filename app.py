@@ -12,10 +12,13 @@ from fastapi.staticfiles import StaticFiles
 import config
 from functions.routes import router
 from functions.openai_api import openai_api_router
+from functions.timing import server_timing_middleware
+from functions.warmup import parse_preload
 
 # --- FastAPI Setup ---
 app = FastAPI()
 app.mount("/static", StaticFiles(directory=config.STATIC_DIR), name="static")
+app.middleware("http")(server_timing_middleware)
 
 app.include_router(router)
 app.include_router(openai_api_router)
@@ -39,6 +42,8 @@ if __name__ == "__main__":
     parser.add_argument("--app", action="store_true", help="Launch as a desktop app using a webview")
     parser.add_argument("--debug", action="store_true", help="Toggle various debug features")
     parser.add_argument("--device", default="cpu", help="Use specific device for inference with AI models")
+    parser.add_argument("--model-memory", type=int, default=None, help="RAM budget in MB for resident TTS models (0 for unlimited)")
+    parser.add_argument("--preload", default=None, help="Models to load in the background once the server is up, as engine:voice,... (progress at /ready)")
     args = parser.parse_args()
 
     host = args.host
@@ -47,6 +52,16 @@ if __name__ == "__main__":
     if args.device == 'cuda':
         config.DEVICE = 'cuda'
 
+    if args.model_memory is not None:
+        config.MODEL_MEMORY_BUDGET_MB = args.model_memory
+
+    if args.preload is not None:
+        try:
+            parse_preload(args.preload)
+        except ValueError as e:
+            parser.error(f"--preload: {e}")
+        config.PRELOAD = args.preload
+
     if not args.app:
         print("Starting OpenWebTTS server...")
         print(f"Access the UI at http://{host}:{port}")
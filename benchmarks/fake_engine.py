@@ -0,0 +1,61 @@
+"""
+Deterministic stand-in engine for the synthesis benchmarks.
+
+Behaves like a local model without needing one: the first render in a
+process pays a fixed load time, every render takes a fixed time per
+character, and the audio is seeded from the text, so the same input
+always gives the same output. It renders through save_audio like the real
+engines, so post-processing is part of what gets measured.
+"""
+
+import hashlib
+import threading
+import time
+
+import numpy as np
+
+from functions.audio import save_audio
+
+ENGINE = "fake"
+SAMPLE_RATE = 24000
+
+class FakeEngine:
+    def __init__(self, load_seconds: float = 1.0, ms_per_char: float = 2.0, seconds_per_char: float = 0.06):
+        self.load_seconds = load_seconds
+        self.ms_per_char = ms_per_char
+        # Speech length per character, about 15 characters a second.
+        self.seconds_per_char = seconds_per_char
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if not self._loaded:
+                time.sleep(self.load_seconds)
+                self._loaded = True
+
+    def process_audio(self, text: str, output_path: str, speed: float = 1.0):
+        self._load()
+        time.sleep(len(text) * self.ms_per_char / 1000)
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        rng = np.random.default_rng(seed)
+        length = max(1, int(len(text) * self.seconds_per_char * SAMPLE_RATE))
+        t = np.arange(length) / SAMPLE_RATE
+        # Noise under a syllable-rate envelope, roughly speech-like in level and dynamics.
+        envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None)
+        audio = 0.2 * envelope * rng.standard_normal(length)
+        save_audio(output_path, audio, SAMPLE_RATE, speed=speed)
+
+def install(engine: FakeEngine):
+    """Routes requests for the "fake" engine to `engine`; other engines are unaffected."""
+    from functions import routes
+
+    run_engine = routes._run_engine
+
+    def _run_engine(request, output_path):
+        if request.engine == ENGINE:
+            engine.process_audio(request.text, output_path, request.speed)
+        else:
+            run_engine(request, output_path)
+
+    routes._run_engine = _run_engine
@@ -0,0 +1,105 @@
+"""
+Local stand-in for the Google Cloud Text-to-Speech REST API.
+
+Answers `voices` and `text:synthesize` with a few fixed voices and a tone
+whose length follows the text, and counts the requests it serves. Point the
+server at it to exercise the Gemini engine without credentials or network:
+
+    python -m benchmarks.fake_google_tts --port 8089
+    OPENWEBTTS_GEMINI_ENDPOINT=http://127.0.0.1:8089 python app.py
+
+`GET /stats` returns the request counts.
+"""
+
+import argparse
+import base64
+import io
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import soundfile as sf
+
+SAMPLE_RATE = 24000
+
+VOICES = [
+    {"languageCodes": ["en-US"], "name": "en-US-Wavenet-D", "ssmlGender": "MALE", "naturalSampleRateHertz": SAMPLE_RATE},
+    {"languageCodes": ["en-US"], "name": "en-US-Wavenet-F", "ssmlGender": "FEMALE", "naturalSampleRateHertz": SAMPLE_RATE},
+    {"languageCodes": ["en-GB"], "name": "en-GB-Studio-B", "ssmlGender": "MALE", "naturalSampleRateHertz": SAMPLE_RATE},
+]
+
+def _tone(text: str, speed: float) -> bytes:
+    """About 60 ms per character at normal speed, as a LINEAR16 WAV like the API returns."""
+    seconds = max(0.2, 0.06 * len(text) / speed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    buffer = io.BytesIO()
+    sf.write(buffer, 0.3 * np.sin(2 * np.pi * 220 * t), SAMPLE_RATE, subtype="PCM_16", format="WAV")
+    return buffer.getvalue()
+
+class FakeTextToSpeech(BaseHTTPRequestHandler):
+    counts = {"voices": 0, "synthesize": 0}
+    latency = 0.0
+    lock = threading.Lock()
+
+    def _count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def _reply(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/v1/voices":
+            self._count("voices")
+            self._reply({"voices": VOICES})
+        elif path == "/stats":
+            with self.lock:
+                self._reply(dict(self.counts))
+        else:
+            self._reply({"error": {"code": 404, "message": "Not found"}}, 404)
+
+    def do_POST(self):
+        if self.path.split("?")[0] != "/v1/text:synthesize":
+            self._reply({"error": {"code": 404, "message": "Not found"}}, 404)
+            return
+        self._count("synthesize")
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        text = request.get("input", {}).get("text", "")
+        speed = float(request.get("audioConfig", {}).get("speakingRate") or 1.0)
+        time.sleep(self.latency)
+        self._reply({"audioContent": base64.b64encode(_tone(text, speed)).decode()})
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(host: str = "127.0.0.1", port: int = 0, latency: float = 0.0) -> ThreadingHTTPServer:
+    """Starts the stand-in on a background thread and returns the server (see `server_address`)."""
+    FakeTextToSpeech.latency = latency
+    server = ThreadingHTTPServer((host, port), FakeTextToSpeech)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every synthesis request.")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.latency)
+    print(f"Fake Google TTS on http://{args.host}:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Per-chunk post-processing cost: the NumPy chain in functions/audio.py
+against the old path (write the WAV, re-read it with pydub, normalize,
+write it again). First checks that time_stretch() keeps a tone's level at
+every speed the API accepts, and exits with status 1 if it doesn't.
+
+Run from the repository root:
+
+    python -m benchmarks.postprocess --chunks 50 --seconds 12
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import soundfile as sf
+
+from functions.audio import save_audio, time_stretch
+
+# Speeds the API accepts, and how far a stretched tone's RMS may drift.
+STRETCH_SPEEDS = (0.25, 0.5, 0.75, 1.5, 2.0, 4.0)
+STRETCH_RMS_TOLERANCE = 0.1
+
+def _speech_like(seconds: float, sample_rate: int, rng) -> np.ndarray:
+    """Noise shaped by a syllable-rate envelope, with pauses, at a speech-like level."""
+    length = int(seconds * sample_rate)
+    t = np.arange(length) / sample_rate
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) * (rng.random(length // sample_rate + 1).repeat(sample_rate)[:length] > 0.2)
+    return (0.2 * envelope * rng.standard_normal(length)).astype(np.float32)
+
+def _legacy(path: str, audio: np.ndarray, sample_rate: int):
+    from pydub import AudioSegment, effects
+    sf.write(path, audio, sample_rate)
+    rawsound = AudioSegment.from_file(path, "wav")
+    effects.compress_dynamic_range(rawsound)
+    effects.normalize(rawsound).export(path, format="wav")
+
+def _check_time_stretch(sample_rate: int) -> bool:
+    """Whether a 220 Hz tone keeps its RMS within tolerance at every speed."""
+    t = np.arange(2 * sample_rate) / sample_rate
+    tone = (0.5 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+    rms = lambda audio: float(np.sqrt(np.mean(audio ** 2)))
+    ok = True
+    for speed in STRETCH_SPEEDS:
+        ratio = rms(time_stretch(tone, sample_rate, speed)) / rms(tone)
+        passed = abs(ratio - 1) <= STRETCH_RMS_TOLERANCE
+        ok &= passed
+        print(f"time_stretch x{speed:<5g} RMS ratio {ratio:.3f}{'' if passed else '  FAILED'}")
+    return ok
+
+def _time(fn, chunks, path, sample_rate):
+    timings = []
+    for audio in chunks:
+        start = time.perf_counter()
+        fn(path, audio, sample_rate)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+def _report(name, timings):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{name:<10} mean {statistics.mean(timings):8.2f} ms   median {statistics.median(timings):8.2f} ms   p95 {p95:8.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=30)
+    parser.add_argument("--seconds", type=float, default=12.0, help="Length of each chunk.")
+    parser.add_argument("--sample-rate", type=int, default=24000)
+    args = parser.parse_args()
+
+    if not _check_time_stretch(args.sample_rate):
+        sys.exit(1)
+
+    rng = np.random.default_rng(0)
+    chunks = [_speech_like(args.seconds, args.sample_rate, rng) for _ in range(args.chunks)]
+    path = os.path.join(tempfile.mkdtemp(), "chunk.wav")
+
+    print(f"{args.chunks} chunks of {args.seconds:g} s at {args.sample_rate} Hz")
+    _report("numpy", _time(save_audio, chunks, path, args.sample_rate))
+    try:
+        _report("pydub", _time(_legacy, chunks, path, args.sample_rate))
+    except ImportError:
+        print("pydub      not installed, skipping the old path")
+    os.unlink(path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Server import time, checked against a budget.
+
+Imports app.py in a fresh interpreter with -X importtime, reports the
+slowest imports, and fails if the import takes longer than --budget
+seconds or pulls in a heavy library that should only load on first use
+(torch, whisper, the TTS engines, the document and OCR libraries).
+It exits with status 1 on either, so it can gate a build. The time budget
+depends on the machine; --budget 0 checks only the imports, which is
+deterministic. Run from the repository root:
+
+    python -m benchmarks.startup --budget 2.0
+    python -m benchmarks.startup --budget 0
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+# Top-level modules that must not be imported just by starting the server.
+LAZY_MODULES = (
+    "torch", "whisper", "TTS", "kokoro", "kittentts", "chatterbox", "piper", "onnxruntime",
+    "fitz", "docx", "ebooklib", "pytesseract", "pdf2image", "bs4", "langdetect",
+    "google.cloud.texttospeech",
+)
+
+def _parse_importtime(stderr: str):
+    """Returns {module: cumulative seconds} from -X importtime output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if cumulative.isdigit():
+            modules[name] = int(cumulative) / 1_000_000
+    return modules
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget", type=float, default=2.0, help="Seconds importing app.py may take; 0 to check only the imports.")
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to list.")
+    parser.add_argument("--output", help="Write results as JSON to this file.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if completed.returncode != 0:
+        print(completed.stderr[-2000:], file=sys.stderr)
+        sys.exit("Importing app.py failed.")
+
+    modules = _parse_importtime(completed.stderr)
+    roots = [lazy for lazy in LAZY_MODULES if any(m == lazy or m.startswith(f"{lazy}.") for m in modules)]
+
+    print(f"import app: {wall:.2f} s" + (f" (budget {args.budget:.2f} s)" if args.budget > 0 else ""))
+    for name, seconds in sorted(modules.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {seconds * 1000:9.1f} ms  {name}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"seconds": round(wall, 3), "budget": args.budget, "eager_heavy_imports": roots, "modules": modules}, f, indent=2)
+
+    failed = False
+    if roots:
+        print(f"Imported at startup but should load on first use: {', '.join(roots)}")
+        failed = True
+    if args.budget > 0 and wall > args.budget:
+        print(f"Over budget by {wall - args.budget:.2f} s")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Replays a recording through the live transcription WebSocket.
+
+Sends the file to /api/speech_to_text/stream in --frame-ms frames at the
+pace of a microphone (or faster with --speed), prints the partial and
+final transcripts as they arrive, and reports how far each final lagged
+behind the end of its utterance. Start the server first, then from the
+repository root:
+
+    python -m benchmarks.stream_transcription speech.wav
+    python -m benchmarks.stream_transcription speech.wav --format opus --speed 0 --output live.json
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import subprocess
+import sys
+import time
+from urllib.parse import urlencode
+
+import soundfile as sf
+
+def _pcm_frames(path: str, frame_ms: float):
+    """The file as 16-bit mono PCM frames, plus its sample rate and duration."""
+    audio, sample_rate = sf.read(path, dtype="int16", always_2d=True)
+    pcm = audio.mean(axis=1).astype("<i2").tobytes()
+    size = max(2, int(sample_rate * frame_ms / 1000) * 2)
+    return [pcm[i:i + size] for i in range(0, len(pcm), size)], sample_rate, len(audio) / sample_rate
+
+def _opus_frames(path: str, frame_ms: float, duration: float):
+    """The file encoded to Ogg Opus by ffmpeg, cut into as many pieces as PCM frames would be."""
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", path, "-ac", "1", "-c:a", "libopus", "-f", "ogg", "pipe:1"],
+        stdout=subprocess.PIPE,
+        check=True,
+    )
+    count = max(1, int(duration * 1000 / frame_ms))
+    size = max(1, -(-len(result.stdout) // count))
+    return [result.stdout[i:i + size] for i in range(0, len(result.stdout), size)]
+
+async def replay(args):
+    import websockets
+
+    frames, sample_rate, duration = _pcm_frames(args.file, args.frame_ms)
+    query = {"format": args.format, "sample_rate": sample_rate}
+    if args.format == "opus":
+        frames = _opus_frames(args.file, args.frame_ms, duration)
+        query.pop("sample_rate")
+    if args.model:
+        query["model"] = args.model
+    if args.language:
+        query["language"] = args.language
+    interval = args.frame_ms / 1000 / args.speed if args.speed > 0 else 0.0
+
+    messages = []
+    async with websockets.connect(f"{args.url}?{urlencode(query)}", max_size=None) as ws:
+        ready = json.loads(await ws.recv())
+        if ready.get("type") != "ready":
+            sys.exit(f"Server refused the stream: {ready.get('detail', ready)}")
+        print(f"Streaming {duration:.1f} s of audio to {ready['model']} as {args.format}")
+        start = time.perf_counter()
+
+        async def send():
+            for i, frame in enumerate(frames):
+                # Paced against the start, so send delays don't accumulate.
+                delay = start + i * interval - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await ws.send(frame)
+            await ws.send(json.dumps({"type": "stop"}))
+
+        sender = asyncio.create_task(send())
+        async for raw in ws:
+            message = json.loads(raw)
+            message["received"] = round(time.perf_counter() - start, 3)
+            messages.append(message)
+            if message["type"] == "partial":
+                print(f"  {message['received']:7.2f} s  ... {message['text']}")
+            elif message["type"] == "final":
+                print(f"  {message['received']:7.2f} s  [{message['start']:.1f}-{message['end']:.1f}] {message['text']}")
+            elif message["type"] == "error":
+                print(f"  {message['received']:7.2f} s  error: {message['detail']}")
+            elif message["type"] == "done":
+                break
+        await sender
+
+    finals = [m for m in messages if m["type"] == "final"]
+    partials = [m for m in messages if m["type"] == "partial"]
+    # How long after the utterance was spoken its final transcript arrived.
+    lags = [m["received"] - m["end"] / (args.speed if args.speed > 0 else float("inf")) for m in finals]
+    summary = {
+        "file": args.file,
+        "format": args.format,
+        "speed": args.speed,
+        "duration": round(duration, 2),
+        "finals": len(finals),
+        "partials": len(partials),
+        "first_partial_seconds": partials[0]["received"] if partials else None,
+        "final_lag_mean": round(statistics.mean(lags), 3) if lags else None,
+        "final_lag_max": round(max(lags), 3) if lags else None,
+        "total_seconds": messages[-1]["received"] if messages else None,
+        "text": " ".join(m["text"] for m in finals if m["text"]),
+    }
+    print(json.dumps({k: v for k, v in summary.items() if k != "text"}, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({**summary, "messages": messages}, f, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("file", help="Recording to replay (anything soundfile reads, e.g. WAV or FLAC).")
+    parser.add_argument("--url", default="ws://127.0.0.1:8000/api/speech_to_text/stream")
+    parser.add_argument("--format", choices=("pcm", "opus"), default="pcm")
+    parser.add_argument("--frame-ms", type=float, default=100.0, help="Audio per message, in milliseconds.")
+    parser.add_argument("--speed", type=float, default=1.0, help="Playback speed; 1 is real time, 0 as fast as possible.")
+    parser.add_argument("--model", help="Whisper model size; the server's default if not given.")
+    parser.add_argument("--language")
+    parser.add_argument("--output", help="Write the summary and every message as JSON to this file.")
+    asyncio.run(replay(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
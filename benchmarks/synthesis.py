@@ -0,0 +1,306 @@
+"""
+Synthesis latency, throughput and memory, per engine and chunk size.
+
+Each engine and chunk size runs in a fresh worker process, so the first
+render is a true cold start and peak RSS belongs to that engine alone.
+Workers render through _generate_audio_file and, with --http, through the
+/api/synthesize endpoint of a server started in the same process, with
+N concurrent clients. Audio goes to a scratch cache, never the real one.
+
+The default "fake" engine is deterministic and needs no models, so runs are
+comparable across machines and commits. Real engines are given as
+engine:voice. Run from the repository root:
+
+    python -m benchmarks.synthesis --output bench.json
+    python -m benchmarks.synthesis --engines fake,piper:en_US-lessac-medium --http --clients 1,4
+    python -m benchmarks.synthesis --baseline bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+# Words the benchmark texts are drawn from, so every run renders the same input.
+WORDS = (
+    "the quick reader turned another page while rain kept falling on the old "
+    "station roof and somewhere a train announced itself with a long low note "
+    "that carried across the empty platform into the quiet town beyond"
+).split()
+
+# Fake engine timings. Changing these invalidates stored baselines.
+FAKE_LOAD_SECONDS = 1.0
+FAKE_MS_PER_CHAR = 2.0
+
+# Metrics compared against a baseline; all of them are better when lower.
+COMPARED = ("cold_ms", "warm_ms.median", "warm_ms.p95", "rtf", "peak_rss_mb", "http.ttfa_ms.median")
+
+def make_text(chars: int, index: int) -> str:
+    """A deterministic passage of about `chars` characters, distinct for each index."""
+    rng = random.Random(chars * 100003 + index)
+    text = f"Passage {index}."
+    while True:
+        word = rng.choice(WORDS)
+        if len(text) + len(word) + 2 > chars:
+            return text + "."
+        text = f"{text} {word}"
+
+def _summary(values):
+    values = sorted(values)
+    if not values:
+        return None
+    return {
+        "mean": round(statistics.mean(values), 2),
+        "median": round(statistics.median(values), 2),
+        "p95": round(values[min(len(values) - 1, int(len(values) * 0.95))], 2),
+    }
+
+def _peak_rss_mb() -> float:
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def _scratch_data_dir() -> str:
+    """
+    A data directory that shares the real models, templates and static files
+    but has its own audio cache and index.
+    """
+    root = tempfile.mkdtemp(prefix="openwebtts-bench-")
+    for name in ("models", "templates"):
+        if os.path.exists(name):
+            os.symlink(os.path.abspath(name), os.path.join(root, name))
+    os.makedirs(os.path.join(root, "static"))
+    for name in os.listdir("static"):
+        if name not in ("audio", "audio_cache"):
+            os.symlink(os.path.abspath(os.path.join("static", name)), os.path.join(root, "static", name))
+    return root
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# --- Worker: runs in its own process for one engine and chunk size ---
+
+def _direct(engine: str, voice: str, chunks: list):
+    """Renders each chunk through _generate_audio_file; the first one is the cold start."""
+    import soundfile as sf
+    from functions.routes import SynthesizeRequest, _cache_path, _generate_audio_file
+
+    timings = []
+    rtfs = []
+    for text in chunks:
+        request = SynthesizeRequest(text=text, engine=engine, voice=voice)
+        output_path, _ = _cache_path(request)
+        start = time.perf_counter()
+        _generate_audio_file(request, output_path)
+        elapsed = time.perf_counter() - start
+        timings.append(elapsed * 1000)
+        rtfs.append(elapsed / sf.info(output_path).duration)
+    return timings, rtfs
+
+def _client(base_url: str, engine: str, voice: str, texts: list, results: list):
+    """One HTTP client: requests each text, waits for its job, then reads the audio."""
+    for text in texts:
+        start = time.perf_counter()
+        body = json.dumps({"text": text, "engine": engine, "voice": voice}).encode()
+        request = urllib.request.Request(f"{base_url}/api/synthesize", data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request) as response:
+            reply = json.load(response)
+        audio_url = reply["audio_url"]
+        while reply.get("status") not in ("ready", "failed"):
+            time.sleep(0.01)
+            with urllib.request.urlopen(f"{base_url}/api/jobs/{reply['job_id']}") as response:
+                reply = json.load(response)
+        if reply["status"] == "failed":
+            results.append(None)
+            continue
+        with urllib.request.urlopen(f"{base_url}{audio_url}") as response:
+            response.read(1)
+            first_audio = time.perf_counter() - start
+            response.read()
+        results.append((first_audio * 1000, (time.perf_counter() - start) * 1000))
+
+def _http(engine: str, voice: str, chars: int, clients: list, requests_per_client: int):
+    import uvicorn
+    from app import app
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    base_url = f"http://127.0.0.1:{port}"
+
+    report = {}
+    offset = 1000
+    try:
+        for count in clients:
+            results = []
+            threads = []
+            for c in range(count):
+                texts = [make_text(chars, offset + c * requests_per_client + i) for i in range(requests_per_client)]
+                threads.append(threading.Thread(target=_client, args=(base_url, engine, voice, texts, results)))
+            offset += count * requests_per_client
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            wall = time.perf_counter() - start
+            done = [r for r in results if r is not None]
+            report[str(count)] = {
+                "requests": len(results),
+                "failed": len(results) - len(done),
+                "ttfa_ms": _summary([r[0] for r in done]),
+                "latency_ms": _summary([r[1] for r in done]),
+                "throughput_rps": round(len(done) / wall, 3),
+            }
+    finally:
+        server.should_exit = True
+    return report
+
+def worker(args):
+    engine, _, voice = args.engine.partition(":")
+    voice = voice or "default"
+    if engine == "fake":
+        from benchmarks.fake_engine import FakeEngine, install
+        install(FakeEngine(FAKE_LOAD_SECONDS, FAKE_MS_PER_CHAR))
+
+    chunks = [make_text(args.chars, i) for i in range(args.repeats + 1)]
+    timings, rtfs = _direct(engine, voice, chunks)
+    result = {
+        "engine": engine,
+        "voice": voice,
+        "chunk_chars": args.chars,
+        "cold_ms": round(timings[0], 2),
+        "warm_ms": _summary(timings[1:]),
+        "rtf": round(statistics.median(rtfs[1:]), 4) if len(rtfs) > 1 else round(rtfs[0], 4),
+    }
+    if args.http:
+        result["http"] = _http(engine, voice, args.chars, args.clients, args.requests)
+    result["peak_rss_mb"] = _peak_rss_mb()
+    print(json.dumps(result))
+
+# --- Driver ---
+
+def _run_worker(engine: str, chars: int, args) -> dict:
+    data_dir = _scratch_data_dir()
+    command = [
+        sys.executable, "-m", "benchmarks.synthesis", "--worker",
+        "--engine", engine, "--chars", str(chars), "--repeats", str(args.repeats),
+        "--clients", ",".join(map(str, args.clients)), "--requests", str(args.requests),
+    ]
+    if args.http:
+        command.append("--http")
+    env = dict(os.environ, OPENWEBTTS_DATA_DIR=data_dir)
+    try:
+        completed = subprocess.run(command, env=env, capture_output=True, text=True)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    if completed.returncode != 0:
+        print(completed.stderr, file=sys.stderr)
+        lines = completed.stderr.strip().splitlines()
+        return {"engine": engine, "chunk_chars": chars, "error": lines[-1] if lines else "failed"}
+    # Engines print while loading; the result is the last line.
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def _metric(result: dict, name: str):
+    value = result
+    for part in name.split("."):
+        if not isinstance(value, dict):
+            return None
+        if part == "http":
+            # Compare HTTP numbers at the highest concurrency measured.
+            http = value.get("http") or {}
+            value = http[max(http, key=int)] if http else None
+        else:
+            value = value.get(part)
+    return value
+
+def compare(results: list, baseline: dict, tolerance: float) -> bool:
+    """Prints changes against a baseline and returns whether any metric regressed past `tolerance`."""
+    previous = {(r["engine"], r.get("voice"), r["chunk_chars"]): r for r in baseline["results"] if "error" not in r}
+    regressed = False
+    for result in results:
+        before = previous.get((result["engine"], result.get("voice"), result["chunk_chars"]))
+        if before is None or "error" in result:
+            continue
+        for name in COMPARED:
+            new, old = _metric(result, name), _metric(before, name)
+            if not new or not old:
+                continue
+            change = (new - old) / old
+            flag = "REGRESSED" if change > tolerance else ""
+            regressed = regressed or bool(flag)
+            print(f"{result['engine']:<10} {result['chunk_chars']:>5} chars  {name:<20} {old:>10.2f} -> {new:>10.2f}  {change:+7.1%} {flag}")
+    return regressed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--engines", default="fake", help="Comma-separated engine or engine:voice list.")
+    parser.add_argument("--chunk-sizes", default="100,200,400", help="Comma-separated chunk sizes in characters.")
+    parser.add_argument("--repeats", type=int, default=5, help="Warm renders after the cold one.")
+    parser.add_argument("--http", action="store_true", help="Also measure through the HTTP API.")
+    parser.add_argument("--clients", default="1,4", help="Comma-separated concurrent client counts for --http.")
+    parser.add_argument("--requests", type=int, default=3, help="Requests per client for --http.")
+    parser.add_argument("--output", help="Write results as JSON to this file.")
+    parser.add_argument("--baseline", help="Compare against results stored by an earlier --output.")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Relative increase counted as a regression.")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--engine", help=argparse.SUPPRESS)
+    parser.add_argument("--chars", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.clients = [int(c) for c in args.clients.split(",")]
+
+    if args.worker:
+        worker(args)
+        return
+
+    results = []
+    for engine in args.engines.split(","):
+        for chars in (int(c) for c in args.chunk_sizes.split(",")):
+            result = _run_worker(engine, chars, args)
+            results.append(result)
+            if "error" in result:
+                print(f"{engine:<10} {chars:>5} chars  failed: {result['error']}")
+                continue
+            warm = result["warm_ms"] or {}
+            print(f"{engine:<10} {chars:>5} chars  cold {result['cold_ms']:9.1f} ms  warm {warm.get('median', 0):8.1f} ms  "
+                  f"rtf {result['rtf']:.3f}  peak {result['peak_rss_mb']:.0f} MB")
+            for count, http in (result.get("http") or {}).items():
+                ttfa = http["ttfa_ms"] or {}
+                print(f"{'':<10} {count:>5} clients ttfa {ttfa.get('median', 0):8.1f} ms  {http['throughput_rps']:.2f} req/s  {http['failed']} failed")
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "repeats": args.repeats,
+            "requests_per_client": args.requests,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
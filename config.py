@@ -15,12 +15,108 @@ else:
 
 AUDIO_DIR = os.path.join(STATIC_DIR, "audio")
 AUDIO_CACHE_DIR = os.path.join(STATIC_DIR, "audio_cache")
+# Index of the audio cache, kept outside the statically served directory.
+AUDIO_CACHE_INDEX = os.path.join(DATA_DIR, "audio_cache.sqlite") if DATA_DIR else "audio_cache.sqlite"
+# Size cap for the audio cache, in MB. Least recently used audio is deleted
+# past it; audio used by podcasts is kept. 0 disables the limit.
+AUDIO_CACHE_MAX_MB = int(os.environ.get("OPENWEBTTS_CACHE_MAX_MB", 2048))
+# Format the web reader stores and plays when the browser doesn't ask for one:
+# "wav", or a compressed format such as "opus" (about a tenth of the size).
+READER_AUDIO_FORMAT = os.environ.get("OPENWEBTTS_READER_FORMAT", "wav")
 COQUI_DIR = os.path.join(MODELS_DIR, "coqui")
 PIPER_DIR = os.path.join(MODELS_DIR, "piper")
 KOKORO_DIR = os.path.join(MODELS_DIR, "kokoro")
 USERS_DIR = "users"
 DEVICE = 'cpu';
 
+# RAM budget for resident TTS models, in MB. Least recently used models
+# are unloaded once it is exceeded. 0 disables the limit.
+MODEL_MEMORY_BUDGET_MB = int(os.environ.get("OPENWEBTTS_MODEL_MEMORY_MB", 4096))
+
+# Piper voices kept loaded at once, and seconds before an unused one is unloaded.
+PIPER_POOL_SIZE = int(os.environ.get("OPENWEBTTS_PIPER_POOL_SIZE", 4))
+PIPER_IDLE_TIMEOUT = float(os.environ.get("OPENWEBTTS_PIPER_IDLE_TIMEOUT", 600))
+
+# Processes PDF text is extracted in, and the pages each job extracts. Text is
+# cached per page under PDF_CACHE_DIR, by the document's SHA-256.
+PDF_WORKERS = int(os.environ.get("OPENWEBTTS_PDF_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+PDF_BATCH_PAGES = int(os.environ.get("OPENWEBTTS_PDF_BATCH_PAGES", 16))
+PDF_CACHE_DIR = os.environ.get("OPENWEBTTS_PDF_CACHE_DIR", os.path.join(DATA_DIR, "pdf_cache") if DATA_DIR else "pdf_cache")
+# Size cap for PDF_CACHE_DIR, in MB. Least recently read documents are
+# deleted past it, with their text. 0 disables the limit.
+PDF_CACHE_MAX_MB = int(os.environ.get("OPENWEBTTS_PDF_CACHE_MAX_MB", 1024))
+# Processes scanned pages are OCR'd in, one page each at a time. Each page's
+# text is cached next to the extracted text as soon as it's recognized.
+OCR_WORKERS = int(os.environ.get("OPENWEBTTS_OCR_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+
+# Synthesis jobs each engine may run at once. Heavy models get a single slot.
+# Override with OPENWEBTTS_ENGINE_CONCURRENCY="piper=8,coqui=1".
+ENGINE_CONCURRENCY = {
+    "coqui": 1,
+    "chatterbox": 1,
+    "kokoro": 1,
+    "kitten": 2,
+    "piper": 4,
+    "gemini": 4,
+    # Format conversion of cached renders.
+    "transcode": 2,
+    # Speech-to-text; long recordings fan out to WHISPER_WORKERS processes from there.
+    "whisper": 1,
+    # PDF text extraction, one slot per extraction process.
+    "pdf": PDF_WORKERS,
+    "ocr": OCR_WORKERS,
+}
+for _pair in os.environ.get("OPENWEBTTS_ENGINE_CONCURRENCY", "").split(","):
+    if "=" in _pair:
+        _engine, _limit = _pair.split("=", 1)
+        ENGINE_CONCURRENCY[_engine.strip()] = int(_limit)
+DEFAULT_ENGINE_CONCURRENCY = 1
+
+# Maximum synthesis jobs waiting in the queue before requests get a 503.
+SYNTHESIS_QUEUE_SIZE = int(os.environ.get("OPENWEBTTS_QUEUE_SIZE", 256))
+
+# Sentences synthesized ahead of the one being streamed by /v1/audio/speech.
+STREAM_LOOKAHEAD_SENTENCES = int(os.environ.get("OPENWEBTTS_STREAM_LOOKAHEAD", 2))
+
+# Chunks a reading session keeps synthesizing ahead of the playback cursor,
+# and seconds before an untouched session is dropped.
+READ_AHEAD_WINDOW = int(os.environ.get("OPENWEBTTS_READ_AHEAD", 4))
+READ_SESSION_IDLE_TIMEOUT = float(os.environ.get("OPENWEBTTS_SESSION_TIMEOUT", 1800))
+
+# Seconds the Google Cloud TTS voice list is served from memory before it's fetched again.
+GEMINI_VOICES_TTL = float(os.environ.get("OPENWEBTTS_GEMINI_VOICES_TTL", 3600))
+
+# Alternative Google Cloud TTS endpoint, e.g. a local stand-in for testing.
+# "http://host:port" talks REST, a bare "host:port" talks plaintext gRPC;
+# neither sends credentials.
+GEMINI_API_ENDPOINT = os.environ.get("OPENWEBTTS_GEMINI_ENDPOINT")
+
+# Requests to Google Cloud TTS a single long input is split into that run at once.
+GEMINI_SHARD_CONCURRENCY = int(os.environ.get("OPENWEBTTS_GEMINI_CONCURRENCY", 4))
+
+# Requests and renders slower than this many seconds are appended to the
+# slow request log, as JSON lines. 0 disables the log.
+SLOW_REQUEST_SECONDS = float(os.environ.get("OPENWEBTTS_SLOW_REQUEST_SECONDS", 5))
+SLOW_REQUEST_LOG = os.environ.get("OPENWEBTTS_SLOW_REQUEST_LOG", os.path.join(DATA_DIR, "slow_requests.jsonl") if DATA_DIR else "slow_requests.jsonl")
+
+# Engines and voices to load in the background at startup, as
+# "engine:voice,engine:voice". Also set with app.py --preload.
+PRELOAD = os.environ.get("OPENWEBTTS_PRELOAD", "")
+
+# Whisper model used for speech-to-text when a request doesn't pick one.
+WHISPER_MODEL = os.environ.get("OPENWEBTTS_WHISPER_MODEL", "tiny")
+# Processes long recordings are transcribed across on CPU, and the length of
+# the pieces (cut at pauses) they're split into. Each process keeps its own
+# model, so fewer are used when that many copies won't fit MODEL_MEMORY_BUDGET_MB.
+WHISPER_WORKERS = int(os.environ.get("OPENWEBTTS_WHISPER_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+WHISPER_CHUNK_SECONDS = float(os.environ.get("OPENWEBTTS_WHISPER_CHUNK_SECONDS", 120))
+# Live transcription over /api/speech_to_text/stream: seconds between partial
+# transcripts of the utterance in progress, the pause that ends an utterance,
+# and the longest utterance kept before it's cut (Whisper's window is 30 s).
+WHISPER_STREAM_PARTIAL_SECONDS = float(os.environ.get("OPENWEBTTS_WHISPER_PARTIAL_SECONDS", 1.0))
+WHISPER_STREAM_SILENCE_SECONDS = float(os.environ.get("OPENWEBTTS_WHISPER_SILENCE_SECONDS", 0.6))
+WHISPER_STREAM_MAX_SECONDS = float(os.environ.get("OPENWEBTTS_WHISPER_MAX_SEGMENT_SECONDS", 30))
+
 def set_device(str):
     global DEVICE
     DEVICE = str
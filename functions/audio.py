@@ -1,7 +1,222 @@
-from pydub import AudioSegment, effects
+import numpy as np
+import soundfile as sf
 
-def normalize_audio(path):
-    rawsound = AudioSegment.from_file(f'{path}', "wav")
-    normalizedsound = effects.compress_dynamic_range(rawsound)
-    normalizedsound = effects.normalize(rawsound)
-    normalizedsound.export(f'{path}', format="wav")
\ No newline at end of file
+from functions.metrics import stage
+
+try:
+    from scipy.signal import resample_poly
+except ImportError:
+    resample_poly = None
+
+# Peak level normalization aims for, in dBFS (pydub's normalize() default headroom).
+PEAK_TARGET_DB = -0.1
+# Average level loudness normalization aims for, in dBFS.
+LOUDNESS_TARGET_DB = -20.0
+# Level below which leading and trailing audio counts as silence when trimming.
+SILENCE_THRESHOLD_DB = -50.0
+
+def _db_to_gain(db):
+    return 10.0 ** (db / 20.0)
+
+def to_float32(audio) -> np.ndarray:
+    """
+    Converts engine output (torch tensors, lists, int16 or float arrays, with
+    or without a channel axis) to a mono float32 array in [-1, 1].
+    """
+    if hasattr(audio, "detach"):
+        audio = audio.detach().cpu().numpy()
+    audio = np.asarray(audio)
+    if audio.dtype == np.int16:
+        audio = audio.astype(np.float32) / 32768.0
+    else:
+        audio = audio.astype(np.float32, copy=False)
+    if audio.ndim > 1:
+        # Channels are the short axis, whichever way round the engine put them.
+        audio = audio.mean(axis=int(np.argmin(audio.shape))) if min(audio.shape) > 1 else audio.reshape(-1)
+    return audio
+
+def peak_normalize(audio: np.ndarray, target_db: float = PEAK_TARGET_DB) -> np.ndarray:
+    peak = np.max(np.abs(audio)) if audio.size else 0.0
+    if peak <= 0:
+        return audio
+    return audio * (_db_to_gain(target_db) / peak)
+
+def loudness_normalize(audio: np.ndarray, target_db: float = LOUDNESS_TARGET_DB) -> np.ndarray:
+    """Scales audio to a target RMS level, without letting peaks clip."""
+    rms = np.sqrt(np.mean(np.square(audio, dtype=np.float64))) if audio.size else 0.0
+    if rms <= 0:
+        return audio
+    gain = _db_to_gain(target_db) / rms
+    peak = np.max(np.abs(audio))
+    gain = min(gain, _db_to_gain(PEAK_TARGET_DB) / peak)
+    return audio * gain
+
+def compress(audio: np.ndarray, sample_rate: int, threshold_db: float = -20.0, ratio: float = 4.0, window_ms: float = 10.0, release_ms: float = 50.0) -> np.ndarray:
+    """
+    Downward compressor. Levels are measured per `window_ms` frame, the gain
+    reduction is smoothed over `release_ms` and interpolated back to samples.
+    """
+    frame = max(1, int(sample_rate * window_ms / 1000))
+    frames = len(audio) // frame
+    if frames == 0:
+        return audio
+    framed = audio[:frames * frame].reshape(frames, frame)
+    level_db = 10 * np.log10(np.mean(np.square(framed, dtype=np.float64), axis=1) + 1e-12)
+    reduction_db = np.minimum(0.0, (threshold_db - level_db) * (1.0 - 1.0 / ratio))
+
+    smoothing = max(1, int(release_ms / window_ms))
+    if smoothing > 1:
+        kernel = np.ones(smoothing) / smoothing
+        reduction_db = np.convolve(reduction_db, kernel, mode="same")
+
+    centers = np.arange(frames) * frame + frame / 2
+    gain = _db_to_gain(np.interp(np.arange(len(audio)), centers, reduction_db))
+    return (audio * gain).astype(np.float32)
+
+def trim_silence(audio: np.ndarray, sample_rate: int, threshold_db: float = SILENCE_THRESHOLD_DB, pad_ms: float = 50.0) -> np.ndarray:
+    """Cuts leading and trailing silence, keeping `pad_ms` around the speech."""
+    loud = np.flatnonzero(np.abs(audio) > _db_to_gain(threshold_db))
+    if loud.size == 0:
+        return audio
+    pad = int(sample_rate * pad_ms / 1000)
+    return audio[max(0, loud[0] - pad):loud[-1] + pad + 1]
+
+def frame_levels(audio: np.ndarray, sample_rate: int, frame_ms: float = 30.0) -> np.ndarray:
+    """Level of each `frame_ms` frame, in dBFS."""
+    frame = max(1, int(sample_rate * frame_ms / 1000))
+    frames = len(audio) // frame
+    if frames == 0:
+        return np.zeros(0)
+    framed = audio[:frames * frame].reshape(frames, frame)
+    return 10 * np.log10(np.mean(np.square(framed, dtype=np.float64), axis=1) + 1e-12)
+
+def split_on_silence(audio: np.ndarray, sample_rate: int, target_seconds: float, search_seconds: float = 10.0, frame_ms: float = 30.0):
+    """
+    Splits long audio into pieces of about `target_seconds`, each cut placed at
+    the quietest frame within `search_seconds` of its ideal position, so cuts
+    fall in pauses rather than mid-word. Returns (start, end) sample ranges.
+    """
+    target = int(target_seconds * sample_rate)
+    if len(audio) <= target * 1.5:
+        return [(0, len(audio))]
+    frame = max(1, int(sample_rate * frame_ms / 1000))
+    levels = frame_levels(audio, sample_rate, frame_ms)
+    # Never search back more than half a piece, so every cut moves forward.
+    search = int(min(search_seconds, target_seconds / 2) * 1000 / frame_ms)
+
+    ranges = []
+    start = 0
+    # Stop once what's left fits in one piece, so the last one isn't tiny.
+    while len(audio) - start > target * 1.5:
+        ideal = (start + target) // frame
+        low = max(start // frame + 1, ideal - search)
+        window = levels[low:ideal + search + 1]
+        # Between equally quiet frames, prefer the one closest to the ideal position.
+        window = window + 0.01 * np.abs(np.arange(low, low + len(window)) - ideal)
+        cut = (low + int(np.argmin(window))) * frame + frame // 2
+        ranges.append((start, cut))
+        start = cut
+    ranges.append((start, len(audio)))
+    return ranges
+
+def resample(audio: np.ndarray, sample_rate: int, target_sample_rate: int) -> np.ndarray:
+    if sample_rate == target_sample_rate or audio.size == 0:
+        return audio
+    if resample_poly is not None:
+        divisor = np.gcd(sample_rate, target_sample_rate)
+        return resample_poly(audio, target_sample_rate // divisor, sample_rate // divisor).astype(np.float32)
+    # Linear interpolation when SciPy isn't installed.
+    length = int(round(len(audio) * target_sample_rate / sample_rate))
+    positions = np.linspace(0, len(audio) - 1, length)
+    return np.interp(positions, np.arange(len(audio)), audio).astype(np.float32)
+
+def time_stretch(audio: np.ndarray, sample_rate: int, speed: float, frame_ms: float = 40.0) -> np.ndarray:
+    """
+    Changes tempo without changing pitch, with a phase vocoder.
+
+    For engines without native rate control. The whole signal is processed as
+    one STFT matrix: magnitudes are interpolated at the new frame positions and
+    phases advanced by their measured per-bin frequency, then overlap-added.
+    """
+    if speed == 1.0 or audio.size == 0:
+        return audio
+    n_fft = 1 << int(np.ceil(np.log2(sample_rate * frame_ms / 1000)))
+    hop = n_fft // 4
+    window = np.hanning(n_fft).astype(np.float32)
+    # Half a frame of padding, so the first frame already holds signal to take phases from.
+    padded = np.pad(audio, (n_fft // 2, n_fft + hop))
+
+    frames = (len(padded) - n_fft) // hop + 1
+    starts = np.arange(frames) * hop
+    spectrum = np.fft.rfft(padded[starts[:, None] + np.arange(n_fft)] * window, axis=1)
+
+    # Fractional input frames each output frame is taken from.
+    steps = np.arange(0, frames - 1, speed)
+    index = steps.astype(np.int64)
+    fraction = (steps - index)[:, None]
+    magnitude = (1 - fraction) * np.abs(spectrum[index]) + fraction * np.abs(spectrum[index + 1])
+
+    expected = 2 * np.pi * hop * np.arange(spectrum.shape[1]) / n_fft
+    advance = np.angle(spectrum[index + 1]) - np.angle(spectrum[index]) - expected
+    advance = expected + (advance + np.pi) % (2 * np.pi) - np.pi
+    phase = np.angle(spectrum[0]) + np.concatenate([np.zeros((1, spectrum.shape[1])), np.cumsum(advance[:-1], axis=0)])
+
+    # Identity phase locking: each bin keeps its analysis phase relative to the
+    # nearest spectral peak. Otherwise errors in the advance (from the padded
+    # first frames, repeated 1/speed times when slowing down) leave the bins of
+    # one partial out of phase with each other, and they partly cancel.
+    bins = np.arange(spectrum.shape[1])
+    peaks = np.zeros(magnitude.shape, dtype=bool)
+    peaks[:, 1:-1] = (magnitude[:, 1:-1] >= magnitude[:, :-2]) & (magnitude[:, 1:-1] > magnitude[:, 2:])
+    below = np.maximum.accumulate(np.where(peaks, bins, -1), axis=1)
+    above = np.minimum.accumulate(np.where(peaks, bins, 2 * len(bins))[:, ::-1], axis=1)[:, ::-1]
+    owner = np.where((below >= 0) & ((bins - below) <= (above - bins)), below, above)
+    owner = np.where(owner < len(bins), owner, bins)
+    analysis = np.angle(spectrum[index])
+    rows = np.arange(len(steps))[:, None]
+    phase = phase[rows, owner] + analysis - analysis[rows, owner]
+
+    segments = np.fft.irfft(magnitude * np.exp(1j * phase), n=n_fft, axis=1) * window
+    positions = (np.arange(len(steps))[:, None] * hop + np.arange(n_fft)).reshape(-1)
+    length = (len(steps) - 1) * hop + n_fft
+    output = np.bincount(positions, weights=segments.reshape(-1), minlength=length)
+    weight = np.bincount(positions, weights=np.tile(window ** 2, len(steps)), minlength=length)
+    output = output / np.maximum(weight, 1e-3)
+
+    # Drop the padding, scaled to the new tempo.
+    start = int(round(n_fft // 2 / speed))
+    return output[start:start + int(round(len(audio) / speed))].astype(np.float32)
+
+def postprocess(audio, sample_rate: int, normalize: str = "peak", compression: bool = False, trim: bool = False, target_sample_rate: int = None, speed: float = 1.0):
+    """
+    Runs the post-processing chain on engine output and returns (audio, sample_rate).
+
+    Steps, all optional except the float conversion: trim silence, time-stretch
+    to `speed`, resample, compress, then normalize ("peak", "loudness" or None).
+    """
+    audio = to_float32(audio)
+    if trim:
+        audio = trim_silence(audio, sample_rate)
+    if speed != 1.0:
+        audio = time_stretch(audio, sample_rate, speed)
+    if target_sample_rate:
+        audio = resample(audio, sample_rate, target_sample_rate)
+        sample_rate = target_sample_rate
+    if compression:
+        audio = compress(audio, sample_rate)
+    if normalize == "peak":
+        audio = peak_normalize(audio)
+    elif normalize == "loudness":
+        audio = loudness_normalize(audio)
+    return np.clip(audio, -1.0, 1.0), sample_rate
+
+def save_audio(output, audio, sample_rate: int, **options):
+    """Post-processes engine output and writes it to `output` as 16-bit WAV, in one pass."""
+    with stage("postprocess"):
+        audio, sample_rate = postprocess(audio, sample_rate, **options)
+        sf.write(output, audio, sample_rate, subtype="PCM_16", format="WAV")
+
+def normalize_audio(path, **options):
+    """Post-processes a WAV file an engine wrote to disk, in place."""
+    audio, sample_rate = sf.read(path, dtype="float32")
+    save_audio(path, audio, sample_rate, **options)
@@ -0,0 +1,281 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+from config import AUDIO_CACHE_DIR, AUDIO_CACHE_INDEX, AUDIO_CACHE_MAX_MB
+from functions.metrics import CACHE_EVICTIONS
+
+# Prefix of files still being written; never served or indexed as cache entries.
+TEMP_PREFIX = ".tmp-"
+
+# Bump to invalidate every cached render, e.g. after changing post-processing.
+CACHE_KEY_VERSION = 1
+
+# Model each engine renders with. Part of the cache key, so switching models
+# doesn't keep serving audio from the old one. Piper and Coqui voices are
+# files, which the voice name already identifies.
+ENGINE_MODELS = {
+    "kokoro": "hexgrad/Kokoro-82M",
+    "kitten": "KittenML/kitten-tts-nano-0.2",
+    "coqui": "tts_models/multilingual/multi-dataset/xtts_v2",
+    "chatterbox": "multilingual",
+    "gemini": "texttospeech-v1",
+}
+
+_HORIZONTAL_SPACE = re.compile(r'[^\S\n]+')
+_BLANK_LINES = re.compile(r'\n{3,}')
+
+def normalize_text(text: str) -> str:
+    """
+    Canonical form of text for synthesis: NFC, runs of spaces collapsed,
+    trailing spaces and extra blank lines dropped. Texts that only differ in
+    these ways sound the same, so they share one cache entry.
+    """
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    lines = [_HORIZONTAL_SPACE.sub(" ", line).strip() for line in text.split("\n")]
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+def cache_key(text: str, engine: str, voice: str, lang: str = None, speed: float = 1.0, variant: str = None) -> str:
+    """
+    Cache key for a render: a hash of the normalized text and everything else
+    that changes the audio. Callers pass `lang` only for engines that use it,
+    and `variant` for audio rendered some other way than in one piece.
+    """
+    parts = [
+        str(CACHE_KEY_VERSION),
+        engine,
+        voice or "",
+        lang or "",
+        f"{float(speed):g}",
+        ENGINE_MODELS.get(engine, ""),
+        normalize_text(text),
+    ]
+    if variant:
+        parts.append(variant)
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+@contextmanager
+def atomic_output(output_path: str):
+    """
+    Yields a temporary path next to `output_path` and renames it into place
+    once the block finishes, so readers never see a half-written file.
+
+    The temporary name keeps the extension, since engines pick the output
+    format from it. On error the partial file is removed.
+    """
+    directory, filename = os.path.split(output_path)
+    temp_path = os.path.join(directory, f"{TEMP_PREFIX}{uuid.uuid4().hex[:8]}-{filename}")
+    try:
+        yield temp_path
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+
+class AudioCache:
+    """
+    SQLite index over the files in AUDIO_CACHE_DIR.
+
+    Records size, engine, voice, creation and last access time for every entry
+    and keeps a running byte total, so size reporting doesn't walk the
+    directory. Once the total goes over `max_bytes` the least recently used
+    entries are deleted. Pinned entries (audio referenced by podcasts) are
+    never evicted. `pin_source`, if set, returns the files that must stay
+    pinned; reconcile() pins them before it evicts anything, which covers
+    podcasts made before pins were recorded.
+    """
+
+    def __init__(self, cache_dir: str, db_path: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._conn = None
+        self._lock = threading.RLock()
+        self._total = 0
+        self.pin_source = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is not None:
+            return self._conn
+        with self._lock:
+            if self._conn is None:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                conn = sqlite3.connect(self.db_path, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.executescript("""
+                    CREATE TABLE IF NOT EXISTS entries (
+                        key TEXT PRIMARY KEY,
+                        size INTEGER NOT NULL,
+                        engine TEXT,
+                        voice TEXT,
+                        created REAL NOT NULL,
+                        last_access REAL NOT NULL,
+                        pinned INTEGER NOT NULL DEFAULT 0
+                    );
+                    CREATE INDEX IF NOT EXISTS entries_lru ON entries (pinned, last_access);
+                    CREATE INDEX IF NOT EXISTS entries_engine_voice ON entries (engine, voice);
+                """)
+                self._total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+                self._conn = conn
+                # Pick up files written before the index existed, without delaying startup.
+                threading.Thread(target=self.reconcile, name="audio-cache-reconcile", daemon=True).start()
+        return self._conn
+
+    def reconcile(self):
+        """Brings the index in line with what is actually on disk."""
+        db = self._db()
+        on_disk = {}
+        try:
+            with os.scandir(self.cache_dir) as entries:
+                for entry in entries:
+                    if entry.is_file() and not entry.name.startswith(TEMP_PREFIX):
+                        stat = entry.stat()
+                        on_disk[entry.name] = (stat.st_size, stat.st_mtime)
+        except FileNotFoundError:
+            pass
+
+        with self._lock:
+            indexed = {row[0] for row in db.execute("SELECT key FROM entries")}
+            missing = [(key,) for key in indexed - on_disk.keys()]
+            new = [(key, size, mtime, mtime) for key, (size, mtime) in on_disk.items() if key not in indexed]
+            db.executemany("DELETE FROM entries WHERE key = ?", missing)
+            db.executemany("INSERT INTO entries (key, size, created, last_access) VALUES (?, ?, ?, ?)", new)
+            if self.pin_source is not None:
+                # Raised only, so a pin added since the source was read isn't lost.
+                pins = Counter(os.path.basename(path) for path in self.pin_source())
+                db.executemany("UPDATE entries SET pinned = MAX(pinned, ?) WHERE key = ?", [(n, key) for key, n in pins.items()])
+            db.commit()
+            self._total = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if missing or new:
+            print(f"Audio cache index: added {len(new)} untracked file(s), dropped {len(missing)} missing.")
+        self.evict()
+
+    def add(self, path: str, engine: str = None, voice: str = None, pinned: bool = False):
+        """
+        Records a file that was just published into the cache, then enforces
+        the size cap. With `pinned` it's pinned in the same step, so it can't
+        be evicted in between.
+        """
+        key = os.path.basename(path)
+        size = os.path.getsize(path)
+        now = time.time()
+        db = self._db()
+        with self._lock:
+            row = db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            db.execute(
+                "INSERT INTO entries (key, size, engine, voice, created, last_access, pinned) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET size = excluded.size, engine = excluded.engine, voice = excluded.voice, "
+                "last_access = excluded.last_access, pinned = pinned + excluded.pinned",
+                (key, size, engine, voice, now, now, int(pinned)),
+            )
+            db.commit()
+            self._total += size - (row[0] if row else 0)
+        self.evict()
+
+    def touch(self, path: str):
+        """Marks an entry as just used."""
+        db = self._db()
+        with self._lock:
+            db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), os.path.basename(path)))
+            db.commit()
+
+    def pin(self, path: str):
+        """Protects an entry from eviction. Pins are counted; call unpin once per pin."""
+        db = self._db()
+        with self._lock:
+            db.execute("UPDATE entries SET pinned = pinned + 1 WHERE key = ?", (os.path.basename(path),))
+            db.commit()
+
+    def unpin(self, path: str):
+        db = self._db()
+        with self._lock:
+            db.execute("UPDATE entries SET pinned = MAX(pinned - 1, 0) WHERE key = ?", (os.path.basename(path),))
+            db.commit()
+
+    def _delete(self, rows):
+        """Removes files and their index rows. Must hold self._lock."""
+        freed = 0
+        for key, size in rows:
+            try:
+                os.unlink(os.path.join(self.cache_dir, key))
+            except FileNotFoundError:
+                pass
+            freed += size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in rows])
+        self._conn.commit()
+        self._total -= freed
+        return freed
+
+    def evict(self):
+        """Deletes least recently used, unpinned entries until the cache fits in max_bytes."""
+        if self.max_bytes <= 0 or self._total <= self.max_bytes:
+            return 0
+        db = self._db()
+        evicted = 0
+        with self._lock:
+            while self._total > self.max_bytes:
+                rows = db.execute("SELECT key, size FROM entries WHERE pinned = 0 ORDER BY last_access LIMIT 100").fetchall()
+                if not rows:
+                    break
+                # Only take as many as needed to get under the cap.
+                needed = self._total - self.max_bytes
+                batch = []
+                for key, size in rows:
+                    batch.append((key, size))
+                    needed -= size
+                    if needed <= 0:
+                        break
+                self._delete(batch)
+                evicted += len(batch)
+        CACHE_EVICTIONS.inc(evicted)
+        return evicted
+
+    def purge(self, engine: str = None, voice: str = None, include_pinned: bool = False):
+        """Deletes every entry matching engine and/or voice (everything if neither is given)."""
+        query = "SELECT key, size FROM entries WHERE 1 = 1"
+        params = []
+        if engine is not None:
+            query += " AND engine = ?"
+            params.append(engine)
+        if voice is not None:
+            query += " AND voice = ?"
+            params.append(voice)
+        if not include_pinned:
+            query += " AND pinned = 0"
+        db = self._db()
+        with self._lock:
+            rows = db.execute(query, params).fetchall()
+            self._delete(rows)
+        return len(rows)
+
+    @property
+    def total_bytes(self) -> int:
+        self._db()
+        return self._total
+
+    def stats(self):
+        db = self._db()
+        with self._lock:
+            count, pinned = db.execute("SELECT COUNT(*), COALESCE(SUM(pinned > 0), 0) FROM entries").fetchone()
+            engines = {
+                engine or "unknown": {"entries": n, "bytes": size}
+                for engine, n, size in db.execute("SELECT engine, COUNT(*), SUM(size) FROM entries GROUP BY engine")
+            }
+        return {
+            "bytes": self._total,
+            "max_bytes": self.max_bytes,
+            "entries": count,
+            "pinned": pinned,
+            "engines": engines,
+        }
+
+# Shared index over the audio cache.
+audio_cache = AudioCache(AUDIO_CACHE_DIR, AUDIO_CACHE_INDEX, AUDIO_CACHE_MAX_MB * 1024 * 1024)
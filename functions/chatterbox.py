@@ -1,20 +1,40 @@
-import torch
-import torchaudio as ta
-from chatterbox.mtl_tts import ChatterboxMultilingualTTS
-from functions.audio import normalize_audio
+import threading
+
+from chatterbox.mtl_tts import ChatterboxMultilingualTTS, Conditionals
+from functions.audio import save_audio
+from functions.conditioning import conditioning_cache
+from functions.models import model_registry
 from config import DEVICE
 
-def chatterbox_process_audio(voice, lang, text, output):
+# generate() reads the speaker from the shared model.conds, and computing
+# conditionals sets it too, so each set-then-use pair holds this lock. The
+# engine may be allowed more than one job via OPENWEBTTS_ENGINE_CONCURRENCY.
+_conds_lock = threading.Lock()
+
+def _get_model():
+    return model_registry.get("chatterbox", "multilingual", DEVICE, lambda: ChatterboxMultilingualTTS.from_pretrained(device=DEVICE))
+
+def _speaker_conds(model, voice):
+    """Chatterbox conditionals for a reference clip, computed once per clip."""
+    def compute(path):
+        model.prepare_conditionals(path)
+        return model.conds
+    load = lambda path: Conditionals.load(path, map_location=DEVICE).to(DEVICE)
+    return conditioning_cache.get("chatterbox", voice, compute, load, lambda conds, path: conds.save(path))
 
-    # Clear CUDA cache
-    torch.cuda.empty_cache()
+def precompute_chatterbox_conds(voice):
+    """Computes and stores the conditionals for a newly saved clip ahead of its first use."""
+    model = _get_model()
+    with _conds_lock:
+        _speaker_conds(model, voice)
 
-    model = ChatterboxMultilingualTTS.from_pretrained(device=DEVICE)
-    wav = model.generate(text, language_id=lang, audio_prompt_path=voice)
+def chatterbox_process_audio(voice, lang, text, output, speed=1.0):
 
-    ta.save(output, wav, model.sr)
+    model = _get_model()
+    # generate() reads the speaker from model.conds when no prompt path is given.
+    with _conds_lock:
+        model.conds = _speaker_conds(model, voice)
+        wav = model.generate(text, language_id=lang)
 
-    # Save the audio
-    sf.write(output, audio, 24000)
-    # Normalize the audio
-    normalize_audio(output)
\ No newline at end of file
+    # Chatterbox has no rate control, so the speed change is done on the samples.
+    save_audio(output, wav, model.sr, speed=speed)
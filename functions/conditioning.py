@@ -0,0 +1,110 @@
+import glob
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from functions.cache import atomic_output
+from functions.metrics import stage
+from config import COQUI_DIR
+
+# Speaker conditionings kept in memory, across engines and voices.
+CONDITIONINGS_KEPT = 32
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+class ConditioningCache:
+    """
+    Speaker conditioning (XTTS latents, Chatterbox conds) computed once per
+    reference clip.
+
+    Entries are keyed by the clip's content hash and saved next to it in
+    COQUI_DIR as `<voice>.<engine>-<hash>.pt`, so they survive restarts and
+    are recomputed only when the clip itself changes. Recently used ones
+    also stay in memory.
+    """
+
+    def __init__(self, directory: str, kept: int):
+        self.directory = directory
+        self.kept = kept
+        self._entries = OrderedDict()
+        self._digests = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def _digest(self, voice_path: str) -> str:
+        """Content hash of a clip, only re-read when the file changes."""
+        stat = os.stat(voice_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._digests.get(voice_path)
+        if cached and cached[0] == signature:
+            return cached[1]
+        digest = file_digest(voice_path)
+        with self._lock:
+            self._digests[voice_path] = (signature, digest)
+        return digest
+
+    def path_for(self, engine: str, voice_path: str, digest: str) -> str:
+        stem = os.path.splitext(os.path.basename(voice_path))[0]
+        return os.path.join(self.directory, f"{stem}.{engine}-{digest[:16]}.pt")
+
+    def get(self, engine: str, voice_path: str, compute, load, save):
+        """
+        Returns the conditioning for a clip.
+
+        `compute(voice_path)` builds it from the clip, `save(conditioning, path)`
+        and `load(path)` persist it; all three are engine-specific.
+        """
+        digest = self._digest(voice_path)
+        key = (engine, digest)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                if key in self._entries:
+                    return self._entries[key]
+
+            path = self.path_for(engine, voice_path, digest)
+            conditioning = None
+            if os.path.exists(path):
+                try:
+                    conditioning = load(path)
+                except Exception as e:
+                    print(f"Ignoring unreadable conditioning {path}: {e}")
+            if conditioning is None:
+                with stage("conditioning"):
+                    conditioning = compute(voice_path)
+                with atomic_output(path) as temp_path:
+                    save(conditioning, temp_path)
+                self._remove_stale(engine, voice_path, path)
+
+            with self._lock:
+                self._entries[key] = conditioning
+                while len(self._entries) > self.kept:
+                    self._entries.popitem(last=False)
+                self._key_locks.pop(key, None)
+            return conditioning
+
+    def _remove_stale(self, engine: str, voice_path: str, current: str):
+        """Deletes conditionings saved for earlier versions of the same clip."""
+        stem = os.path.splitext(os.path.basename(voice_path))[0]
+        for path in glob.glob(os.path.join(self.directory, f"{glob.escape(stem)}.{engine}-*.pt")):
+            if path != current:
+                os.unlink(path)
+
+    def stats(self):
+        with self._lock:
+            return {"in_memory": len(self._entries), "kept": self.kept}
+
+# Shared cache for every voice-cloning engine.
+conditioning_cache = ConditioningCache(COQUI_DIR, CONDITIONINGS_KEPT)
@@ -1,9 +1,14 @@
 import os
 import torch
 from TTS.api import TTS
+from functions.audio import save_audio
+from functions.conditioning import conditioning_cache
+from functions.models import model_registry
 from config import COQUI_DIR
 from config import DEVICE
 
+XTTS_MODEL = "tts_models/multilingual/multi-dataset/xtts_v2"
+
 def save_voice_sample(file_data: bytes, filename: str):
     """Saves an audio file to the Coqui models directory."""
     if not os.path.exists(COQUI_DIR):
@@ -23,16 +28,40 @@ def save_voice_sample(file_data: bytes, filename: str):
         
     return file_path
 
-# TTS to a file, use a preset speaker
-def coqui_process_audio(voice, lang, text, output):
-    # Initialize TTS
-    tts = TTS("tts_models/multilingual/multi-dataset/xtts_v2").to(DEVICE)
+def _get_tts():
+    # Load TTS once and keep it resident
+    return model_registry.get("coqui", XTTS_MODEL, DEVICE, lambda: TTS(XTTS_MODEL).to(DEVICE))
+
+def _save_latents(latents, path):
+    gpt_cond_latent, speaker_embedding = latents
+    torch.save({"gpt_cond_latent": gpt_cond_latent.cpu(), "speaker_embedding": speaker_embedding.cpu()}, path)
+
+def _load_latents(path):
+    data = torch.load(path, map_location=DEVICE)
+    return data["gpt_cond_latent"], data["speaker_embedding"]
 
-    torch.cuda.empty_cache()
+def _speaker_latents(tts, voice):
+    """XTTS conditioning latents for a reference clip, computed once per clip."""
+    model = tts.synthesizer.tts_model
+    compute = lambda path: model.get_conditioning_latents(audio_path=[path])
+    return conditioning_cache.get("xtts", voice, compute, _load_latents, _save_latents)
+
+def precompute_coqui_latents(voice):
+    """Computes and stores the latents for a newly saved clip ahead of its first use."""
+    _speaker_latents(_get_tts(), voice)
+
+# TTS to a file, use a preset speaker
+def coqui_process_audio(voice, lang, text, output, speed=1.0):
+    tts = _get_tts()
+    gpt_cond_latent, speaker_embedding = _speaker_latents(tts, voice)
 
-    tts.tts_to_file(
-        text=text,
-        speaker_wav=voice,
-        language=lang,
-        file_path=output
+    out = tts.synthesizer.tts_model.inference(
+        text,
+        lang,
+        gpt_cond_latent,
+        speaker_embedding,
+        speed=speed,
+        enable_text_splitting=True
     )
+    # Normalize and save the audio
+    save_audio(output, out["wav"], tts.synthesizer.output_sample_rate)
@@ -0,0 +1,195 @@
+import asyncio
+import struct
+import subprocess
+import wave
+
+MEDIA_TYPES = {
+    "mp3": "audio/mpeg",
+    "opus": "audio/ogg", # Ogg Opus
+    "aac": "audio/aac",
+    "flac": "audio/flac",
+    "wav": "audio/wav",
+    "pcm": "audio/pcm",
+}
+
+# ffmpeg muxer and codec used for each compressed format.
+FFMPEG_FORMATS = {
+    "mp3": ("mp3", "libmp3lame"),
+    "opus": ("ogg", "libopus"),
+    "aac": ("adts", "aac"),
+    "flac": ("flac", "flac"),
+}
+
+# Sample rate used when decoding non-WAV input, e.g. cloud engine output.
+FALLBACK_SAMPLE_RATE = 24000
+
+def read_pcm(path: str):
+    """
+    Reads a rendered file as 16-bit PCM. Returns (pcm bytes, sample rate, channels).
+
+    Engine renders are plain WAV and are read directly; anything else is
+    decoded by ffmpeg to mono at FALLBACK_SAMPLE_RATE.
+    """
+    try:
+        with wave.open(path, "rb") as f:
+            if f.getsampwidth() == 2:
+                return f.readframes(f.getnframes()), f.getframerate(), f.getnchannels()
+    except (wave.Error, EOFError):
+        pass
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", path, "-f", "s16le", "-ac", "1", "-ar", str(FALLBACK_SAMPLE_RATE), "pipe:1"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to decode {path}: {result.stderr.decode(errors='replace').strip()}")
+    return result.stdout, FALLBACK_SAMPLE_RATE, 1
+
+def encode_pcm(pcm: bytes, sample_rate: int, response_format: str, channels: int = 1) -> bytes:
+    """
+    Encodes 16-bit PCM to the given format in memory. WAV and raw PCM are
+    framed in Python; compressed formats go through ffmpeg over pipes.
+    """
+    if response_format == "pcm":
+        return pcm
+    if response_format == "wav":
+        return wav_header(sample_rate, channels, 2, len(pcm)) + pcm
+    muxer, codec = FFMPEG_FORMATS[response_format]
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error",
+         "-f", "s16le", "-ar", str(sample_rate), "-ac", str(channels), "-i", "pipe:0",
+         "-c:a", codec, "-f", muxer, "pipe:1"],
+        input=pcm,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to encode {response_format}: {result.stderr.decode(errors='replace').strip()}")
+    return result.stdout
+
+def wav_header(sample_rate: int, channels: int, sample_width: int, data_size: int = 0xFFFFFFFF - 36) -> bytes:
+    """
+    Builds a PCM WAV header. The default data size is the maximum, which
+    players treat as "until the end of the stream".
+    """
+    byte_rate = sample_rate * channels * sample_width
+    return b"".join([
+        b"RIFF", struct.pack("<I", min(data_size + 36, 0xFFFFFFFF)), b"WAVE",
+        b"fmt ", struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, byte_rate, channels * sample_width, sample_width * 8),
+        b"data", struct.pack("<I", min(data_size, 0xFFFFFFFF)),
+    ])
+
+class _FfmpegPipe:
+    """
+    A long-lived ffmpeg process bytes are written to and read back from as
+    they're converted, started on the first feed(). `args` go between the
+    common options and the end of the command; `action` names the
+    conversion in errors.
+    """
+
+    def __init__(self, args, action: str):
+        self._args = args
+        self._action = action
+        self._process = None
+        self._reader = None
+        self._output = bytearray()
+
+    async def _start(self):
+        self._process = await asyncio.create_subprocess_exec(
+            "ffmpeg", "-hide_banner", "-loglevel", "error", *self._args,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+        )
+        self._reader = asyncio.create_task(self._read_output())
+
+    async def _read_output(self):
+        while True:
+            data = await self._process.stdout.read(16384)
+            if not data:
+                break
+            self._output.extend(data)
+
+    def _take(self) -> bytes:
+        data = bytes(self._output)
+        self._output.clear()
+        return data
+
+    async def feed(self, data: bytes) -> bytes:
+        if self._process is None:
+            await self._start()
+        self._process.stdin.write(data)
+        await self._process.stdin.drain()
+        # Give the reader a chance to pick up what ffmpeg has flushed so far.
+        await asyncio.sleep(0)
+        return self._take()
+
+    async def close(self) -> bytes:
+        if self._process is None:
+            return b""
+        self._process.stdin.close()
+        await self._reader
+        await self._process.wait()
+        if self._process.returncode != 0:
+            raise RuntimeError(f"ffmpeg exited with code {self._process.returncode} while {self._action}")
+        return self._take()
+
+    def abort(self):
+        if self._process is not None and self._process.returncode is None:
+            self._process.kill()
+
+class StreamEncoder(_FfmpegPipe):
+    """
+    Encodes PCM to the requested format incrementally.
+
+    WAV and raw PCM are framed in Python; compressed formats are piped through
+    a single long-lived ffmpeg process so the output is one continuous stream.
+    Call feed() with 16-bit PCM as it's synthesized and close() at the end;
+    both return whatever encoded bytes are available.
+    """
+
+    def __init__(self, response_format: str, sample_rate: int, channels: int = 1):
+        args = []
+        if response_format in FFMPEG_FORMATS:
+            muxer, codec = FFMPEG_FORMATS[response_format]
+            args = ["-f", "s16le", "-ar", str(sample_rate), "-ac", str(channels), "-i", "pipe:0",
+                    "-c:a", codec, "-f", muxer, "pipe:1"]
+        super().__init__(args, f"encoding {response_format}")
+        self.format = response_format
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self._header_sent = False
+
+    async def feed(self, pcm: bytes) -> bytes:
+        if self.format == "pcm":
+            return pcm
+        if self.format == "wav":
+            if not self._header_sent:
+                self._header_sent = True
+                return wav_header(self.sample_rate, self.channels, 2) + pcm
+            return pcm
+        return await super().feed(pcm)
+
+class StreamDecoder(_FfmpegPipe):
+    """
+    Decodes an incoming audio stream to 16-bit mono PCM incrementally.
+
+    Used for live microphone input: Opus in a WebM or Ogg container as
+    MediaRecorder produces it (ffmpeg detects which), or raw 16-bit PCM
+    (`input_format="s16le"`) at a sample rate other than the one wanted.
+    Bytes go through a single long-lived ffmpeg process; feed() returns the
+    PCM decoded so far and close() the rest.
+    """
+
+    def __init__(self, sample_rate: int, input_format: str = None, input_sample_rate: int = None):
+        input_args = []
+        if input_format:
+            input_args += ["-f", input_format]
+            if input_format == "s16le":
+                input_args += ["-ar", str(input_sample_rate), "-ac", "1"]
+        super().__init__(
+            [*input_args, "-i", "pipe:0", "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "pipe:1"],
+            "decoding the audio stream",
+        )
+        self.sample_rate = sample_rate
+        self.input_format = input_format
+        self.input_sample_rate = input_sample_rate
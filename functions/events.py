@@ -0,0 +1,75 @@
+import asyncio
+import json
+import threading
+
+# Events buffered per subscriber before it's considered too slow and dropped.
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+class EventBus:
+    """
+    Delivers job completion events to the clients they belong to.
+
+    Every subscriber and every event has a set of owners (opaque strings such
+    as "client:<id>" or "user:<name>"), and an event only goes to subscribers
+    sharing one, so jobs of one user aren't announced to another. Owners can
+    also watch() a job key before its event is published, which is how every
+    client that joined a shared job hears about it.
+
+    publish() may be called from any thread (the synthesis and OCR workers run
+    off the event loop); events are handed to each subscriber's loop safely.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._watchers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, owners=()) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add((asyncio.get_running_loop(), queue, frozenset(owners)))
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        with self._lock:
+            self._subscribers = {s for s in self._subscribers if s[1] is not queue}
+
+    def watch(self, key, owner: str):
+        """Adds `owner` to the recipients of the next event published for `key`."""
+        if owner is None:
+            return
+        with self._lock:
+            self._watchers.setdefault(key, set()).add(owner)
+
+    def _offer(self, queue: asyncio.Queue, event: dict):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.unsubscribe(queue)
+
+    def publish(self, event_type: str, key=None, owners=(), **data):
+        """Sends an event to the subscribers among `owners` and the watchers of `key`."""
+        event = {"type": event_type, **data}
+        with self._lock:
+            recipients = set(owners) | self._watchers.pop(key, set())
+            subscribers = [(loop, queue) for loop, queue, theirs in self._subscribers if theirs & recipients]
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, event)
+            except RuntimeError:
+                # The subscriber's loop has shut down.
+                self.unsubscribe(queue)
+
+    def is_subscribed(self, queue: asyncio.Queue) -> bool:
+        with self._lock:
+            return any(q is queue for _, q, _ in self._subscribers)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+def format_sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+# Shared bus for synthesis, OCR and podcast events.
+event_bus = EventBus()
@@ -6,11 +6,82 @@ the Google Cloud Text-to-Speech API. It's configured to use a
 high-quality, formal-sounding WaveNet voice, ideal for reading articles and books.
 """
 
+import io
 import os
+import threading
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import soundfile as sf
 from google.cloud import texttospeech
-
-def gemini_process_audio(text: str, output_filename: str, voice: str = "en-US-Wavenet-D", lang: str = "en-US", credentials_json_path: str = None):
+from functions.audio import save_audio, resample
+from functions.cache import atomic_output, audio_cache, cache_key
+from functions.text import split_by_bytes
+from config import AUDIO_CACHE_DIR, GEMINI_API_ENDPOINT, GEMINI_SHARD_CONCURRENCY, GEMINI_VOICES_TTL
+
+# The API rejects inputs over 5000 bytes; leave some room.
+MAX_REQUEST_BYTES = 4800
+
+# Shared by every synthesis, so the number of requests in flight stays bounded
+# however many long inputs are being rendered.
+_shard_pool = ThreadPoolExecutor(max_workers=GEMINI_SHARD_CONCURRENCY, thread_name_prefix="gemini-shard")
+
+# Clients are thread-safe and hold a gRPC channel each, so one is kept per
+# credentials file (None for Application Default Credentials) and shared.
+# The file's mtime is part of the key, so replacing the key file swaps the
+# client; the voice list is cached under the same key.
+_clients = {}
+_voices = {}
+_lock = threading.Lock()
+
+def _credentials_key(credentials_json_path: str = None):
+    if not credentials_json_path:
+        return None
+    return (os.path.abspath(credentials_json_path), os.stat(credentials_json_path).st_mtime_ns)
+
+def _create_client(credentials_json_path: str = None):
+    if GEMINI_API_ENDPOINT:
+        # A stand-in for the API; don't send real credentials to it.
+        from google.auth.credentials import AnonymousCredentials
+        if GEMINI_API_ENDPOINT.startswith(("http://", "https://")):
+            return texttospeech.TextToSpeechClient(
+                credentials=AnonymousCredentials(),
+                transport="rest",
+                client_options={"api_endpoint": GEMINI_API_ENDPOINT},
+            )
+        import grpc
+        from google.cloud.texttospeech_v1.services.text_to_speech.transports import TextToSpeechGrpcTransport
+        channel = grpc.insecure_channel(GEMINI_API_ENDPOINT)
+        return texttospeech.TextToSpeechClient(transport=TextToSpeechGrpcTransport(channel=channel))
+
+    if credentials_json_path:
+        # Explicitly use the provided JSON key file
+        from google.oauth2 import service_account
+        credentials = service_account.Credentials.from_service_account_file(credentials_json_path)
+        return texttospeech.TextToSpeechClient(credentials=credentials)
+    # Use Application Default Credentials (e.g., environment variable)
+    return texttospeech.TextToSpeechClient()
+
+def _drop_stale(cache: dict, key):
+    """Removes entries for earlier versions of the same credentials file. Must hold _lock."""
+    for stale in [k for k in cache if k and key and k[0] == key[0] and k != key]:
+        del cache[stale]
+
+def get_client(credentials_json_path: str = None):
+    """Returns the shared client for a credentials file, creating it on first use."""
+    key = _credentials_key(credentials_json_path)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _create_client(credentials_json_path)
+            # Replacing the file also drops the voice list fetched with it.
+            _drop_stale(_clients, key)
+            _drop_stale(_voices, key)
+            _clients[key] = client
+        return client
+
+def gemini_process_audio(text: str, output_filename: str, voice: str = "en-US-Wavenet-D", lang: str = "en-US", credentials_json_path: str = None, speed: float = 1.0):
     """
     Synthesizes speech from the input string of text.
 
@@ -22,26 +93,20 @@ def gemini_process_audio(text: str, output_filename: str, voice: str = "en-US-Wa
     Args:
         text (str): The text to be synthesized.
         output_filename (str): The desired name for the output audio file.
-                               Defaults to "output.mp3".
+                               Written as 16-bit PCM WAV.
         credentials_json_path (str, optional): Path to the Google Cloud service
                                                account JSON file. Defaults to None.
+        speed (float, optional): Speaking rate, 1.0 is normal speed.
 
     Returns:
-        bool: True if synthesis was successful, False otherwise.
+        bool: True once the file is written.
+
+    Raises:
+        Exception: The API's error, or a RuntimeError naming how many shards
+                   of a long input failed, so the caller reports the real cause.
     """
     try:
-        # Instantiates a client
-        if credentials_json_path:
-            # Explicitly use the provided JSON key file
-            from google.oauth2 import service_account
-            credentials = service_account.Credentials.from_service_account_file(credentials_json_path)
-            client = texttospeech.TextToSpeechClient(credentials=credentials)
-        else:
-            # Use Application Default Credentials (e.g., environment variable)
-            client = texttospeech.TextToSpeechClient()
-
-        # Set the text input to be synthesized
-        synthesis_input = texttospeech.SynthesisInput(text=text)
+        client = get_client(credentials_json_path)
 
         # "en-US-Wavenet-D" is a formal and clear male voice suitable for narration.
         voice_params = texttospeech.VoiceSelectionParams(
@@ -56,24 +121,48 @@ def gemini_process_audio(text: str, output_filename: str, voice: str = "en-US-Wa
             print(f"Detected a premium voice ('{voice}'). Using model: '{model_name}'")
             
             audio_config = texttospeech.AudioConfig(
-                audio_encoding=texttospeech.AudioEncoding.MP3,
+                audio_encoding=texttospeech.AudioEncoding.LINEAR16,
+                speaking_rate=speed,
                 model=model_name
             )
         else:
+            # LINEAR16 comes back as a WAV file, like the local engines write.
+            # Compressed formats are encoded from it later, when requested.
             audio_config = texttospeech.AudioConfig(
-                audio_encoding=texttospeech.AudioEncoding.MP3
+                audio_encoding=texttospeech.AudioEncoding.LINEAR16,
+                speaking_rate=speed
             )
 
-        # Perform the text-to-speech request on the text input with the selected
-        # voice parameters and audio file type
-        response = client.synthesize_speech(
-            input=synthesis_input, voice=voice_params, audio_config=audio_config
-        )
-
-        # The response's audio_content is binary.
-        with open(output_filename, "wb") as out:
-            # Write the response to the output file.
-            out.write(response.audio_content)
+        shards = split_by_bytes(text, MAX_REQUEST_BYTES)
+        if len(shards) == 1:
+            # Perform the text-to-speech request on the text input with the selected
+            # voice parameters and audio file type
+            response = client.synthesize_speech(
+                input=texttospeech.SynthesisInput(text=text), voice=voice_params, audio_config=audio_config
+            )
+            # The response's audio_content is a WAV file; decode it in memory and
+            # run it through the same post-processing as the local engines.
+            audio, sample_rate = sf.read(io.BytesIO(response.audio_content), dtype="float32")
+        else:
+            print(f"Splitting {len(text.encode('utf-8'))} bytes of text into {len(shards)} requests.")
+            options = (voice, lang, speed, model_name)
+            futures = [
+                _shard_pool.submit(_synthesize_shard, client, shard, voice_params, audio_config, options)
+                for shard in shards
+            ]
+            # Wait for every shard, so the ones that succeeded are cached even if another failed.
+            errors = [f.exception() for f in futures]
+            # Shards stay pinned until all are in, so adding one can't evict a
+            # sibling a retry would need.
+            for shard, error in zip(shards, errors):
+                if error is None:
+                    audio_cache.unpin(_shard_path(shard, options))
+            failed = [e for e in errors if e is not None]
+            if failed:
+                raise RuntimeError(f"{len(failed)} of {len(shards)} requests failed, the others are cached for a retry") from failed[0]
+            audio, sample_rate = _stitch([f.result() for f in futures])
+
+        save_audio(output_filename, audio, sample_rate)
         
         return True
 
@@ -81,33 +170,81 @@ def gemini_process_audio(text: str, output_filename: str, voice: str = "en-US-Wa
         print(f"An error occurred during audio synthesis: {e}")
         traceback.print_exc()
         print("Please ensure your Google Cloud credentials are set up correctly.")
-        return False
+        raise
+
+def _shard_path(text: str, options) -> str:
+    voice, lang, speed, model_name = options
+    return os.path.join(AUDIO_CACHE_DIR, f"{cache_key(text, 'gemini-shard', f'{voice}/{model_name}', lang, speed)}.wav")
+
+def _synthesize_shard(client, text: str, voice_params, audio_config, options) -> bytes:
+    """
+    Synthesizes one piece of a long input and returns its WAV bytes.
 
-def gemini_list_voices(credentials_json_path: str = None):
+    Pieces are kept in the audio cache under their own key, so a retry after
+    a partial failure only requests the ones that are missing. Each is
+    pinned when it's returned; the caller unpins it.
+    """
+    voice = options[0]
+    path = _shard_path(text, options)
+    try:
+        with open(path, "rb") as f:
+            audio_content = f.read()
+        audio_cache.touch(path)
+        audio_cache.pin(path)
+        return audio_content
+    except FileNotFoundError:
+        pass
+    response = client.synthesize_speech(
+        input=texttospeech.SynthesisInput(text=text), voice=voice_params, audio_config=audio_config
+    )
+    with atomic_output(path) as temp_path:
+        with open(temp_path, "wb") as f:
+            f.write(response.audio_content)
+    audio_cache.add(path, "gemini", voice, pinned=True)
+    return response.audio_content
+
+def _stitch(wavs):
+    """Joins shard WAVs in order, at the first one's sample rate."""
+    pieces = []
+    sample_rate = None
+    for wav in wavs:
+        audio, rate = sf.read(io.BytesIO(wav), dtype="float32")
+        if audio.ndim > 1:
+            audio = audio.mean(axis=1)
+        if sample_rate is None:
+            sample_rate = rate
+        pieces.append(resample(audio, rate, sample_rate))
+    return np.concatenate(pieces), sample_rate
+
+def gemini_list_voices(credentials_json_path: str = None, refresh: bool = False):
     """
     Lists the available voices from the Google Cloud TTS API.
 
-    Authentication is handled similarly to the synthesis function.
+    Authentication is handled similarly to the synthesis function. The list is
+    kept in memory for GEMINI_VOICES_TTL seconds per credentials file.
 
     Args:
         credentials_json_path (str, optional): Path to the Google Cloud service
                                                account JSON file. Defaults to None.
+        refresh (bool, optional): Fetch the list again even if it's cached.
 
     Returns:
         list: A list of voice objects. Returns an empty list on failure.
     """
     try:
-        # Instantiates a client
-        if credentials_json_path:
-            from google.oauth2 import service_account
-            credentials = service_account.Credentials.from_service_account_file(credentials_json_path)
-            client = texttospeech.TextToSpeechClient(credentials=credentials)
-        else:
-            client = texttospeech.TextToSpeechClient()
+        key = _credentials_key(credentials_json_path)
+        with _lock:
+            cached = _voices.get(key)
+        if cached and not refresh and time.monotonic() - cached[0] < GEMINI_VOICES_TTL:
+            return cached[1]
 
         # Performs the list voices request
-        response = client.list_voices()
-        return response.voices
+        response = get_client(credentials_json_path).list_voices()
+        voices = list(response.voices)
+        # Failures aren't cached, so fixing the credentials takes effect right away.
+        with _lock:
+            _voices[key] = (time.monotonic(), voices)
+        return voices
 
     except Exception as e:
         print(f"An error occurred while listing voices: {e}")
@@ -0,0 +1,261 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import Future
+from collections import OrderedDict
+
+from config import ENGINE_CONCURRENCY, DEFAULT_ENGINE_CONCURRENCY, SYNTHESIS_QUEUE_SIZE
+
+# Lower numbers run first.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_READ_AHEAD = 5
+PRIORITY_BACKGROUND = 10
+
+# How many finished jobs are remembered for the status API.
+FINISHED_JOBS_KEPT = 1000
+
+class QueueFullError(Exception):
+    """Raised when the scheduler already holds its maximum number of queued jobs."""
+
+class Job:
+    def __init__(self, engine: str, fn, args, kwargs, priority: int, key: str = None):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        # Callers that asked for the same key while this job was in flight.
+        self.joined = 0
+        self.engine = engine
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.status = "queued"
+        self.error = None
+        self.result = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.future = Future()
+
+    @property
+    def done(self):
+        return self.status in ("ready", "failed", "cancelled")
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "engine": self.engine,
+            "status": self.status,
+            "priority": self.priority,
+            "joined": self.joined,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+class _EngineQueue:
+    """Priority queue plus a fixed number of worker threads for one engine."""
+
+    def __init__(self, scheduler, engine: str, concurrency: int):
+        self.scheduler = scheduler
+        self.engine = engine
+        self.concurrency = max(1, concurrency)
+        self.heap = []
+        self.running = 0
+        self.cond = threading.Condition()
+        self.workers = []
+
+    def put(self, job: Job, seq: int):
+        with self.cond:
+            heapq.heappush(self.heap, (job.priority, seq, job))
+            if len(self.workers) < self.concurrency and len(self.workers) < len(self.heap) + self.running:
+                worker = threading.Thread(target=self._work, name=f"synth-{self.engine}-{len(self.workers)}", daemon=True)
+                self.workers.append(worker)
+                worker.start()
+            self.cond.notify()
+
+    def _next_job(self):
+        with self.cond:
+            while True:
+                while self.heap:
+                    priority, _, job = heapq.heappop(self.heap)
+                    # Skip cancelled jobs and entries left behind by reprioritize().
+                    if job.status == "queued" and priority == job.priority:
+                        # Fails if a waiter cancelled the future directly.
+                        job.status = "running" if job.future.set_running_or_notify_cancel() else "cancelled"
+                        self.running += 1
+                        return job
+                self.cond.wait()
+
+    def _work(self):
+        while True:
+            job = self._next_job()
+            self.scheduler._run(job)
+            with self.cond:
+                self.running -= 1
+
+    def depth(self):
+        with self.cond:
+            return sum(1 for priority, _, job in self.heap if job.status == "queued" and priority == job.priority)
+
+class JobScheduler:
+    """
+    Runs synthesis jobs on per-engine worker threads, off the event loop.
+
+    Each engine gets its own priority queue and at most ENGINE_CONCURRENCY[engine]
+    jobs running at once, so one slow engine can't starve the others. The total
+    number of queued jobs is bounded; submit() raises QueueFullError beyond it.
+
+    Jobs submitted with a `key` are single-flight: while one is queued or
+    running, submitting the same key returns that job instead of a new one.
+    """
+
+    def __init__(self, concurrency: dict, default_concurrency: int, max_queued: int):
+        self.concurrency = concurrency
+        self.default_concurrency = default_concurrency
+        self.max_queued = max_queued
+        self._queues = {}
+        self._jobs = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._queued = 0
+
+    def _queue_for(self, engine: str) -> _EngineQueue:
+        queue = self._queues.get(engine)
+        if queue is None:
+            queue = _EngineQueue(self, engine, self.concurrency.get(engine, self.default_concurrency))
+            self._queues[engine] = queue
+        return queue
+
+    def submit(self, engine: str, fn, *args, priority: int = PRIORITY_INTERACTIVE, key: str = None, **kwargs) -> Job:
+        """Queues `fn(*args, **kwargs)` on the engine's workers and returns its Job."""
+        with self._lock:
+            existing = self._inflight.get(key) if key is not None else None
+            if existing is not None:
+                existing.joined += 1
+            else:
+                if self._queued >= self.max_queued:
+                    raise QueueFullError(f"The synthesis queue is full ({self.max_queued} jobs). Try again shortly.")
+                job = Job(engine, fn, args, kwargs, priority, key)
+                self._queued += 1
+                self._jobs[job.id] = job
+                if key is not None:
+                    self._inflight[key] = job
+                self._prune()
+                queue = self._queue_for(engine)
+
+        if existing is not None:
+            # A more urgent caller joined: move the shared job up.
+            if priority < existing.priority:
+                self.reprioritize(existing.id, priority)
+            return existing
+
+        queue.put(job, next(self._seq))
+        return job
+
+    async def run(self, engine: str, fn, *args, priority: int = PRIORITY_INTERACTIVE, key: str = None, **kwargs):
+        """Submits a job and awaits its result without blocking the event loop."""
+        job = self.submit(engine, fn, *args, priority=priority, key=key, **kwargs)
+        # Shield the shared future: one caller going away mustn't cancel it for the others.
+        return await asyncio.shield(asyncio.wrap_future(job.future))
+
+    def _release_key(self, job: Job):
+        """Stops routing new submissions of this key to a finished job."""
+        with self._lock:
+            if job.key is not None and self._inflight.get(job.key) is job:
+                del self._inflight[job.key]
+
+    def _run(self, job: Job):
+        with self._lock:
+            self._queued -= 1
+        if job.status == "cancelled":
+            self._finish(job)
+            return
+        job.started = time.time()
+        try:
+            result = job.fn(*job.args, **job.kwargs)
+        except Exception as e:
+            print(f"Job {job.id} ({job.engine}) failed: {e}")
+            traceback.print_exc()
+            job.error = str(getattr(e, "detail", None) or e)
+            job.status = "failed"
+            self._finish(job)
+            job.future.set_exception(e)
+        else:
+            job.result = result
+            job.status = "ready"
+            self._finish(job)
+            job.future.set_result(result)
+
+    def _finish(self, job: Job):
+        job.finished = time.time()
+        # Drop references to the request payload once done.
+        job.fn = job.args = job.kwargs = None
+        self._release_key(job)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancels a job that hasn't started yet and that no other caller joined."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != "queued" or job.joined:
+                return False
+            queue = self._queues[job.engine]
+        # Workers claim jobs under the queue's lock, so check again under it.
+        with queue.cond:
+            if job.status != "queued":
+                return False
+            job.status = "cancelled"
+        with self._lock:
+            self._queued -= 1
+        self._finish(job)
+        job.future.cancel()
+        return True
+
+    def reprioritize(self, job_id: str, priority: int) -> bool:
+        """Moves a job that hasn't started yet to a different priority."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != "queued":
+                return False
+            if job.priority == priority:
+                return True
+            queue = self._queues[job.engine]
+        with queue.cond:
+            if job.status != "queued":
+                return False
+            job.priority = priority
+        queue.put(job, next(self._seq))
+        return True
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self):
+        """Forgets the oldest finished jobs. Must hold self._lock."""
+        excess = len(self._jobs) - FINISHED_JOBS_KEPT
+        if excess <= 0:
+            return
+        for job_id in [j.id for j in self._jobs.values() if j.done][:excess]:
+            del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            queues = list(self._queues.values())
+            queued = self._queued
+        return {
+            "queued": queued,
+            "max_queued": self.max_queued,
+            "engines": {
+                q.engine: {"queued": q.depth(), "running": q.running, "concurrency": q.concurrency}
+                for q in queues
+            },
+        }
+
+# Shared scheduler for every synthesis request.
+synthesis_scheduler = JobScheduler(ENGINE_CONCURRENCY, DEFAULT_ENGINE_CONCURRENCY, SYNTHESIS_QUEUE_SIZE)
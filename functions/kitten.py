@@ -1,14 +1,15 @@
 from kittentts import KittenTTS
-import soundfile as sf
-from functions.audio import normalize_audio
+from functions.audio import save_audio
+from functions.models import model_registry
 from config import DEVICE
 
 # Kitten has "mini" and "nano" variants.
-def kitten_process_audio(voice, lang, text, output):
-    m = KittenTTS("KittenML/kitten-tts-nano-0.2")
-    audio = m.generate(text, voice)
+KITTEN_MODEL = "KittenML/kitten-tts-nano-0.2"
 
-    # Save the audio
-    sf.write(output, audio, 24000)
-    # Normalize the audio
-    normalize_audio(output)
+def kitten_process_audio(voice, lang, text, output, speed=1.0):
+    # Kitten runs on ONNX Runtime's CPU provider regardless of DEVICE.
+    m = model_registry.get("kitten", KITTEN_MODEL, "cpu", lambda: KittenTTS(KITTEN_MODEL))
+    audio = m.generate(text, voice, speed=speed)
+
+    # Normalize and save the audio
+    save_audio(output, audio, 24000)
@@ -1,20 +1,27 @@
 from kokoro import KPipeline
-import soundfile as sf
+import numpy as np
 import torch
-from functions.audio import normalize_audio
+from functions.audio import save_audio
+from functions.models import model_registry
 from config import DEVICE
 
-def kokoro_process_audio(voice, lang, text, output):
+def _get_pipeline(lang):
+    return model_registry.get("kokoro", lang, DEVICE, lambda: KPipeline(lang, device=DEVICE))
+
+def kokoro_process_audio(voice, lang, text, output, speed=1.0):
 
     # If we don't have a set lang, the first letter of the voice name will tell us.
     if lang == False:
         lang = voice[0]
     
-    pipeline = KPipeline(lang, device=DEVICE)
-    generator = pipeline(text, voice)
+    pipeline = _get_pipeline(lang)
+    generator = pipeline(text, voice, speed=speed)
 
+    # Long inputs come back in several segments, keep all of them.
+    segments = []
     for i, (gs, ps, audio) in enumerate(generator):
-        sf.write(f'{output}', audio, 24000)
+        if audio is not None:
+            segments.append(audio.cpu().numpy() if hasattr(audio, "cpu") else np.asarray(audio))
 
-    # Normalize the audio
-    normalize_audio(output)
\ No newline at end of file
+    # Normalize and save the audio
+    save_audio(output, np.concatenate(segments), 24000)
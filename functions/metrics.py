@@ -0,0 +1,209 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Content type of the Prometheus text exposition format.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._samples(key, value))
+        return lines
+
+    def _samples(self, key, value):
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(value)}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (not cumulative), sum, count.
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self, key, state):
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            le = f'le="{_number(bound)}"'
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}")
+        lines.append(f"{self.name}_count{_labels(self.label_names, key)} {count}")
+        return lines
+
+class Registry:
+    """
+    Minimal Prometheus metrics registry.
+
+    Instruments are updated from any thread and rendered on demand in the
+    text exposition format. Gauges describing state owned elsewhere (queue
+    depth, cache size) are set right before rendering rather than tracked.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels=()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels=()) -> Gauge:
+        return self._add(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+SYNTHESIS_STAGE_SECONDS = registry.histogram(
+    "openwebtts_synthesis_stage_seconds",
+    "Time spent in each stage of a render: load, conditioning, inference, postprocess, encode.",
+    ("engine", "voice", "stage"),
+)
+SYNTHESIS_ERRORS = registry.counter("openwebtts_synthesis_errors_total", "Renders that failed.", ("engine",))
+JOBS_QUEUED = registry.gauge("openwebtts_jobs_queued", "Synthesis jobs waiting for a worker.", ("engine",))
+JOBS_RUNNING = registry.gauge("openwebtts_jobs_running", "Synthesis jobs being rendered.", ("engine",))
+CACHE_LOOKUPS = registry.counter("openwebtts_audio_cache_lookups_total", "Requests served from the audio cache (hit) or rendered (miss).", ("result",))
+CACHE_EVICTIONS = registry.counter("openwebtts_audio_cache_evictions_total", "Audio cache entries deleted to stay under the size cap.")
+CACHE_BYTES = registry.gauge("openwebtts_audio_cache_bytes", "Size of the audio cache.")
+CACHE_MAX_BYTES = registry.gauge("openwebtts_audio_cache_max_bytes", "Size cap of the audio cache, 0 if unlimited.")
+MODELS_RESIDENT_BYTES = registry.gauge("openwebtts_models_resident_bytes", "Estimated memory of the TTS models kept loaded.")
+OCR_JOBS = registry.counter("openwebtts_ocr_jobs_total", "Finished OCR jobs.", ("status",))
+OCR_IN_PROGRESS = registry.gauge("openwebtts_ocr_jobs_in_progress", "OCR jobs running.")
+OCR_SECONDS = registry.histogram("openwebtts_ocr_seconds", "Time to OCR a document.")
+TRANSCRIPTION_SECONDS = registry.histogram("openwebtts_transcription_seconds", "Time to transcribe an upload with Whisper.", ("model",))
+LIVE_TRANSCRIPTIONS = registry.gauge("openwebtts_live_transcriptions", "Open live transcription sessions.")
+
+# Stage timings of the render running on this thread, if any.
+_local = threading.local()
+
+@contextmanager
+def track_synthesis(engine: str, voice: str):
+    """
+    Collects the stage() timings of a render on this thread and records them
+    per engine and voice when it finishes. Yields the {stage: seconds} dict,
+    which is complete once the block exits.
+    """
+    stages = _local.stages = {}
+    _local.stack = []
+    try:
+        yield stages
+    finally:
+        _local.stages = None
+        for stage_name, seconds in stages.items():
+            SYNTHESIS_STAGE_SECONDS.observe(seconds, engine=engine, voice=voice, stage=stage_name)
+
+@contextmanager
+def stage(name: str):
+    """
+    Times a block as one stage of the current render. Nested stages are
+    subtracted from the enclosing one, so "inference" doesn't include the
+    model load or post-processing done inside the engine call. Does nothing
+    outside track_synthesis().
+    """
+    stages = getattr(_local, "stages", None)
+    if stages is None:
+        yield
+        return
+    _local.stack.append(0.0)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        nested = _local.stack.pop()
+        stages[name] = stages.get(name, 0.0) + elapsed - nested
+        if _local.stack:
+            _local.stack[-1] += elapsed
@@ -0,0 +1,196 @@
+import gc
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import config
+from functions.metrics import stage
+
+def _current_rss() -> int:
+    """Returns the resident set size of this process in bytes, or 0 if unknown."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0
+
+def _estimate_model_bytes(model) -> int:
+    """
+    Estimates the memory held by a model by summing the size of its tensors.
+
+    Works for torch modules and for wrappers that keep one as an attribute
+    (KPipeline.model, TTS.synthesizer, ...). Returns 0 if nothing is found.
+    """
+    candidates = [model]
+    for attr in ("model", "synthesizer", "tts_model", "t3", "s3gen", "ve"):
+        child = getattr(model, attr, None)
+        if child is not None:
+            candidates.append(child)
+            grandchild = getattr(child, "tts_model", None)
+            if grandchild is not None:
+                candidates.append(grandchild)
+
+    total = 0
+    seen = set()
+    for candidate in candidates:
+        parameters = getattr(candidate, "parameters", None)
+        if not callable(parameters):
+            continue
+        try:
+            for param in parameters():
+                if id(param) in seen:
+                    continue
+                seen.add(id(param))
+                total += param.numel() * param.element_size()
+        except Exception:
+            continue
+    return total
+
+class _ResidentModel:
+    def __init__(self, key, model, load_seconds, size_bytes):
+        self.key = key
+        self.model = model
+        self.load_seconds = load_seconds
+        self.size_bytes = size_bytes
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.hits = 0
+
+    def to_dict(self):
+        engine, variant, device = self.key
+        return {
+            "engine": engine,
+            "variant": variant,
+            "device": device,
+            "size_mb": round(self.size_bytes / (1024 * 1024), 2),
+            "load_seconds": round(self.load_seconds, 3),
+            "loaded_at": self.loaded_at,
+            "last_used": self.last_used,
+            "hits": self.hits,
+        }
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded TTS models.
+
+    Models are keyed by (engine, variant, device), loaded once on first use and
+    kept warm. When the estimated memory of all resident models goes over
+    config.MODEL_MEMORY_BUDGET_MB, the least recently used ones are evicted.
+    """
+
+    def __init__(self):
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._load_history = []
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get(self, engine: str, variant: str, device: str, loader):
+        """Returns the resident model for this key, calling `loader()` to load it if needed."""
+        key = (engine, variant, device)
+
+        with self._lock:
+            resident = self._models.get(key)
+            if resident is not None:
+                self._models.move_to_end(key)
+                resident.last_used = time.time()
+                resident.hits += 1
+                return resident.model
+
+        # Only one thread loads a given model; others wait for it.
+        with self._key_lock(key):
+            with self._lock:
+                resident = self._models.get(key)
+                if resident is not None:
+                    self._models.move_to_end(key)
+                    resident.last_used = time.time()
+                    resident.hits += 1
+                    return resident.model
+
+            print(f"Loading {engine} model '{variant}' on {device}...")
+            rss_before = _current_rss()
+            start = time.perf_counter()
+            with stage("load"):
+                model = loader()
+            load_seconds = time.perf_counter() - start
+
+            size_bytes = _estimate_model_bytes(model)
+            if not size_bytes:
+                size_bytes = max(_current_rss() - rss_before, 0)
+            print(f"Loaded {engine} model '{variant}' in {load_seconds:.2f}s (~{size_bytes / (1024 * 1024):.0f} MB).")
+
+            with self._lock:
+                self._models[key] = _ResidentModel(key, model, load_seconds, size_bytes)
+                self._load_history.append({"engine": engine, "variant": variant, "device": device, "load_seconds": round(load_seconds, 3), "time": time.time()})
+                del self._load_history[:-50]
+                evicted = self._evict_over_budget(keep=key)
+
+            if evicted:
+                self._release_memory()
+            return model
+
+    def _evict_over_budget(self, keep=None):
+        """Drops least recently used models until under budget. Must hold self._lock."""
+        budget = config.MODEL_MEMORY_BUDGET_MB * 1024 * 1024
+        if budget <= 0:
+            return []
+
+        evicted = []
+        total = sum(m.size_bytes for m in self._models.values())
+        for key in list(self._models.keys()):
+            if total <= budget:
+                break
+            if key == keep:
+                continue
+            resident = self._models.pop(key)
+            total -= resident.size_bytes
+            evicted.append(key)
+            print(f"Evicted {key[0]} model '{key[1]}' ({resident.size_bytes / (1024 * 1024):.0f} MB) to stay within the model memory budget.")
+        return evicted
+
+    def _release_memory(self):
+        gc.collect()
+        # Only touch torch if an engine already imported it.
+        torch = sys.modules.get("torch")
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def evict(self, engine: str = None, variant: str = None):
+        """Unloads matching models. With no arguments, unloads everything."""
+        with self._lock:
+            keys = [k for k in self._models if (engine is None or k[0] == engine) and (variant is None or k[1] == variant)]
+            for key in keys:
+                del self._models[key]
+        if keys:
+            self._release_memory()
+        return len(keys)
+
+    def resident_bytes(self) -> int:
+        """Estimated memory of every resident model, in bytes."""
+        with self._lock:
+            return sum(m.size_bytes for m in self._models.values())
+
+    def is_resident(self, engine: str, variant: str = None) -> bool:
+        with self._lock:
+            return any(k[0] == engine and (variant is None or k[1] == variant) for k in self._models)
+
+    def stats(self):
+        with self._lock:
+            models = [m.to_dict() for m in reversed(self._models.values())]
+            total = sum(m.size_bytes for m in self._models.values())
+            history = list(self._load_history)
+        return {
+            "budget_mb": config.MODEL_MEMORY_BUDGET_MB,
+            "resident_mb": round(total / (1024 * 1024), 2),
+            "models": models,
+            "recent_loads": history,
+        }
+
+# Shared instance used by every engine.
+model_registry = ModelRegistry()
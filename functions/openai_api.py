@@ -1,12 +1,15 @@
 
 from fastapi import APIRouter, HTTPException, Request, BackgroundTasks, Header
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 import io
 import os
-import hashlib
+import json
+import base64
+import asyncio
+import time
 import requests
 from typing import List, Dict, Optional
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 
 from functions.routes import (
     get_coqui_voices, 
@@ -14,11 +17,19 @@ from functions.routes import (
     get_kokoro_voices, 
     get_kitten_voices, 
     _generate_audio_file, 
+    _cache_path,
+    _transcode_cached,
     SynthesizeRequest, 
     Voice,
-    AUDIO_CACHE_DIR,
 )
-import functions.gemini
+from functions.voices import voice_registry
+from functions.jobs import synthesis_scheduler, QueueFullError
+from functions.encoding import MEDIA_TYPES, StreamEncoder, read_pcm, wav_header
+from functions.text import split_sentences
+from functions.cache import atomic_output, audio_cache
+from functions import metrics
+from functions.timing import add_phases, phase, set_params
+from config import STREAM_LOOKAHEAD_SENTENCES
 
 openai_api_router = APIRouter()
 
@@ -27,13 +38,20 @@ class SpeechRequest(BaseModel):
     input: str
     voice: str = "alloy"
     response_format: str = "mp3"
-    speed: float = 1.0
+    speed: float = Field(1.0, ge=0.25, le=4.0)
+    # Set either to stream audio as sentences are synthesized.
+    # stream_format "sse" wraps chunks in server-sent events like OpenAI's API.
+    stream: bool = False
+    stream_format: Optional[str] = None
 
 # Global voice map
 OPENAI_VOICE_MAP: Dict[str, Dict[str, str]] = {}
+# /v1/voices response and the voice registry version both were built from.
+OPENAI_VOICES: List[Voice] = []
+_voice_map_version = None
 
 def build_voice_map():
-    global OPENAI_VOICE_MAP
+    global OPENAI_VOICE_MAP, OPENAI_VOICES, _voice_map_version
     # Clear previous map
     OPENAI_VOICE_MAP = {} 
 
@@ -84,6 +102,188 @@ def build_voice_map():
     if "shimmer" not in OPENAI_VOICE_MAP:
         OPENAI_VOICE_MAP["shimmer"] = {"engine": "gemini", "voice_id": "shimmer"}
 
+    OPENAI_VOICES = [
+        Voice(id=openai_name, name=f"{info['engine'].capitalize()}: {info['voice_id']}")
+        for openai_name, info in OPENAI_VOICE_MAP.items()
+    ]
+    _voice_map_version = voice_registry.version
+
+def get_voice_map() -> Dict[str, Dict[str, str]]:
+    """The voice map, rebuilt only when the installed voices changed."""
+    # Cheap: the registry only rescans directories whose mtime changed.
+    get_piper_voices()
+    get_kokoro_voices()
+    if _voice_map_version != voice_registry.version:
+        build_voice_map()
+    return OPENAI_VOICE_MAP
+
+
+def _load_pcm(path: str, sample_rate: Optional[int] = None):
+    """Decodes a rendered sentence to mono 16-bit PCM, resampled to match the stream. Returns (pcm, sample rate)."""
+    pcm, rate, channels = read_pcm(path)
+    if channels == 1 and (not sample_rate or rate == sample_rate):
+        return pcm, rate
+    import numpy as np
+    from functions.audio import resample, to_float32
+    audio = to_float32(np.frombuffer(pcm, dtype="<i2").reshape(-1, channels))
+    if sample_rate:
+        audio, rate = resample(audio, rate, sample_rate), sample_rate
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2").tobytes(), rate
+
+# Cache key variant of audio streamed sentence by sentence.
+STREAMED_VARIANT = "sentences"
+
+def _sse_event(payload: dict) -> bytes:
+    return f"data: {json.dumps(payload)}\n\n".encode("utf-8")
+
+class _SentencePipeline:
+    """Schedules sentence renders a few ahead of the one being streamed."""
+
+    def __init__(self, sentences: List[str], engine: str, voice_id: str, api_key: Optional[str], speed: float = 1.0):
+        self.sentences = sentences
+        self.engine = engine
+        self.voice_id = voice_id
+        self.api_key = api_key
+        self.speed = speed
+        self.pending = {}
+
+    def schedule(self, index: int):
+        """Queues a sentence if it isn't cached or queued yet. Raises QueueFullError."""
+        if index >= len(self.sentences) or index in self.pending:
+            return
+        sentence_request = SynthesizeRequest(engine=self.engine, voice=self.voice_id, text=self.sentences[index], api_key=self.api_key, speed=self.speed)
+        path, _ = _cache_path(sentence_request)
+        job = None
+        if not os.path.exists(path):
+            job = synthesis_scheduler.submit(self.engine, _generate_audio_file, sentence_request, path, key=path)
+        self.pending[index] = (job, path)
+
+    def schedule_window(self, start: int):
+        for index in range(start, start + STREAM_LOOKAHEAD_SENTENCES + 1):
+            try:
+                self.schedule(index)
+            except QueueFullError:
+                # Under load, read-ahead waits until the sentence is actually needed.
+                break
+
+    async def result(self, index: int) -> str:
+        while index not in self.pending:
+            try:
+                self.schedule(index)
+            except QueueFullError:
+                await asyncio.sleep(0.5)
+        job, path = self.pending.pop(index)
+        if job is not None:
+            await asyncio.shield(asyncio.wrap_future(job.future))
+        return path
+
+    def cancel(self):
+        for job, _ in self.pending.values():
+            if job is not None:
+                synthesis_scheduler.cancel(job.id)
+        self.pending.clear()
+
+def _publish(path: str, data: bytes, engine: str, voice: str):
+    with atomic_output(path) as temp_path:
+        with open(temp_path, "wb") as f:
+            f.write(data)
+    audio_cache.add(path, engine=engine, voice=voice)
+
+async def _stream_speech(pipeline: _SentencePipeline, response_format: str, master_path: str, output_path: str, sse: bool):
+    encoder = None
+    pcm_total = bytearray()
+    encoded_total = bytearray()
+    completed = False
+
+    def frame(chunk: bytes) -> bytes:
+        if sse:
+            return _sse_event({"type": "speech.audio.delta", "audio": base64.b64encode(chunk).decode("ascii")})
+        return chunk
+
+    try:
+        for index in range(len(pipeline.sentences)):
+            pipeline.schedule_window(index)
+            path = await pipeline.result(index)
+            pcm, sample_rate = await asyncio.to_thread(_load_pcm, path, encoder.sample_rate if encoder else None)
+
+            if encoder is None:
+                encoder = StreamEncoder(response_format, sample_rate)
+            pcm_total.extend(pcm)
+
+            chunk = await encoder.feed(pcm)
+            if chunk:
+                encoded_total.extend(chunk)
+                yield frame(chunk)
+
+        if encoder is not None:
+            chunk = await encoder.close()
+            if chunk:
+                encoded_total.extend(chunk)
+                yield frame(chunk)
+        if sse:
+            yield _sse_event({"type": "speech.audio.done"})
+        completed = True
+    except Exception as e:
+        if not sse:
+            raise
+        # The status line is long gone; tell the client in the stream instead.
+        yield _sse_event({"type": "error", "error": {"message": f"Failed to generate audio: {getattr(e, 'detail', None) or e}"}})
+        return
+    finally:
+        if not completed:
+            # Client went away or a render failed: stop work nobody will hear.
+            pipeline.cancel()
+            if encoder is not None:
+                encoder.abort()
+
+    if encoder is None:
+        return
+
+    # Keep the whole result in the cache for the next streamed request: the
+    # WAV master, plus the requested format if it's a different one. They go
+    # under the sentence-streamed key, since sentences rendered and normalized
+    # one by one don't sound like the same text rendered in one piece.
+    if not os.path.exists(master_path):
+        master = wav_header(encoder.sample_rate, 1, 2, len(pcm_total)) + bytes(pcm_total)
+        _publish(master_path, master, pipeline.engine, pipeline.voice_id)
+    if response_format != "wav" and not os.path.exists(output_path):
+        data = bytes(pcm_total) if response_format == "pcm" else bytes(encoded_total)
+        _publish(output_path, data, pipeline.engine, pipeline.voice_id)
+
+async def _render_cached(request: SynthesizeRequest, response_format: str) -> str:
+    """
+    Returns the cached file for a request in the given format, synthesizing the
+    WAV master and transcoding it only if they aren't cached yet.
+    """
+    master_path, _ = _cache_path(request)
+    output_path, _ = _cache_path(request, response_format)
+    if os.path.exists(output_path):
+        metrics.CACHE_LOOKUPS.inc(result="hit")
+        audio_cache.touch(output_path)
+        return output_path
+
+    if os.path.exists(master_path):
+        metrics.CACHE_LOOKUPS.inc(result="hit")
+        audio_cache.touch(master_path)
+    else:
+        start = time.perf_counter()
+        stages = await synthesis_scheduler.run(request.engine, _generate_audio_file, request, master_path, key=master_path) or {}
+        # Whatever the render itself doesn't account for was spent waiting for a worker.
+        add_phases({"queue": max(0.0, time.perf_counter() - start - sum(stages.values())), **stages})
+    if response_format != "wav":
+        with phase("encode"):
+            await synthesis_scheduler.run("transcode", _transcode_cached, request, master_path, output_path, response_format, key=output_path)
+    return output_path
+
+async def _stream_cached_file(path: str):
+    """Replays a cached result as server-sent events."""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(32768)
+            if not chunk:
+                break
+            yield _sse_event({"type": "speech.audio.delta", "audio": base64.b64encode(chunk).decode("ascii")})
+    yield _sse_event({"type": "speech.audio.done"})
 
 @openai_api_router.on_event("startup")
 async def startup_event():
@@ -91,63 +291,85 @@ async def startup_event():
 
 @openai_api_router.get("/v1/voices", response_model=List[Voice])
 async def list_openai_voices():
-    build_voice_map()  # Ensure the map is up-to-date
-    voices_list = []
-    for openai_name, info in OPENAI_VOICE_MAP.items():
-        voices_list.append(Voice(id=openai_name, name=f"{info['engine'].capitalize()}: {info['voice_id']}"))
-    return voices_list
+    get_voice_map()  # Ensure the map is up-to-date
+    return OPENAI_VOICES
 
 @openai_api_router.post("/v1/audio/speech")
 async def generate_speech(request: SpeechRequest, background_tasks: BackgroundTasks, api_key: Optional[str] = Header(None)):
     
-    # Rebuild voice map for dynamic voice changes
-    build_voice_map()
+    # Picks up voice changes without rescanning on every request
+    voice_map = get_voice_map()
 
     # Validate voice selection
-    if request.voice not in OPENAI_VOICE_MAP:
-        raise HTTPException(status_code=400, detail=f"Voice not supported. Choose from {list(OPENAI_VOICE_MAP.keys())}")
+    if request.voice not in voice_map:
+        raise HTTPException(status_code=400, detail=f"Voice not supported. Choose from {list(voice_map.keys())}")
 
-    voice_info = OPENAI_VOICE_MAP[request.voice]
+    voice_info = voice_map[request.voice]
     engine = voice_info["engine"]
     voice_id = voice_info["voice_id"]
+    set_params(engine=engine, voice=voice_id, text_length=len(request.input), format=request.response_format, stream=bool(request.stream or request.stream_format))
 
     # Validate output format
-    supported_formats = ["mp3", "opus", "aac", "flac", "wav"]
+    supported_formats = ["mp3", "opus", "aac", "flac", "wav", "pcm"]
     if request.response_format not in supported_formats:
         raise HTTPException(status_code=400, detail=f"Format {request.response_format} not supported. Use one of {supported_formats}")
 
+    if request.stream_format not in (None, "audio", "sse"):
+        raise HTTPException(status_code=400, detail="stream_format must be 'audio' or 'sse'.")
+    stream = request.stream or request.stream_format is not None
+    sse = request.stream_format == "sse"
+
     # Create a SynthesizeRequest for audio generation
     synthesize_request = SynthesizeRequest(
         engine=engine,
         voice=voice_id,
         text=request.input,
-        api_key=api_key # Pass the API key if provided
+        api_key=api_key, # Pass the API key if provided
+        speed=request.speed
     )
 
-    # Generate a unique hash for the audio file
-    hash_input = f"{request.input}-{voice_id}-{engine}-{request.response_format}"
-    unique_hash = hashlib.sha256(hash_input.encode('utf-8')).hexdigest()
-    output_filename = f"{unique_hash}.{request.response_format}"
-    output_path = os.path.join(AUDIO_CACHE_DIR, output_filename)
+    # Same cache entry as the web UI would use for this text and voice.
+    master_path, _ = _cache_path(synthesize_request)
+    output_path, _ = _cache_path(synthesize_request, request.response_format)
+    output_filename = os.path.basename(output_path)
+
+    if stream and not (os.path.exists(output_path) or os.path.exists(master_path)):
+        media_type = "text/event-stream" if sse else MEDIA_TYPES[request.response_format]
+        streamed_master, _ = _cache_path(synthesize_request, variant=STREAMED_VARIANT)
+        streamed_output, _ = _cache_path(synthesize_request, request.response_format, variant=STREAMED_VARIANT)
+        if os.path.exists(streamed_output):
+            # Streamed before: replay that rather than render the sentences again.
+            metrics.CACHE_LOOKUPS.inc(result="hit")
+            audio_cache.touch(streamed_output)
+            if sse:
+                return StreamingResponse(_stream_cached_file(streamed_output), media_type=media_type)
+            return FileResponse(path=streamed_output, media_type=media_type, filename=output_filename)
 
-    if not os.path.exists(output_path):
-        # Generate audio if not cached
+        sentences = split_sentences(request.input)
+        if not sentences:
+            raise HTTPException(status_code=400, detail="Input cannot be empty.")
+        pipeline = _SentencePipeline(sentences, engine, voice_id, api_key, request.speed)
         try:
-            _generate_audio_file(synthesize_request, output_path)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to generate audio: {str(e)}")
-
-    # Set media type based on format
-    media_types = {
-        "mp3": "audio/mpeg",
-        "opus": "audio/ogg", # Assuming opus is Ogg Opus
-        "aac": "audio/aac",
-        "flac": "audio/flac",
-        "wav": "audio/wav"
-    }
+            # Queue the first sentence now, so an overloaded server can still answer 503.
+            pipeline.schedule(0)
+        except QueueFullError as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+        return StreamingResponse(_stream_speech(pipeline, request.response_format, streamed_master, streamed_output, sse), media_type=media_type)
+
+    try:
+        output_path = await _render_cached(synthesize_request, request.response_format)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to generate audio: {str(e)}")
 
+    if stream and sse:
+        # Already cached: nothing to pipeline, replay the file as events.
+        return StreamingResponse(_stream_cached_file(output_path), media_type="text/event-stream")
     return FileResponse(
         path=output_path,
-        media_type=media_types[request.response_format],
+        media_type=MEDIA_TYPES[request.response_format],
         filename=output_filename
     )
\ No newline at end of file
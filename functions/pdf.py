@@ -0,0 +1,592 @@
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import threading
+import unicodedata
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from config import PDF_BATCH_PAGES, PDF_CACHE_DIR, PDF_CACHE_MAX_MB, PDF_WORKERS, OCR_WORKERS
+from functions.jobs import synthesis_scheduler, QueueFullError, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+
+_DIGEST = re.compile(r"^[0-9a-f]{64}$")
+
+# A page with fewer visible characters than this, and an image on it, is a scan.
+MIN_TEXT_CHARS = 16
+# Share of a page's visible characters that may be unreadable (U+FFFD,
+# private-use glyphs, control characters) or symbols before its text layer
+# counts as garbage, as from fonts without a Unicode mapping.
+GARBAGE_RATIO = 0.3
+
+def _write_atomic(path: str, text: str) -> int:
+    """Writes a file through a temporary one and returns its size."""
+    temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    size = os.path.getsize(temp_path)
+    os.replace(temp_path, path)
+    return size
+
+def _directory_bytes(path: str) -> int:
+    size = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.path.getsize(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+    return size
+
+def _page_path(pages_dir: str, number: int) -> str:
+    return os.path.join(pages_dir, f"{number:05d}.txt")
+
+def _ocr_marker_path(pages_dir: str, number: int) -> str:
+    return os.path.join(pages_dir, f"{number:05d}.ocr")
+
+def garbage_ratio(text: str) -> float:
+    """Share of the visible characters that are unreadable: replacement characters, private-use glyphs, control characters or stray symbols."""
+    visible = [c for c in text if not c.isspace()]
+    if not visible:
+        return 0.0
+    bad = sum(1 for c in visible if unicodedata.category(c) in ("Cc", "Cf", "Co", "Cn", "Cs", "So") or c == "\ufffd")
+    return bad / len(visible)
+
+def needs_ocr(text: str, has_images: bool) -> bool:
+    """Whether a page's text layer is missing or unusable, so its text has to come from OCR."""
+    visible = sum(1 for c in text if not c.isspace())
+    if visible < MIN_TEXT_CHARS:
+        # Blank pages and ones with just a page number are left alone unless there's a scan on them.
+        return has_images
+    return garbage_ratio(text) > GARBAGE_RATIO
+
+# --- Worker processes ---
+
+# Documents open in this worker process, by path, most recently used last.
+_documents = OrderedDict()
+_DOCUMENTS_KEPT = 4
+
+def _open(path: str):
+    import fitz
+    document = _documents.get(path)
+    if document is None:
+        document = _documents[path] = fitz.open(path)
+        while len(_documents) > _DOCUMENTS_KEPT:
+            _documents.popitem(last=False)[1].close()
+    _documents.move_to_end(path)
+    return document
+
+def _page_count(path: str) -> int:
+    return len(_open(path))
+
+def _extract_pages(path: str, pages_dir: str, numbers):
+    """
+    Writes the text of each 1-based page in `numbers` to its file in
+    `pages_dir`, marking the pages whose text layer is missing or garbage
+    for OCR. The marker goes first, so a page with text is never taken for
+    one that doesn't need OCR. Returns the bytes written.
+    """
+    document = _open(path)
+    written = 0
+    for number in numbers:
+        page = document.load_page(number - 1)
+        text = page.get_text()
+        if needs_ocr(text, bool(page.get_images())):
+            _write_atomic(_ocr_marker_path(pages_dir, number), "")
+        written += _write_atomic(_page_path(pages_dir, number), text)
+    return written
+
+def _init_ocr_worker():
+    # Tesseract would otherwise start a thread per core in every worker.
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+def _ocr_pages(path: str, pages_dir: str, numbers):
+    """Rasterizes and recognizes each page in `numbers`, one at a time, writing its text to `pages_dir`. Returns the bytes written."""
+    import pytesseract
+    from pdf2image import convert_from_path
+    written = 0
+    for number in numbers:
+        # Only this page is rasterized, so memory doesn't grow with the document.
+        image = convert_from_path(path, first_page=number, last_page=number)[0]
+        try:
+            text = pytesseract.image_to_string(image)
+        finally:
+            image.close()
+        written += _write_atomic(_page_path(pages_dir, number), text)
+    return written
+
+_pools = {}
+_pool_lock = threading.Lock()
+
+def _get_pool(name: str, workers: int, initializer=None) -> ProcessPoolExecutor:
+    with _pool_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            # Spawned, like the Whisper workers: MuPDF isn't safe to use from several threads.
+            pool = _pools[name] = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=initializer,
+            )
+        return pool
+
+def _drop_pool(name: str, pool: ProcessPoolExecutor):
+    """Forgets a broken pool, so the next job starts a fresh one."""
+    with _pool_lock:
+        if _pools.get(name) is pool:
+            del _pools[name]
+    pool.shutdown(wait=False)
+
+class PageKind:
+    """
+    One way of getting a page's text: where it's cached, the scheduler queue
+    and process pool it runs on, and how many pages a job handles.
+    """
+
+    def __init__(self, name: str, directory: str, batch_pages: int, workers: int, extract, initializer=None):
+        self.name = name
+        self.directory = directory
+        self.batch_pages = max(1, batch_pages)
+        self.workers = max(1, workers)
+        self.extract = extract
+        self.initializer = initializer
+
+    def pool(self) -> ProcessPoolExecutor:
+        return _get_pool(self.name, self.workers, self.initializer)
+
+    def run(self, fn, *args):
+        """
+        Runs `fn` in a worker process and returns its result. A worker that
+        died (a MuPDF crash, tesseract killed for memory) breaks the whole
+        pool, so it's replaced and the job tried once more on the new one.
+        """
+        pool = self.pool()
+        try:
+            return pool.submit(fn, *args).result()
+        except BrokenProcessPool:
+            print(f"A {self.name} worker process died; starting a new pool and retrying.")
+            _drop_pool(self.name, pool)
+            return self.pool().submit(fn, *args).result()
+
+# The text layer, read by PyMuPDF several pages per job, and OCR of the
+# pages without a usable one, which rasterizes and recognizes a single page
+# per job so progress is saved page by page and each worker holds one page
+# image at most.
+KINDS = {
+    "pdf": PageKind("pdf", "pages", PDF_BATCH_PAGES, PDF_WORKERS, _extract_pages),
+    "ocr": PageKind("ocr", "ocr", 1, OCR_WORKERS, _ocr_pages, _init_ocr_worker),
+}
+
+class PdfLibrary:
+    """
+    Text of uploaded PDFs, extracted page by page and cached on disk by the
+    document's SHA-256.
+
+    Each document gets a directory holding the PDF, an info file with its
+    page count and one text file per page and kind. Every page's text layer
+    is extracted; pages where it's missing or garbage are marked and only
+    those are OCR'd, their text merged back in page order. Pages are
+    extracted in fixed batches by a pool of worker processes, each batch a
+    job on the kind's scheduler queue keyed by document and batch, so a page
+    that's asked for joins the batch already queued for it. Pages a reader
+    asks for run at interactive priority; start() fills in the rest of the
+    document behind them at background priority, with one chain of batches
+    per worker so a large book never floods the queue.
+
+    Each document's size is kept in its info file and added to as its pages
+    are written, with the running total in memory, so checking the limit
+    never walks the cache. Once the documents take more than `max_bytes`,
+    the least recently used ones are deleted whole, except those with a
+    background run going or anything else reading them (see using()).
+    """
+
+    def __init__(self, root: str, max_bytes: int = 0, kinds: dict = KINDS):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.kinds = kinds
+        self._counts = {}
+        self._runs = {}
+        self._errors = {}
+        # Number of extractions and requests reading each document.
+        self._users = Counter()
+        # Bytes of each document, least recently used first, and their sum.
+        self._sizes = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._load_sizes()
+
+    def _directory(self, digest: str) -> str:
+        if not _DIGEST.match(digest):
+            raise ValueError(f"Not a SHA-256 digest: {digest}")
+        return os.path.join(self.root, digest)
+
+    def document_path(self, digest: str) -> str:
+        return os.path.join(self._directory(digest), "document.pdf")
+
+    def _pages_dir(self, digest: str, kind: str) -> str:
+        return os.path.join(self._directory(digest), self.kinds[kind].directory)
+
+    def exists(self, digest: str) -> bool:
+        return bool(_DIGEST.match(digest)) and os.path.exists(self.document_path(digest))
+
+    def temp_path(self) -> str:
+        """A path in the cache directory to write an upload to before add()."""
+        return os.path.join(self.root, f"upload-{uuid.uuid4().hex}.tmp")
+
+    def add(self, path: str, digest: str = None) -> str:
+        """
+        Moves a PDF into the library (or deletes it if already there) and
+        returns its digest. Doesn't evict; call evict() off the event loop.
+        """
+        if digest is None:
+            sha = hashlib.sha256()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    sha.update(block)
+            digest = sha.hexdigest()
+        document_path = self.document_path(digest)
+        if os.path.exists(document_path):
+            os.unlink(path)
+            self.touch(digest)
+        else:
+            os.makedirs(self._directory(digest), exist_ok=True)
+            os.replace(path, document_path)
+            size = os.path.getsize(document_path)
+            with self._lock:
+                self._total += size - self._sizes.pop(digest, 0)
+                self._sizes[digest] = size
+                self._save_info(digest, {"bytes": size})
+        return digest
+
+    # --- Size limit ---
+
+    def _load_sizes(self):
+        """
+        Reads every document's size from its info file, oldest use first.
+        Documents cached before sizes were recorded are measured once.
+        """
+        documents = []
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if not entry.is_dir():
+                    continue
+                if entry.name.startswith("deleted-"):
+                    # Left by a delete that was interrupted.
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                elif _DIGEST.match(entry.name):
+                    documents.append((entry.stat().st_mtime, entry.name))
+        for _, digest in sorted(documents):
+            size = self.info(digest).get("bytes")
+            if size is None:
+                size = _directory_bytes(self._directory(digest))
+                self.update_info(digest, bytes=size)
+            self._sizes[digest] = size
+            self._total += size
+
+    def _grow(self, digest: str, size: int):
+        """Adds bytes just written to a document's size."""
+        with self._lock:
+            if digest not in self._sizes:
+                return
+            self._sizes[digest] += size
+            self._total += size
+            self._save_info(digest, {"bytes": self._sizes[digest]})
+
+    def touch(self, digest: str):
+        """Marks a document as just used; its directory's mtime keeps the order across restarts."""
+        with self._lock:
+            if digest in self._sizes:
+                self._sizes.move_to_end(digest)
+        try:
+            os.utime(self._directory(digest))
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def using(self, digest: str):
+        """Keeps a document from being evicted or cleared until the block ends."""
+        with self._lock:
+            self._users[digest] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._users[digest] -= 1
+                if not self._users[digest]:
+                    del self._users[digest]
+
+    def _delete(self, digest: str) -> bool:
+        """Deletes a document and its text, unless something is using it."""
+        with self._lock:
+            if self._users[digest] or any(run_digest == digest for run_digest, _ in self._runs):
+                return False
+            self._total -= self._sizes.pop(digest, 0)
+            self._counts.pop(digest, None)
+            for kind in self.kinds:
+                self._errors.pop((digest, kind), None)
+            # Moved aside first, so nothing starts on a half-deleted directory.
+            trash = os.path.join(self.root, f"deleted-{digest}-{uuid.uuid4().hex[:8]}")
+            try:
+                os.rename(self._directory(digest), trash)
+            except FileNotFoundError:
+                return True
+        shutil.rmtree(trash, ignore_errors=True)
+        return True
+
+    def evict(self) -> int:
+        """
+        Deletes least recently used documents until the library fits in
+        max_bytes. Deletes files, so it's run off the event loop.
+        """
+        if self.max_bytes <= 0:
+            return 0
+        with self._lock:
+            total = self._total
+            documents = list(self._sizes.items())
+        evicted = 0
+        for digest, size in documents:
+            if total <= self.max_bytes:
+                break
+            if self._delete(digest):
+                total -= size
+                evicted += 1
+        return evicted
+
+    def clear(self) -> int:
+        """Deletes every document that isn't being extracted; returns how many."""
+        with self._lock:
+            digests = list(self._sizes)
+        return sum(1 for digest in digests if self._delete(digest))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "bytes": self._total,
+                "max_bytes": self.max_bytes,
+                "documents": len(self._sizes),
+            }
+
+    # --- Document info ---
+
+    def _info_path(self, digest: str) -> str:
+        return os.path.join(self._directory(digest), "info.json")
+
+    def info(self, digest: str) -> dict:
+        try:
+            with open(self._info_path(digest), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_info(self, digest: str, fields: dict):
+        """Must hold self._lock."""
+        info = self.info(digest)
+        info.update(fields)
+        _write_atomic(self._info_path(digest), json.dumps(info))
+
+    def update_info(self, digest: str, **fields):
+        with self._lock:
+            self._save_info(digest, fields)
+
+    def _load_count(self, digest: str) -> int:
+        with self.using(digest):
+            count = self.info(digest).get("pages")
+            if count is None:
+                count = self.kinds["pdf"].run(_page_count, self.document_path(digest))
+                self.update_info(digest, pages=count)
+            return count
+
+    async def page_count(self, digest: str) -> int:
+        self.touch(digest)
+        with self._lock:
+            count = self._counts.get(digest)
+        if count is None:
+            count = await synthesis_scheduler.run("pdf", self._load_count, digest, key=f"pdf:{digest}:count")
+            with self._lock:
+                self._counts[digest] = count
+        return count
+
+    # --- Cached text ---
+
+    def cached_page(self, digest: str, number: int, kind: str = "pdf"):
+        """Text of a page, or None if it hasn't been extracted yet."""
+        try:
+            with open(_page_path(self._pages_dir(digest, kind), number), "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def extracted(self, digest: str, kind: str = "pdf") -> int:
+        """Number of pages extracted so far."""
+        try:
+            return sum(1 for name in os.listdir(self._pages_dir(digest, kind)) if name.endswith(".txt"))
+        except FileNotFoundError:
+            return 0
+
+    def needs_ocr(self, digest: str, number: int) -> bool:
+        """Whether an extracted page had no usable text layer."""
+        return os.path.exists(_ocr_marker_path(self._pages_dir(digest, "pdf"), number))
+
+    def ocr_pages(self, digest: str):
+        """Pages extracted so far that need OCR, in order."""
+        try:
+            names = os.listdir(self._pages_dir(digest, "pdf"))
+        except FileNotFoundError:
+            return []
+        return sorted(int(name[:-4]) for name in names if name.endswith(".ocr"))
+
+    def page_text(self, digest: str, number: int):
+        """
+        Text of a page from its text layer or, for pages without a usable
+        one, from OCR. None until that's available.
+        """
+        if self.needs_ocr(digest, number):
+            return self.cached_page(digest, number, "ocr")
+        return self.cached_page(digest, number)
+
+    def leading_text(self, digest: str) -> str:
+        """Text of the pages available so far from the start of the document, up to the first one that isn't."""
+        texts = []
+        number = 1
+        while (text := self.page_text(digest, number)) is not None:
+            texts.append(text)
+            number += 1
+        return "".join(texts)
+
+    # --- Extraction ---
+
+    def _batch_numbers(self, digest: str, kind: str, batch: int, count: int):
+        batch_pages = self.kinds[kind].batch_pages
+        first = batch * batch_pages + 1
+        last = min(count, first + batch_pages - 1)
+        pages_dir = self._pages_dir(digest, kind)
+        return [n for n in range(first, last + 1) if not os.path.exists(_page_path(pages_dir, n))]
+
+    def _extract_batch(self, digest: str, kind: str, batch: int, count: int):
+        with self.using(digest):
+            numbers = self._batch_numbers(digest, kind, batch, count)
+            if numbers:
+                pages_dir = self._pages_dir(digest, kind)
+                os.makedirs(pages_dir, exist_ok=True)
+                page_kind = self.kinds[kind]
+                self._grow(digest, page_kind.run(page_kind.extract, self.document_path(digest), pages_dir, numbers))
+            return len(numbers)
+
+    def _submit_batch(self, digest: str, kind: str, batch: int, count: int, priority: int):
+        return synthesis_scheduler.submit(kind, self._extract_batch, digest, kind, batch, count, priority=priority, key=f"{kind}:{digest}:{batch}")
+
+    def _batches(self, kind: str, numbers):
+        batch_pages = self.kinds[kind].batch_pages
+        return sorted({(n - 1) // batch_pages for n in numbers})
+
+    def running(self, digest: str, kind: str = "pdf") -> bool:
+        with self._lock:
+            return (digest, kind) in self._runs
+
+    def error(self, digest: str, kind: str = "pdf"):
+        """Why a page failed in the last background run, if one did."""
+        with self._lock:
+            return self._errors.get((digest, kind))
+
+    def start(self, digest: str, count: int, kind: str = "pdf", on_done=None, pages=None) -> bool:
+        """
+        Extracts every page not cached yet, or just those in `pages`, in the
+        background. `on_done(error)` is called once every page has been
+        tried, with the first failure or None. Returns False if a run for
+        this document and kind is already going.
+        """
+        page_kind = self.kinds[kind]
+        batches = self._batches(kind, pages if pages is not None else range(1, count + 1))
+        chains = min(page_kind.workers, len(batches))
+        with self._lock:
+            if (digest, kind) in self._runs:
+                return False
+            self._runs[(digest, kind)] = {"chains": chains, "on_done": on_done}
+            self._errors.pop((digest, kind), None)
+        if chains == 0:
+            self._chain_done(digest, kind, None)
+        for chain in range(chains):
+            self._continue(digest, kind, batches, chain, count)
+        return True
+
+    def _continue(self, digest: str, kind: str, batches, index: int, count: int):
+        # Skip batches that are already done, then queue the next one of this chain.
+        step = self.kinds[kind].workers
+        while index < len(batches) and not self._batch_numbers(digest, kind, batches[index], count):
+            index += step
+        if index >= len(batches):
+            self._chain_done(digest, kind, None)
+            return
+        batch = batches[index]
+        try:
+            job = self._submit_batch(digest, kind, batch, count, PRIORITY_BACKGROUND)
+        except QueueFullError as e:
+            # The rest is extracted when it's asked for.
+            print(f"Background {kind} extraction of PDF {digest[:12]} stopped at batch {batch}: {e}")
+            self._chain_done(digest, kind, str(e))
+            return
+
+        def next_batch(future):
+            if future.cancelled() or future.exception() is not None:
+                error = "cancelled" if future.cancelled() else str(future.exception())
+                print(f"{kind} extraction of page batch {batch} of PDF {digest[:12]} failed: {error}")
+                with self._lock:
+                    self._errors.setdefault((digest, kind), error)
+            self._continue(digest, kind, batches, index + step, count)
+
+        job.future.add_done_callback(next_batch)
+
+    def _chain_done(self, digest: str, kind: str, error):
+        with self._lock:
+            if error is not None:
+                self._errors.setdefault((digest, kind), error)
+            run = self._runs[(digest, kind)]
+            run["chains"] -= 1
+            if run["chains"] > 0:
+                return
+            del self._runs[(digest, kind)]
+            error = self._errors.get((digest, kind))
+        if run["on_done"] is not None:
+            run["on_done"](error)
+
+    async def _extract(self, digest: str, kind: str, numbers, count: int, priority: int):
+        """Extracts the missing pages among `numbers` ahead of background work."""
+        missing = [b for b in self._batches(kind, numbers) if self._batch_numbers(digest, kind, b, count)]
+        # At most a few batches in flight per request, so reading a whole book
+        # doesn't fill the scheduler queue.
+        window = self.kinds[kind].workers * 2
+        for i in range(0, len(missing), window):
+            jobs = [self._submit_batch(digest, kind, b, count, priority) for b in missing[i:i + window]]
+            await asyncio.gather(*(asyncio.shield(asyncio.wrap_future(job.future)) for job in jobs))
+
+    async def pages(self, digest: str, first: int, last: int, priority: int = PRIORITY_INTERACTIVE):
+        """
+        Text of pages `first` to `last` (1-based, inclusive) as [(number, text)],
+        extracting the missing ones ahead of background work. Pages without
+        a usable text layer are OCR'd, and only those.
+        """
+        with self.using(digest):
+            count = await self.page_count(digest)
+            numbers = range(first, min(last, count) + 1)
+            await self._extract(digest, "pdf", numbers, count, priority)
+            scanned = [n for n in numbers if self.needs_ocr(digest, n)]
+            if scanned:
+                await self._extract(digest, "ocr", scanned, count, priority)
+            return [(n, self.page_text(digest, n) or "") for n in numbers]
+
+    async def text_layer(self, digest: str) -> str:
+        """The whole document's text layer, pages joined in order, without OCR."""
+        with self.using(digest):
+            count = await self.page_count(digest)
+            await self._extract(digest, "pdf", range(1, count + 1), count, PRIORITY_INTERACTIVE)
+            return "".join(self.cached_page(digest, n) or "" for n in range(1, count + 1))
+
+# Shared library of uploaded PDFs.
+pdf_library = PdfLibrary(PDF_CACHE_DIR, PDF_CACHE_MAX_MB * 1024 * 1024)
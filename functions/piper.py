@@ -1,19 +1,133 @@
 import subprocess
-from functions.audio import normalize_audio
-from config import DEVICE
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from functions.audio import normalize_audio, save_audio
+from functions.metrics import stage
+from config import DEVICE, PIPER_POOL_SIZE, PIPER_IDLE_TIMEOUT
 
-def piper_process_audio(voice, lang, text, output):
-    
+# piper-tts >= 1.3 exports PiperVoice at the top level, older releases from piper.voice.
+try:
+    from piper import PiperVoice, SynthesisConfig
+except ImportError:
+    SynthesisConfig = None
+    try:
+        from piper.voice import PiperVoice
+    except ImportError:
+        PiperVoice = None
+
+class _PiperWorker:
+    def __init__(self, model_path):
+        self.model_path = model_path
+        self.voice = PiperVoice.load(model_path, use_cuda=(DEVICE == 'cuda'))
+        self.last_used = time.time()
+
+    def synthesize(self, text, speed=1.0):
+        """Returns (audio, sample_rate) without touching the disk."""
+        self.last_used = time.time()
+        sample_rate = self.voice.config.sample_rate
+        # Piper speeds up by shortening phonemes, relative to the voice's own default.
+        length_scale = (getattr(self.voice.config, "length_scale", None) or 1.0) / speed
+        if hasattr(self.voice, "synthesize_wav"):
+            # piper-tts >= 1.3 yields float chunks, one per sentence.
+            chunks = [chunk.audio_float_array for chunk in self.voice.synthesize(text, syn_config=SynthesisConfig(length_scale=length_scale))]
+            audio = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
+        else:
+            audio = np.frombuffer(b"".join(self.voice.synthesize_stream_raw(text, length_scale=length_scale)), dtype=np.int16)
+        self.last_used = time.time()
+        return audio, sample_rate
+
+class PiperPool:
+    """
+    Keeps Piper voices loaded as in-process ONNX sessions, keyed by .onnx path.
+
+    At most `size` voices stay resident (least recently used go first), and a
+    voice that hasn't been used for `idle_timeout` seconds is unloaded.
+    ONNX Runtime sessions are safe to run from several threads at once.
+    """
+
+    def __init__(self, size: int, idle_timeout: float):
+        self.size = max(1, size)
+        self.idle_timeout = idle_timeout
+        self._workers = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+        self._reaper = None
+
+    def _start_reaper(self):
+        if self._reaper is not None or self.idle_timeout <= 0:
+            return
+        self._reaper = threading.Thread(target=self._reap_loop, name="piper-pool-reaper", daemon=True)
+        self._reaper.start()
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(max(self.idle_timeout / 2, 1))
+            self.reap()
+
+    def reap(self):
+        """Unloads voices that have been idle for longer than the timeout."""
+        now = time.time()
+        with self._lock:
+            for path in [p for p, w in self._workers.items() if now - w.last_used > self.idle_timeout]:
+                del self._workers[path]
+                print(f"Unloaded idle Piper voice {path}")
+
+    def get(self, model_path: str) -> _PiperWorker:
+        with self._lock:
+            worker = self._workers.get(model_path)
+            if worker is not None:
+                self._workers.move_to_end(model_path)
+                return worker
+            load_lock = self._loading.setdefault(model_path, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                worker = self._workers.get(model_path)
+                if worker is not None:
+                    return worker
+
+            with stage("load"):
+                worker = _PiperWorker(model_path)
+
+            with self._lock:
+                self._workers[model_path] = worker
+                while len(self._workers) > self.size:
+                    self._workers.popitem(last=False)
+                self._loading.pop(model_path, None)
+            self._start_reaper()
+            return worker
+
+    def stats(self):
+        with self._lock:
+            return [{"model": w.model_path, "idle_seconds": round(time.time() - w.last_used, 1)} for w in self._workers.values()]
+
+piper_pool = PiperPool(PIPER_POOL_SIZE, PIPER_IDLE_TIMEOUT)
+
+def _piper_subprocess(voice, text, output, speed=1.0):
+    # Fallback for installs that only ship the piper executable.
     command = [
         "piper",
         "--model", voice,
         "--output_file", output
     ]
 
+    if speed != 1.0:
+        command.extend(["--length_scale", str(1.0 / speed)])
+
     if DEVICE == 'cuda':
         command.append('--cuda')
 
     subprocess.run(command, input=text, text=True, check=True, encoding='utf-8')
 
-    # Normalize the audio
-    normalize_audio(output)
\ No newline at end of file
+def piper_process_audio(voice, lang, text, output, speed=1.0):
+
+    if PiperVoice is not None:
+        audio, sample_rate = piper_pool.get(voice).synthesize(text, speed)
+        # Normalize and save the audio
+        save_audio(output, audio, sample_rate)
+    else:
+        _piper_subprocess(voice, text, output, speed)
+        # Normalize the audio
+        normalize_audio(output)
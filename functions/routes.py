@@ -1,30 +1,35 @@
 import os
+import json
+import asyncio
+import time
 import hashlib
-import shutil
 import tempfile
 from io import BytesIO
 from typing import List, Dict, Optional
-import ebooklib
-import fitz
-import docx
 import requests
-import whisper
-import pytesseract
-from pdf2image import convert_from_bytes
-from PIL import Image
-from bs4 import BeautifulSoup
-from ebooklib import epub
-from fastapi import (APIRouter, BackgroundTasks, File, Form, HTTPException, Request, UploadFile)
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse
+from fastapi import (APIRouter, File, Form, Header, HTTPException, Query, Request, UploadFile, WebSocket, WebSocketDisconnect)
+from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
-from langdetect import detect
 
 # Import shared objects from app.py
 from config import templates, AUDIO_DIR, AUDIO_CACHE_DIR, COQUI_DIR, PIPER_DIR, KOKORO_DIR, USERS_DIR, DEVICE
+from config import READ_AHEAD_WINDOW, READ_SESSION_IDLE_TIMEOUT, READER_AUDIO_FORMAT
+from config import WHISPER_MODEL, WHISPER_STREAM_PARTIAL_SECONDS, WHISPER_STREAM_SILENCE_SECONDS, WHISPER_STREAM_MAX_SECONDS
 
 # Import other function modules
 from functions.users import UserManager
-from functions.webpage import extract_readable_content
+from functions.models import model_registry
+from functions.jobs import synthesis_scheduler, QueueFullError, PRIORITY_INTERACTIVE, PRIORITY_READ_AHEAD, PRIORITY_BACKGROUND
+from functions.events import event_bus, format_sse
+from functions.sessions import SessionManager
+from functions.text import split_text_into_chunks
+from functions.cache import atomic_output, audio_cache, cache_key, normalize_text
+from functions.encoding import encode_pcm, read_pcm, StreamDecoder, FFMPEG_FORMATS
+from functions.voices import Voice, voice_registry
+from functions import metrics
+from functions.timing import add_phases, phase, set_params, slow_log
+from functions.warmup import parse_preload, warmup
+from functions.pdf import pdf_library
 
 # Lazy imports for TTS engines - these will be imported only when needed
 def lazy_import_piper():
@@ -51,6 +56,38 @@ def lazy_import_chatterbox():
     from functions.chatterbox import chatterbox_process_audio
     return chatterbox_process_audio
 
+# Document, OCR and speech-to-text libraries are just as slow to import
+# (whisper pulls in torch), so they're loaded on first use too.
+def lazy_import_transcription():
+    from functions.transcription import transcribe_file, available_models
+    return transcribe_file, available_models
+
+def lazy_import_live_transcription():
+    from functions.transcription import SpeechSegmenter, transcribe_segment, get_model, available_models, SAMPLE_RATE
+    return SpeechSegmenter, transcribe_segment, get_model, available_models, SAMPLE_RATE
+
+def lazy_import_fitz():
+    import fitz
+    return fitz
+
+def lazy_import_epub():
+    import ebooklib
+    from ebooklib import epub
+    from bs4 import BeautifulSoup
+    return ebooklib, epub, BeautifulSoup
+
+def lazy_import_docx():
+    import docx
+    return docx
+
+def lazy_import_langdetect():
+    from langdetect import detect
+    return detect
+
+def lazy_import_webpage():
+    from functions.webpage import extract_readable_content
+    return extract_readable_content
+
 router = APIRouter()
 
 # --- Pydantic Models ---
@@ -63,10 +100,29 @@ class SynthesizeRequest(BaseModel):
     voice: str
     text: str
     api_key: Optional[str] = None
+    # Audio format to store and serve; defaults to READER_AUDIO_FORMAT.
+    format: Optional[str] = None
+    # Speaking rate, rendered by the engine rather than at playback.
+    speed: float = Field(1.0, ge=0.25, le=4.0)
 
-class Voice(BaseModel):
-    id: str
-    name: str
+class ReadSessionCreate(BaseModel):
+    engine: str
+    voice: str
+    lang: Optional[str] = 'en'
+    api_key: Optional[str] = None
+    # One of: pre-split chunks, raw text, or a stored book.
+    chunks: Optional[List[str]] = None
+    text: Optional[str] = None
+    username: Optional[str] = None
+    book_id: Optional[str] = None
+    position: int = 0
+    window: Optional[int] = None
+    chunk_size: int = 200
+    format: Optional[str] = None
+    speed: float = Field(1.0, ge=0.25, le=4.0)
+
+class ReadSessionSeek(BaseModel):
+    position: int
 
 class PdfText(BaseModel):
     text: str
@@ -79,9 +135,16 @@ class KokoroVoice(BaseModel):
     key: str
     URL: str
 
+class TranscriptSegment(BaseModel):
+    start: float
+    end: float
+    text: str
+
 class SpeechToTextResponse(BaseModel):
     text: str
     language: Optional[str] = None
+    segments: List[TranscriptSegment] = []
+    duration: Optional[float] = None
 
 class BookData(BaseModel):
     title: str
@@ -124,59 +187,24 @@ def check_model_directories():
 
 # --- Voice Listing ---
 
+# Local voices come from the shared registry, which only rescans a
+# model directory when it changes.
+
 # Coqui doesn't need model files, but we do list .wavs
 # that are used for voice cloning.
 def get_coqui_voices() -> List[Voice]:
-    voices = []
-    if not os.path.exists(COQUI_DIR):
-        return voices
-    for file_name in os.listdir(COQUI_DIR):
-        if file_name.endswith(".wav"):
-            voice_id = file_name.replace(".wav", "")
-            voices.append(Voice(id=voice_id, name=f"Coqui: {voice_id}"))
-    return voices
+    return voice_registry.voices("coqui")
 
 # Piper's models are just .onnx files.
 def get_piper_voices() -> List[Voice]:
-    voices = []
-    if not os.path.exists(PIPER_DIR):
-        return voices
-    for file_name in os.listdir(PIPER_DIR):
-        if file_name.endswith(".onnx"):
-            voice_id = file_name.replace(".onnx", "")
-            voices.append(Voice(id=voice_id, name=f"Piper: {voice_id}"))
-    return voices
+    return voice_registry.voices("piper")
 
 # Kokoro uses .pt for models files
 def get_kokoro_voices() -> List[Voice]:
-    voices = []
-    if not os.path.exists(KOKORO_DIR):
-        return voices
-    for file_name in os.listdir(KOKORO_DIR):
-        if file_name.endswith(".pt"):
-            voice_id = file_name.replace(".pt", "")
-            voices.append(Voice(id=voice_id, name=f"Kokoro: {voice_id}"))
-    return voices
-
-# Kitten doesn't need model files. And currently
-# has a limited selection of voices.
-def get_kitten_voices() -> List[Voice]:
-    output = []
-    voices = [
-        "expr-voice-2-m",
-        "expr-voice-2-f",
-        "expr-voice-3-m",
-        "expr-voice-3-f", 
-        "expr-voice-4-m",
-        "expr-voice-4-f",
-        "expr-voice-5-m",
-        "expr-voice-5-f"
-    ]
-
-    for voice in voices:
-        output.append(Voice(id=voice, name=f"Kitten: {voice}"))
+    return voice_registry.voices("kokoro")
 
-    return output
+def get_kitten_voices() -> List[Voice]:
+    return voice_registry.voices("kitten")
 
 # "Gemini Voice", or Google Cloud Text-To-Speech requires a service account 
 # JSON file, or the enviroment variable to authenticate with Google Cloud.
@@ -216,71 +244,112 @@ def get_gemini_voices(api_key: str) -> List[Voice]:
 # --- Speech Generation ---
 # -------------------------
 
-def _generate_audio_file(request: SynthesizeRequest, output_path: str):
+def _generate_audio_file(request: SynthesizeRequest, output_path: str, pinned: bool = False):
+    """
+    Renders a request into the audio cache at `output_path` and returns the
+    seconds spent in each stage (None if it was already cached). With
+    `pinned` the file is pinned as it's added to the cache.
+
+    WAV output is the master render itself. For other formats the master is
+    rendered into the cache first if it isn't there yet, then encoded in
+    memory, like every other format transcoded from it.
+    """
+    # Another caller may have published it while this job waited in the queue.
+    if os.path.exists(output_path):
+        if pinned:
+            audio_cache.add(output_path, engine=request.engine, voice=request.voice, pinned=True)
+        return
     try:
-        # ---
-        # Process audio with Piper
-        # ---
-        if request.engine == "piper":
-            model_path = os.path.join(PIPER_DIR, f"{request.voice}.onnx")
-            piper_process_audio = lazy_import_piper()
-            piper_process_audio(model_path, request.lang, request.text, output_path)
-        # ---
-        # Process audio with Coqui
-        # ---
-        elif request.engine == 'coqui':
-            voice_path = os.path.join(COQUI_DIR, f"{request.voice}.wav")
-            coqui_process_audio, _ = lazy_import_coqui()
-            coqui_process_audio(voice_path, request.lang, request.text, output_path)
-        elif request.engine == 'chatterbox':
-            voice_path = os.path.join(COQUI_DIR, f"{request.voice}.wav")
-            chatterbox_process_audio = lazy_import_chatterbox()
-            chatterbox_process_audio(voice_path, request.lang, request.text, output_path)
-        # ---
-        # Process audio with Kokoro
-        # ---
-        elif request.engine == "kokoro":
-            kokoro_process_audio = lazy_import_kokoro()
-            kokoro_process_audio(request.voice, False, request.text, output_path)
-        # ---
-        # Process audio with Google Cloud TTS
-        # ---
-        elif request.engine == "gemini":
-            use_env_var = "GOOGLE_APPLICATION_CREDENTIALS" in os.environ
-
-            gemini_process_audio, _ = lazy_import_gemini()
-            if os.path.exists(request.api_key):
-                print(f"Found '{request.api_key}', using it for authentication.")
-                gemini_process_audio(text=request.text, voice=request.voice, output_filename=output_path, credentials_json_path=request.api_key)
-            elif use_env_var:
-                print("Found GOOGLE_APPLICATION_CREDENTIALS environment variable, using it for authentication.")
-                # No need to pass the path, the function will find it automatically
-                gemini_process_audio(text=request.text, voice=request.voice, output_filename=output_path)
+        # The cache key is built from normalized text, so render exactly that.
+        request = request.copy(update={"text": normalize_text(request.text)})
+        response_format = os.path.splitext(output_path)[1][1:]
+        with metrics.track_synthesis(request.engine, request.voice) as stages:
+            # Engines write to a temporary file that is renamed into the cache when complete.
+            if response_format == "wav":
+                metrics.CACHE_LOOKUPS.inc(result="miss")
+                with atomic_output(output_path) as temp_path, metrics.stage("inference"):
+                    _run_engine(request, temp_path)
             else:
-                print("-" * 80)
-                print("WARNING: Could not find credentials.")
-                print("This script requires authentication to work.")
-                print("\nPlease do one of the following:")
-                print(f"1. Place your service account JSON key in this directory and name it '{local_credentials_file}'")
-                print("OR")
-                print("2. Set the GOOGLE_APPLICATION_CREDENTIALS environment variable.")
-                print("\nSee the README.md file for detailed instructions.")
-                print("-" * 80)
-        # ---
-        # Process audio with Kitten
-        # ---
-        elif request.engine == "kitten":
-            kitten_process_audio = lazy_import_kitten()
-            kitten_process_audio(request.voice, False, request.text, output_path)
-        # ---
-        # Or fail.
-        # ---
-        else:
-            raise ValueError("Unsupported TTS engine.")
+                master_path, _ = _cache_path(request)
+                if os.path.exists(master_path):
+                    metrics.CACHE_LOOKUPS.inc(result="hit")
+                    audio_cache.touch(master_path)
+                    _encode_cached(master_path, output_path, response_format)
+                else:
+                    metrics.CACHE_LOOKUPS.inc(result="miss")
+                    # The master is cached too, so other formats are transcoded from it.
+                    with atomic_output(master_path) as temp_path, metrics.stage("inference"):
+                        _run_engine(request, temp_path)
+                    audio_cache.add(master_path, engine=request.engine, voice=request.voice)
+                    _encode_cached(master_path, output_path, response_format)
+        audio_cache.add(output_path, engine=request.engine, voice=request.voice, pinned=pinned)
+        return stages
     except Exception as e:
+        metrics.SYNTHESIS_ERRORS.inc(engine=request.engine)
         print(f"Error generating audio for engine {request.engine}: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to generate audio. Reason: {str(e)}")
 
+def _run_engine(request: SynthesizeRequest, output_path: str):
+    # ---
+    # Process audio with Piper
+    # ---
+    if request.engine == "piper":
+        model_path = os.path.join(PIPER_DIR, f"{request.voice}.onnx")
+        piper_process_audio = lazy_import_piper()
+        piper_process_audio(model_path, request.lang, request.text, output_path, request.speed)
+    # ---
+    # Process audio with Coqui
+    # ---
+    elif request.engine == 'coqui':
+        voice_path = os.path.join(COQUI_DIR, f"{request.voice}.wav")
+        coqui_process_audio, _ = lazy_import_coqui()
+        coqui_process_audio(voice_path, request.lang, request.text, output_path, request.speed)
+    elif request.engine == 'chatterbox':
+        voice_path = os.path.join(COQUI_DIR, f"{request.voice}.wav")
+        chatterbox_process_audio = lazy_import_chatterbox()
+        chatterbox_process_audio(voice_path, request.lang, request.text, output_path, request.speed)
+    # ---
+    # Process audio with Kokoro
+    # ---
+    elif request.engine == "kokoro":
+        kokoro_process_audio = lazy_import_kokoro()
+        kokoro_process_audio(request.voice, False, request.text, output_path, request.speed)
+    # ---
+    # Process audio with Google Cloud TTS
+    # ---
+    elif request.engine == "gemini":
+        use_env_var = "GOOGLE_APPLICATION_CREDENTIALS" in os.environ
+
+        gemini_process_audio, _ = lazy_import_gemini()
+        if os.path.exists(request.api_key):
+            print(f"Found '{request.api_key}', using it for authentication.")
+            gemini_process_audio(text=request.text, voice=request.voice, output_filename=output_path, credentials_json_path=request.api_key, speed=request.speed)
+        elif use_env_var:
+            print("Found GOOGLE_APPLICATION_CREDENTIALS environment variable, using it for authentication.")
+            # No need to pass the path, the function will find it automatically
+            gemini_process_audio(text=request.text, voice=request.voice, output_filename=output_path, speed=request.speed)
+        else:
+            print("-" * 80)
+            print("WARNING: Could not find credentials.")
+            print("This script requires authentication to work.")
+            print("\nPlease do one of the following:")
+            print(f"1. Place your service account JSON key in this directory and name it '{local_credentials_file}'")
+            print("OR")
+            print("2. Set the GOOGLE_APPLICATION_CREDENTIALS environment variable.")
+            print("\nSee the README.md file for detailed instructions.")
+            print("-" * 80)
+    # ---
+    # Process audio with Kitten
+    # ---
+    elif request.engine == "kitten":
+        kitten_process_audio = lazy_import_kitten()
+        kitten_process_audio(request.voice, False, request.text, output_path, request.speed)
+    # ---
+    # Or fail.
+    # ---
+    else:
+        raise ValueError("Unsupported TTS engine.")
+
 # --- Standard routes ---
 
 @router.get("/", response_class=HTMLResponse)
@@ -324,6 +393,7 @@ async def download_piper_voice(voice: PiperVoice):
         config_path = os.path.join(PIPER_DIR, f"{voice.key}.onnx.json")
         with open(config_path, "w") as f:
             f.write(config_response.text)
+        voice_registry.invalidate("piper")
         return JSONResponse(content={"message": f"Successfully downloaded {voice.key}"})
     except requests.exceptions.RequestException as e:
         raise HTTPException(status_code=500, detail=f"Failed to download voice: {e}")
@@ -340,12 +410,35 @@ async def download_kokoro_voice(voice: KokoroVoice):
         with open(model_path, "wb") as f:
             for chunk in response.iter_content(chunk_size=8192):
                 f.write(chunk)
+        voice_registry.invalidate("kokoro")
         return JSONResponse(content={"message": f"Successfully downloaded {voice.key}"})
     except requests.exceptions.RequestException as e:
         raise HTTPException(status_code=500, detail=f"Failed to download voice: {e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
 
+def _precompute_conditioning(engine: str, voice_path: str):
+    if engine == "coqui":
+        from functions.coqui import precompute_coqui_latents
+        precompute_coqui_latents(voice_path)
+    else:
+        from functions.chatterbox import precompute_chatterbox_conds
+        precompute_chatterbox_conds(voice_path)
+
+def _queue_conditioning(voice_path: str):
+    """
+    Computes a new clip's speaker conditioning in the background, so its first
+    render doesn't pay for it. Chatterbox is only included if it's already
+    loaded, to avoid pulling a second large model into memory for this.
+    """
+    engines = ["coqui"] + (["chatterbox"] if model_registry.is_resident("chatterbox") else [])
+    for engine in engines:
+        try:
+            synthesis_scheduler.submit(engine, _precompute_conditioning, engine, voice_path, priority=PRIORITY_BACKGROUND, key=f"conditioning:{engine}:{voice_path}")
+        except QueueFullError:
+            # Not needed ahead of time; the first render computes it instead.
+            print(f"Queue full, not precomputing {engine} conditioning for {voice_path}")
+
 @router.post("/api/voice_cloning")
 async def voice_cloning(file: UploadFile = File(...)):    
     if not file.filename:
@@ -360,6 +453,8 @@ async def voice_cloning(file: UploadFile = File(...)):
         # Lazy import Coqui functions
         _, save_voice_sample = lazy_import_coqui()
         saved_path = save_voice_sample(audio_content, file.filename)
+        voice_registry.invalidate("coqui")
+        _queue_conditioning(saved_path)
         
         return JSONResponse(content={"message": f"Voice sample saved successfully as {os.path.basename(saved_path)}"}, status_code=200)
 
@@ -384,94 +479,502 @@ async def list_voices(engine: str, api_key: Optional[str] = None):
     else:
         return []
 
+# Engines that take the request's language into account. The others pick it
+# from the voice, so it stays out of their cache key.
+LANGUAGE_ENGINES = ("coqui", "chatterbox")
+
+def _cache_path(request: SynthesizeRequest, response_format: str = "wav", variant: str = None):
+    """
+    Returns the audio cache path and URL a render of this request is stored under.
+
+    The WAV file is the master every endpoint shares; other formats are
+    transcoded from it and cached next to it under the same key. A `variant`
+    keeps audio rendered differently, e.g. sentence by sentence, apart.
+    """
+    lang = request.lang if request.engine in LANGUAGE_ENGINES else None
+    output_filename = f"{cache_key(request.text, request.engine, request.voice, lang, request.speed, variant)}.{response_format}"
+    return os.path.join(AUDIO_CACHE_DIR, output_filename), f"/static/audio_cache/{output_filename}"
+
+def _encode_cached(master_path: str, output_path: str, response_format: str):
+    """Encodes a master render to another format in memory and publishes it at `output_path`."""
+    with metrics.stage("encode"):
+        pcm, sample_rate, channels = read_pcm(master_path)
+        data = encode_pcm(pcm, sample_rate, response_format, channels)
+    with atomic_output(output_path) as temp_path:
+        with open(temp_path, "wb") as f:
+            f.write(data)
+
+def _transcode_cached(request: SynthesizeRequest, master_path: str, output_path: str, response_format: str):
+    """Publishes a cached master render in another format, keeping the master."""
+    if os.path.exists(output_path):
+        return
+    # Its own render as far as the stage histogram goes, so the encode is recorded.
+    with metrics.track_synthesis(request.engine, request.voice):
+        _encode_cached(master_path, output_path, response_format)
+    audio_cache.add(output_path, engine=request.engine, voice=request.voice)
+
+def _reader_format(response_format: Optional[str]) -> str:
+    """The format the web reader asked for, or the configured default."""
+    response_format = response_format or READER_AUDIO_FORMAT
+    if response_format != "wav" and response_format not in FFMPEG_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format {response_format} not supported. Use wav or one of {list(FFMPEG_FORMATS)}.")
+    return response_format
+
+def _client_owner(client_id: Optional[str]):
+    """Event bus owner of the browser tab that sent X-Client-Id, if it did."""
+    return f"client:{client_id}" if client_id else None
+
+def _queue_synthesis(request: SynthesizeRequest, output_path: str, audio_url: str, priority: int = PRIORITY_INTERACTIVE, owner: str = None):
+    """Queues a render on the synthesis scheduler and announces its result to `owner` on the event bus."""
+    job = synthesis_scheduler.submit(request.engine, _generate_audio_file, request, output_path, priority=priority, key=output_path)
+    event_bus.watch(("synthesis", job.id), owner)
+    if job.joined:
+        # Joined an in-flight render of the same audio, which already announces itself.
+        return job
+
+    def _notify(future):
+        if future.cancelled():
+            return
+        error = future.exception()
+        status = "failed" if error else "ready"
+        event_bus.publish("synthesis", key=("synthesis", job.id), status=status, job_id=job.id, audio_url=audio_url, detail=job.error)
+        slow_log.record(
+            "render", job.finished - job.created, _job_phases(job),
+            engine=request.engine, voice=request.voice, text_length=len(request.text), format=os.path.splitext(output_path)[1][1:], status=status,
+        )
+
+    job.future.add_done_callback(_notify)
+    return job
+
+def _job_phases(job) -> dict:
+    """Queue wait plus the render stages a finished synthesis job reported."""
+    phases = {"queue": job.started - job.created} if job.started else {}
+    if isinstance(job.result, dict):
+        phases.update(job.result)
+    return phases
+
+def _submit_synthesis(request: SynthesizeRequest, output_path: str, audio_url: str, priority: int = PRIORITY_INTERACTIVE, owner: str = None):
+    """Like _queue_synthesis, turning a full queue into a 503."""
+    try:
+        return _queue_synthesis(request, output_path, audio_url, priority, owner)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
 @router.post("/api/synthesize")
-async def synthesize_speech(request: SynthesizeRequest, background_tasks: BackgroundTasks):
+async def synthesize_speech(request: SynthesizeRequest, client_id: Optional[str] = Header(None, alias="X-Client-Id")):
     if not request.text.strip():
         raise HTTPException(status_code=400, detail="Text cannot be empty.")
-    hash_input = f"{request.text}-{request.voice}-{request.engine}"
-    unique_hash = hashlib.sha256(hash_input.encode('utf-8')).hexdigest()
-    output_filename = f"{unique_hash}.wav"
-    output_path = os.path.join(AUDIO_CACHE_DIR, output_filename)
-    audio_url = f"/static/audio_cache/{output_filename}"
+    set_params(engine=request.engine, voice=request.voice, text_length=len(request.text))
+    output_path, audio_url = _cache_path(request, _reader_format(request.format))
     if os.path.exists(output_path):
+        metrics.CACHE_LOOKUPS.inc(result="hit")
+        audio_cache.touch(output_path)
         return JSONResponse(content={"audio_url": audio_url, "status": "ready"})
     else:
-        background_tasks.add_task(_generate_audio_file, request, output_path)
-        return JSONResponse(content={"audio_url": audio_url, "status": "generating"})
+        job = _submit_synthesis(request, output_path, audio_url, owner=_client_owner(client_id))
+        return JSONResponse(content={"audio_url": audio_url, "status": "generating", "job_id": job.id})
+
+# Seconds between keep-alive comments on the event stream.
+EVENTS_KEEPALIVE_SECONDS = 15
+
+@router.get("/api/events")
+async def server_events(request: Request, client: Optional[str] = None, user: Optional[str] = None):
+    """
+    Server-sent event stream of job completions: `synthesis`, `ocr` and `podcast`
+    events with a `ready` or `failed` status. Replaces polling for results.
+
+    Only the caller's own jobs are announced: those requested with the same
+    `client` ID in an X-Client-Id header, and the podcasts of `user`.
+    """
+    owners = {f"user:{user}"} if user else set()
+    if client:
+        owners.add(_client_owner(client))
+    queue = event_bus.subscribe(owners)
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while event_bus.is_subscribed(queue):
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=EVENTS_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            event_bus.unsubscribe(queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# --- Reading sessions ---
+
+def _session_request(session, index: int) -> SynthesizeRequest:
+    return SynthesizeRequest(engine=session.engine, voice=session.voice, lang=session.lang, text=session.chunks[index], api_key=session.api_key, format=session.response_format, speed=session.speed)
+
+def _schedule_session_chunk(session, index: int, priority: int):
+    request = _session_request(session, index)
+    output_path, audio_url = _cache_path(request, session.response_format)
+    if os.path.exists(output_path):
+        metrics.CACHE_LOOKUPS.inc(result="hit")
+        audio_cache.touch(output_path)
+        return None, audio_url
+    return _queue_synthesis(request, output_path, audio_url, priority, session.owner), audio_url
+
+def _session_chunk_ready(session, index: int) -> bool:
+    return os.path.exists(_cache_path(_session_request(session, index), session.response_format)[0])
 
-OCR_CACHE_DIR = os.path.join(tempfile.gettempdir(), "openwebtts_ocr_cache")
-os.makedirs(OCR_CACHE_DIR, exist_ok=True)
+session_manager = SessionManager(_schedule_session_chunk, _session_chunk_ready, READ_SESSION_IDLE_TIMEOUT)
 
-def _perform_ocr(pdf_bytes: bytes, task_id: str):
-    """Background task to perform OCR and save the result."""
+def _session_chunk_info(session, index: int):
+    output_path, audio_url = _cache_path(_session_request(session, index), session.response_format)
+    job = session.jobs.get(index)
+    if os.path.exists(output_path):
+        status = "ready"
+    elif job is not None and not job.done:
+        status = "generating"
+    elif job is not None and job.status == "failed":
+        status = "failed"
+    else:
+        status = "idle"
+    return {"index": index, "audio_url": audio_url, "status": status, "job_id": job.id if job else None}
+
+def _session_state(session):
+    end = min(session.position + session.window, len(session.chunks))
+    return {
+        "session_id": session.id,
+        "position": session.position,
+        "window": session.window,
+        "chunk_count": len(session.chunks),
+        "upcoming": [_session_chunk_info(session, index) for index in range(session.position, end)],
+    }
+
+def _get_session_or_404(session_id: str):
+    session = session_manager.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Reading session not found or expired.")
+    return session
+
+@router.post("/api/sessions")
+async def create_reading_session(request: ReadSessionCreate, client_id: Optional[str] = Header(None, alias="X-Client-Id")):
+    """
+    Registers a document for reading. The server chunks it (unless the client
+    sends its own chunks) and keeps the next `window` chunks synthesizing ahead
+    of the playback position.
+    """
+    server_chunks = None
+    if request.chunks:
+        chunks = list(request.chunks)
+    else:
+        text = request.text
+        if text is None and request.username and request.book_id:
+            user_data = user_manager.get_user_data(request.username)
+            book = (user_data or {}).get('books', {}).get(request.book_id)
+            if book is None:
+                raise HTTPException(status_code=404, detail="Book not found.")
+            text = book.get('ocr_text') or ('' if book.get('is_pdf') else book.get('content', ''))
+        if not text or not text.strip():
+            raise HTTPException(status_code=400, detail="Provide text, chunks, or a book with text content.")
+        server_chunks = split_text_into_chunks(text, request.chunk_size)
+        chunks = [chunk["text"].replace("\n", " ") for chunk in server_chunks]
+
+    if not chunks:
+        raise HTTPException(status_code=400, detail="Nothing to read.")
+
+    window = request.window if request.window is not None else READ_AHEAD_WINDOW
     try:
-        images = convert_from_bytes(pdf_bytes)
-        ocr_text = ""
-        for image in images:
-            ocr_text += pytesseract.image_to_string(image)
-        
-        result_path = os.path.join(OCR_CACHE_DIR, f"{task_id}.txt")
-        with open(result_path, "w", encoding="utf-8") as f:
-            f.write(ocr_text)
-        print(f"OCR for task {task_id} completed. Result saved to {result_path}")
-    except Exception as e:
-        print(f"Error during OCR for task {task_id}: {e}")
-        result_path = os.path.join(OCR_CACHE_DIR, f"{task_id}.error")
-        with open(result_path, "w", encoding="utf-8") as f:
-            f.write(str(e))
+        session = session_manager.create(chunks, request.engine, request.voice, request.lang, request.api_key, window, request.position, _reader_format(request.format), request.speed, _client_owner(client_id))
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+    content = _session_state(session)
+    if server_chunks is not None:
+        content["chunks"] = [{"index": i, **chunk} for i, chunk in enumerate(server_chunks)]
+    return JSONResponse(content=content)
+
+@router.get("/api/sessions/{session_id}")
+async def get_reading_session(session_id: str):
+    return JSONResponse(content=_session_state(_get_session_or_404(session_id)))
+
+@router.patch("/api/sessions/{session_id}")
+async def seek_reading_session(session_id: str, request: ReadSessionSeek):
+    """Moves the playback cursor; the read-ahead window follows it."""
+    session = _get_session_or_404(session_id)
+    try:
+        session_manager.seek(session, request.position)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    return JSONResponse(content=_session_state(session))
+
+@router.post("/api/sessions/{session_id}/chunks/{index}")
+async def get_reading_session_chunk(session_id: str, index: int):
+    """Returns a chunk's audio, queuing it at interactive priority if it isn't ready yet."""
+    session = _get_session_or_404(session_id)
+    if index < 0 or index >= len(session.chunks):
+        raise HTTPException(status_code=404, detail="Chunk index out of range.")
+    try:
+        session_manager.request_chunk(session, index)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    return JSONResponse(content=_session_chunk_info(session, index))
+
+@router.delete("/api/sessions/{session_id}")
+async def close_reading_session(session_id: str):
+    if not session_manager.close(session_id):
+        raise HTTPException(status_code=404, detail="Reading session not found or expired.")
+    return JSONResponse(content={"message": "Reading session closed."})
+
+@router.get("/api/jobs")
+async def get_jobs_overview():
+    """Queue depth and running jobs per engine."""
+    return JSONResponse(content=synthesis_scheduler.stats())
+
+@router.get("/api/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    job = synthesis_scheduler.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    # The render happened after /api/synthesize answered, so its breakdown is reported here.
+    if job.done:
+        add_phases(_job_phases(job))
+    return JSONResponse(content=job.to_dict())
+
+@router.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    if not synthesis_scheduler.cancel(job_id):
+        raise HTTPException(status_code=409, detail="Job is not queued.")
+    return JSONResponse(content={"message": "Job cancelled."})
+
+@router.get("/api/models")
+async def get_resident_models():
+    """Lists models kept warm in memory, with their load times and estimated size."""
+    return JSONResponse(content=model_registry.stats())
+
+@router.delete("/api/models")
+async def unload_models(engine: Optional[str] = None, variant: Optional[str] = None):
+    unloaded = model_registry.evict(engine=engine, variant=variant)
+    return JSONResponse(content={"message": f"Unloaded {unloaded} model(s)."})
+
+# Phrase rendered to warm an engine up: loads the model, the voice and any
+# conditioning, and runs inference once.
+WARMUP_TEXT = "Ready when you are."
+
+def _warm_voice(engine: str, voice: str):
+    fd, temp_path = tempfile.mkstemp(suffix=".wav")
+    os.close(fd)
+    try:
+        _run_engine(SynthesizeRequest(engine=engine, voice=voice, text=WARMUP_TEXT), temp_path)
+    finally:
+        os.unlink(temp_path)
+
+@router.on_event("startup")
+async def start_warmup():
+    import config
+    targets = parse_preload(config.PRELOAD)
+    if targets:
+        print(f"Warming up {', '.join(f'{e}:{v}' for e, v in targets)} in the background.")
+        warmup.start(targets, _warm_voice)
+
+@router.get("/ready")
+async def readiness():
+    """Warm-up progress of the --preload targets; 503 until every one has finished."""
+    status = warmup.status()
+    return JSONResponse(content=status, status_code=200 if status["ready"] else 503)
+
+@router.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics: render stage latencies, job queues, audio cache, OCR and transcription."""
+    for engine, stats in synthesis_scheduler.stats()["engines"].items():
+        metrics.JOBS_QUEUED.set(stats["queued"], engine=engine)
+        metrics.JOBS_RUNNING.set(stats["running"], engine=engine)
+    metrics.CACHE_BYTES.set(audio_cache.total_bytes)
+    metrics.CACHE_MAX_BYTES.set(audio_cache.max_bytes)
+    metrics.MODELS_RESIDENT_BYTES.set(int(model_registry.stats()["resident_mb"] * 1024 * 1024))
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+def _ocr_remaining(digest: str):
+    """Pages without a usable text layer that haven't been OCR'd yet."""
+    return [n for n in pdf_library.ocr_pages(digest) if pdf_library.cached_page(digest, n, "ocr") is None]
+
+def _start_ocr(digest: str, page_count: int):
+    """
+    OCRs the pages of a document that have no usable text layer, one by one
+    in the background; completion goes out on the event stream.
+    """
+    pages = _ocr_remaining(digest)
+    if not pages:
+        return
+    start = time.perf_counter()
+
+    def done(error):
+        seconds = time.perf_counter() - start
+        metrics.OCR_IN_PROGRESS.dec()
+        metrics.OCR_SECONDS.observe(seconds)
+        slow_log.record("ocr", seconds, task_id=digest, pages=len(pages))
+        if error is None:
+            print(f"OCR for task {digest} completed ({len(pages)} pages).")
+            metrics.OCR_JOBS.inc(status="ready")
+            event_bus.publish("ocr", key=("ocr", digest), status="ready", task_id=digest)
+        else:
+            print(f"Error during OCR for task {digest}: {error}")
+            metrics.OCR_JOBS.inc(status="failed")
+            event_bus.publish("ocr", key=("ocr", digest), status="failed", task_id=digest, detail=error)
+
+    metrics.OCR_IN_PROGRESS.inc()
+    if not pdf_library.start(digest, page_count, "ocr", on_done=done, pages=pages):
+        # Already running.
+        metrics.OCR_IN_PROGRESS.dec()
+
+def _extract_in_background(digest: str, page_count: int):
+    """Extracts a document's text layer in the background, then OCRs the pages that had none."""
+    def done(error):
+        if error is None:
+            _start_ocr(digest, page_count)
+    pdf_library.start(digest, page_count, on_done=done)
+
+# Bytes of an upload read at a time while it's written to disk.
+UPLOAD_CHUNK_BYTES = 1024 * 1024
 
 @router.post("/api/read_pdf")
-async def read_pdf(file: UploadFile = File(...), background_tasks: BackgroundTasks = None):
+async def read_pdf(file: UploadFile = File(...), paged: bool = Form(False), client_id: Optional[str] = Header(None, alias="X-Client-Id")):
+    """
+    Extracts the text of a PDF. Uploads are kept by SHA-256 and their pages
+    extracted by worker processes and cached, so reopening a document is
+    instant. Returns the whole text, or with `paged` just the first page,
+    the document's `hash` and `page_count`, while the rest is extracted in
+    the background for /api/pdf/{hash}/pages.
+
+    Pages whose text layer is missing or garbage (scans, fonts without a
+    Unicode mapping) are OCR'd, and only those, page by page in the
+    background; /api/ocr_result/{hash} reports progress and the text so far.
+    """
     if not file.filename.endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Invalid file type. Please upload a PDF.")
+    temp_path = pdf_library.temp_path()
     try:
-        pdf_bytes = await file.read()
-        pdf_document = fitz.open(stream=pdf_bytes, filetype="pdf")
-        text = ""
-        for page_num in range(len(pdf_document)):
-            page = pdf_document.load_page(page_num)
-            text += page.get_text()
-
-        if text.strip():
-            print("Extracted text directly from PDF.")
-            return JSONResponse(content={"status": "completed", "text": text})
-
-        # If text is empty, perform OCR in the background
-        print("No text in PDF, starting OCR in background.")
-        
-        # Generate a unique ID for this task
-        task_id = hashlib.sha256(pdf_bytes).hexdigest()
-        
-        # Check if result already exists (e.g. from a previous run)
-        result_path = os.path.join(OCR_CACHE_DIR, f"{task_id}.txt")
-        if os.path.exists(result_path):
-            with open(result_path, "r", encoding="utf-8") as f:
-                ocr_text = f.read()
-            return JSONResponse(content={"status": "completed", "text": ocr_text})
-
-        if background_tasks:
-            background_tasks.add_task(_perform_ocr, pdf_bytes, task_id)
-        
-        return JSONResponse(content={"status": "ocr_started", "task_id": task_id})
-
+        with phase("upload"):
+            # Streamed to disk rather than held in memory; the hash is the cache key.
+            sha = hashlib.sha256()
+            size = 0
+            with open(temp_path, "wb") as f:
+                while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+                    sha.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+        digest = sha.hexdigest()
+        # Held until the background runs that keep the document have started,
+        # so another upload's eviction can't delete it in between.
+        with pdf_library.using(digest):
+            with phase("upload"):
+                pdf_library.add(temp_path, digest)
+                await asyncio.to_thread(pdf_library.evict)
+            with phase("parse"):
+                page_count = await pdf_library.page_count(digest)
+                if paged:
+                    _extract_in_background(digest, page_count)
+                    text = (await pdf_library.pages(digest, 1, 1))[0][1] if page_count else ""
+                else:
+                    text = await pdf_library.text_layer(digest)
+            set_params(size_bytes=size, pages=page_count, paged=paged)
+
+            if paged:
+                done = pdf_library.extracted(digest) >= page_count and not _ocr_remaining(digest)
+                return JSONResponse(content={"status": "completed" if done else "extracting", "hash": digest, "page_count": page_count, "text": text})
+
+            scanned = pdf_library.ocr_pages(digest)
+            if not _ocr_remaining(digest):
+                print("Extracted text directly from PDF." if not scanned else "Extracted text from PDF, scanned pages from earlier OCR.")
+                if scanned:
+                    text = pdf_library.leading_text(digest)
+                return JSONResponse(content={"status": "completed", "text": text, "hash": digest, "page_count": page_count})
+
+            # OCR the pages without text in the background, with the document's hash as the task ID.
+            print(f"{len(scanned)} of {page_count} pages have no usable text, starting OCR in background.")
+            event_bus.watch(("ocr", digest), _client_owner(client_id))
+            _start_ocr(digest, page_count)
+            return JSONResponse(content={"status": "ocr_started", "task_id": digest, "hash": digest, "page_count": page_count, "ocr_pages": len(scanned)})
+
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to read PDF. Reason: {str(e)}")
+    finally:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+
+# Most pages /api/pdf/{hash}/pages returns at once.
+PDF_PAGES_PER_REQUEST = 50
+
+@router.get("/api/pdf/{digest}/pages")
+async def get_pdf_pages(digest: str, first: int = Query(1, alias="from", ge=1), last: Optional[int] = Query(None, alias="to", ge=1)):
+    """
+    Text of pages `from` to `to` (1-based, inclusive; just `from` without
+    `to`) of a PDF uploaded to /api/read_pdf, at most PDF_PAGES_PER_REQUEST
+    at once. Pages not extracted (or OCR'd) yet go ahead of the rest of the
+    document, so a reader can fetch the pages around the playback position
+    while a long book is still being processed.
+    """
+    if not pdf_library.exists(digest):
+        raise HTTPException(status_code=404, detail="Unknown PDF. Upload it to /api/read_pdf first.")
+    try:
+        page_count = await pdf_library.page_count(digest)
+        if first > page_count:
+            raise HTTPException(status_code=400, detail=f"Page {first} is past the end of the document ({page_count} pages).")
+        last = min(last or first, page_count, first + PDF_PAGES_PER_REQUEST - 1)
+        if last < first:
+            raise HTTPException(status_code=400, detail="'to' must not be before 'from'.")
+        set_params(pages=last - first + 1)
+        with phase("extract"):
+            pages = await pdf_library.pages(digest, first, last)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to read PDF pages. Reason: {str(e)}")
+    return JSONResponse(content={
+        "hash": digest,
+        "page_count": page_count,
+        "extracted": pdf_library.extracted(digest),
+        "from": first,
+        "to": last,
+        "pages": [{"page": number, "text": text} for number, text in pages],
+    })
 
 @router.get("/api/ocr_result/{task_id}")
-async def get_ocr_result(task_id: str):
-    result_path = os.path.join(OCR_CACHE_DIR, f"{task_id}.txt")
-    error_path = os.path.join(OCR_CACHE_DIR, f"{task_id}.error")
-
-    if os.path.exists(result_path):
-        with open(result_path, "r", encoding="utf-8") as f:
-            text = f.read()
-        return JSONResponse(content={"status": "completed", "text": text})
-    elif os.path.exists(error_path):
-        with open(error_path, "r", encoding="utf-8") as f:
-            error_message = f.read()
-        return JSONResponse(content={"status": "failed", "detail": error_message})
-    else:
-        return JSONResponse(content={"status": "processing"})
+async def get_ocr_result(task_id: str, client_id: Optional[str] = Header(None, alias="X-Client-Id")):
+    """
+    Progress of a document's OCR: `pages_done` of the `ocr_pages` that need
+    it, and the text available so far from the first page on (text layer
+    and OCR merged in page order), so reading can start long before the
+    last page is done. `completed` with the whole text once every page is.
+    """
+    if not pdf_library.exists(task_id):
+        return JSONResponse(content={"status": "failed", "detail": "Unknown OCR task."})
+    try:
+        page_count = await pdf_library.page_count(task_id)
+        scanned = pdf_library.ocr_pages(task_id)
+        remaining = _ocr_remaining(task_id)
+        progress = {"pages_done": len(scanned) - len(remaining), "ocr_pages": len(scanned), "page_count": page_count}
+        text_done = pdf_library.extracted(task_id) >= page_count
+        if text_done and not remaining:
+            return JSONResponse(content={"status": "completed", "text": pdf_library.leading_text(task_id), **progress})
+        # Interrupted runs (e.g. by a restart) carry on from the pages already done.
+        if not text_done:
+            if not pdf_library.running(task_id):
+                _extract_in_background(task_id, page_count)
+        elif not pdf_library.running(task_id, "ocr"):
+            error = pdf_library.error(task_id, "ocr")
+            if error:
+                return JSONResponse(content={"status": "failed", "detail": error, **progress})
+            _start_ocr(task_id, page_count)
+        event_bus.watch(("ocr", task_id), _client_owner(client_id))
+        return JSONResponse(content={"status": "processing", "text": pdf_library.leading_text(task_id), **progress})
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get OCR progress. Reason: {str(e)}")
 
 @router.post("/api/read_epub", response_model=PdfText)
 async def read_epub(file: UploadFile = File(...)):
@@ -483,6 +986,7 @@ async def read_epub(file: UploadFile = File(...)):
             temp_epub_file.write(epub_bytes)
             temp_epub_path = temp_epub_file.name
         try:
+            ebooklib, epub, BeautifulSoup = lazy_import_epub()
             book = epub.read_epub(temp_epub_path)
             full_html = []
             for item in book.get_items():
@@ -501,6 +1005,7 @@ async def read_docx(file: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail="Invalid file type. Please upload a DOCX file.")
     try:
         docx_bytes = await file.read()
+        docx = lazy_import_docx()
         doc = docx.Document(BytesIO(docx_bytes))
         full_text = []
         for para in doc.paragraphs:
@@ -510,16 +1015,26 @@ async def read_docx(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=f"Failed to read DOCX. Reason: {str(e)}")
 
 @router.get("/api/clear_cache")
-async def clear_cache():
+async def clear_cache(engine: Optional[str] = None, voice: Optional[str] = None):
+    """
+    Deletes cached audio, optionally only for one engine and/or voice.
+    Podcast audio is kept. Without a filter, cached PDF text goes too.
+    """
     try:
-        shutil.rmtree(AUDIO_CACHE_DIR)
-        os.makedirs(AUDIO_CACHE_DIR)
-        return JSONResponse(content={"message": "Cache cleared."})
+        removed = audio_cache.purge(engine=engine, voice=voice)
+        if engine is None and voice is None:
+            documents = await asyncio.to_thread(pdf_library.clear)
+            return JSONResponse(content={"message": f"Cache cleared ({removed} files, {documents} PDFs)."})
+        return JSONResponse(content={"message": f"Cache cleared ({removed} files)."})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to clear cache. Reason: {str(e)}")
 
 @router.post("/api/speech_to_text", response_model=SpeechToTextResponse)
-async def speech_to_text(file: UploadFile = File(...)):
+async def speech_to_text(file: UploadFile = File(...), model: Optional[str] = Form(None), language: Optional[str] = Form(None)):
+    """
+    Transcribes an uploaded recording with Whisper. `model` picks the model
+    size (WHISPER_MODEL by default); models stay loaded between requests.
+    """
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file provided")
     audio_extensions = {'.wav', '.mp3', '.m4a', '.flac', '.ogg', '.webm', '.aac', '.mp4'}
@@ -527,45 +1042,205 @@ async def speech_to_text(file: UploadFile = File(...)):
     if file_extension not in audio_extensions:
         raise HTTPException(status_code=400, detail=f"Invalid file type. Supported formats: {', '.join(audio_extensions)}")
     try:
-        audio_content = await file.read()
+        with phase("upload"):
+            audio_content = await file.read()
+        set_params(size_bytes=len(audio_content), format=file_extension, model=model)
+        transcribe_file, available_models = lazy_import_transcription()
+        if model and model not in available_models():
+            raise HTTPException(status_code=400, detail=f"Unknown Whisper model {model}. Choose from {available_models()}.")
         with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as temp_audio_file:
             temp_audio_file.write(audio_content)
             temp_audio_path = temp_audio_file.name
         try:
-            model = whisper.load_model("tiny")
-            result = model.transcribe(temp_audio_path)
-            transcribed_text = result["text"].strip()
-            detected_language = result.get("language", None)
-            return SpeechToTextResponse(text=transcribed_text, language=detected_language)
+            # Off the event loop, one transcription at a time.
+            result = await synthesis_scheduler.run("whisper", transcribe_file, temp_audio_path, model, language)
+            add_phases(result["phases"])
+            return SpeechToTextResponse(text=result["text"], language=result["language"], segments=result["segments"], duration=result["duration"])
         finally:
             if os.path.exists(temp_audio_path):
                 os.unlink(temp_audio_path)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to transcribe audio. Reason: {str(e)}")
 
-def get_folder_size(folder_path):
-    total_size = 0
-    for dirpath, dirnames, filenames in os.walk(folder_path):
-        for f in filenames:
-            fp = os.path.join(dirpath, f)
-            if not os.path.islink(fp):
-                total_size += os.path.getsize(fp)
-    return total_size
+# Utterances a live session may have waiting for transcription before it
+# stops reading audio from the client, which bounds what a session holds.
+STREAM_PENDING_SEGMENTS = 3
+# Characters of the transcript so far given to Whisper as context.
+STREAM_PROMPT_CHARS = 200
+STREAM_FORMATS = ("pcm", "opus")
+
+@router.websocket("/api/speech_to_text/stream")
+async def speech_to_text_stream(websocket: WebSocket, model: Optional[str] = None, language: Optional[str] = None, format: str = "pcm", sample_rate: int = 16000):
+    """
+    Live transcription. The client sends microphone audio as binary messages,
+    either 16-bit little-endian mono PCM at `sample_rate` (format=pcm) or the
+    WebM/Ogg Opus stream MediaRecorder produces (format=opus), and the text
+    message {"type": "stop"} when it's done.
+
+    The server answers with JSON messages: `ready` once the model is loaded,
+    `partial` transcripts of the utterance in progress about every
+    WHISPER_STREAM_PARTIAL_SECONDS, a `final` one when a pause ends it, and
+    `done` after the stop. Utterances are found by voice activity detection
+    and transcribed on the resident Whisper model, one at a time through the
+    "whisper" queue; partials give way to finals and are skipped while one is
+    still running.
+    """
+    await websocket.accept()
+
+    async def fail(detail: str, code: int = 1011):
+        await websocket.send_json({"type": "error", "detail": detail})
+        await websocket.close(code=code)
+
+    if format not in STREAM_FORMATS:
+        return await fail(f"Unsupported format {format}. Use one of {', '.join(STREAM_FORMATS)}.", 1003)
+    if sample_rate <= 0:
+        return await fail("sample_rate must be positive.", 1003)
+    SpeechSegmenter, transcribe_segment, get_model, available_models, SAMPLE_RATE = lazy_import_live_transcription()
+    size = model or WHISPER_MODEL
+    try:
+        if model and model not in available_models():
+            return await fail(f"Unknown Whisper model {model}. Choose from {available_models()}.", 1008)
+        await synthesis_scheduler.run("whisper", get_model, size, key=f"whisper:{size}")
+    except QueueFullError as e:
+        return await fail(str(e), 1013)
+    except Exception as e:
+        return await fail(f"Failed to load Whisper. Reason: {str(e)}")
+
+    segmenter = SpeechSegmenter(SAMPLE_RATE, silence_seconds=WHISPER_STREAM_SILENCE_SECONDS, max_seconds=WHISPER_STREAM_MAX_SECONDS)
+    if format == "opus":
+        decoder = StreamDecoder(SAMPLE_RATE)
+    elif sample_rate != SAMPLE_RATE:
+        decoder = StreamDecoder(SAMPLE_RATE, "s16le", sample_rate)
+    else:
+        decoder = None
+    pending = asyncio.Queue(maxsize=STREAM_PENDING_SEGMENTS)
+    # Later utterances keep the language of the first and follow on from the text so far.
+    context = {"language": language, "prompt": None}
+    send_lock = asyncio.Lock()
+
+    async def send_final(index, start, audio):
+        end = round(start + len(audio) / SAMPLE_RATE, 2)
+        try:
+            result = await synthesis_scheduler.run("whisper", transcribe_segment, audio, size, context["language"], start, context["prompt"])
+        except Exception as e:
+            async with send_lock:
+                await websocket.send_json({"type": "error", "segment": index, "detail": f"Failed to transcribe. Reason: {str(e)}"})
+            return
+        context["language"] = context["language"] or result["language"]
+        if result["text"]:
+            context["prompt"] = f"{context['prompt'] or ''} {result['text']}".strip()[-STREAM_PROMPT_CHARS:]
+        async with send_lock:
+            await websocket.send_json({"type": "final", "segment": index, "start": round(start, 2), "end": end, "text": result["text"], "language": result["language"]})
+
+    async def transcribe_finals():
+        while True:
+            segment = await pending.get()
+            if segment is None:
+                return
+            try:
+                await send_final(*segment)
+            except Exception as e:
+                # Most likely the client went away; keep draining so the reader isn't blocked.
+                print(f"Couldn't send a live transcript: {e}")
+
+    async def send_partial(index, start, audio):
+        try:
+            result = await synthesis_scheduler.run("whisper", transcribe_segment, audio, size, context["language"], start, context["prompt"], priority=PRIORITY_READ_AHEAD)
+        except Exception as e:
+            print(f"Partial transcript failed: {e}")
+            return
+        async with send_lock:
+            # Stale once the utterance has ended; its final is on the way.
+            if segmenter.index == index and segmenter.active and result["text"]:
+                await websocket.send_json({"type": "partial", "segment": index, "start": round(start, 2), "text": result["text"]})
+
+    finals = asyncio.create_task(transcribe_finals())
+    partial = None
+    last_partial = 0.0
+
+    async def consume(pcm: bytes):
+        nonlocal partial, last_partial
+        for segment in segmenter.feed_pcm(pcm):
+            await pending.put(segment)
+        now = time.perf_counter()
+        if (segmenter.active and segmenter.duration >= WHISPER_STREAM_PARTIAL_SECONDS and pending.empty()
+                and (partial is None or partial.done()) and now - last_partial >= WHISPER_STREAM_PARTIAL_SECONDS):
+            last_partial = now
+            partial = asyncio.create_task(send_partial(*segmenter.current()))
+
+    metrics.LIVE_TRANSCRIPTIONS.inc()
+    try:
+        await websocket.send_json({"type": "ready", "model": size, "sample_rate": SAMPLE_RATE})
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes") is not None:
+                data = message["bytes"]
+                await consume(await decoder.feed(data) if decoder else data)
+            elif message.get("text") is not None:
+                try:
+                    command = json.loads(message["text"]).get("type")
+                except (ValueError, AttributeError):
+                    command = None
+                if command == "stop":
+                    break
+
+        if decoder is not None:
+            await consume(await decoder.close())
+            decoder = None
+        segment = segmenter.flush()
+        if segment is not None:
+            await pending.put(segment)
+        await pending.put(None)
+        await finals
+        async with send_lock:
+            await websocket.send_json({"type": "done", "duration": round(segmenter.position / SAMPLE_RATE, 2)})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        try:
+            await fail(f"Live transcription failed. Reason: {str(e)}")
+        except Exception:
+            pass
+    finally:
+        metrics.LIVE_TRANSCRIPTIONS.dec()
+        finals.cancel()
+        if partial is not None:
+            partial.cancel()
+        if decoder is not None:
+            decoder.abort()
 
 @router.get("/api/cache_size")
 async def get_cache_size():
     try:
-        size_in_bytes = get_folder_size(AUDIO_CACHE_DIR)
+        size_in_bytes = audio_cache.total_bytes
         size_in_mb = size_in_bytes / (1024 * 1024)
         return JSONResponse(content={"cache_size_mb": f"{size_in_mb:.2f} MB"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get cache size. Reason: {str(e)}")
 
+@router.get("/api/cache")
+async def get_cache_stats():
+    """Audio cache size, cap, entry count and a per-engine breakdown, plus the PDF text cache."""
+    return JSONResponse(content={**audio_cache.stats(), "pdf": pdf_library.stats()})
+
 # -----------------------
 # --- User Management ---
 # -----------------------
 user_manager = UserManager(USERS_DIR)
 
+def _podcast_audio_files():
+    """Cache files of every ready podcast, which the audio cache keeps pinned."""
+    return [p['audio_url'] for p in user_manager.all_podcasts() if p.get('status') == 'ready' and p.get('audio_url')]
+
+audio_cache.pin_source = _podcast_audio_files
+
 class UserCreate(BaseModel):
     username: str
     password: str
@@ -599,9 +1274,13 @@ async def read_website(request: ReadWebsiteRequest):
         headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
         }
-        response = requests.get(request.url, headers=headers)
-        response.raise_for_status()  # Raise an exception for HTTP errors
-        content = extract_readable_content(response.text)
+        set_params(url=request.url)
+        with phase("fetch"):
+            response = requests.get(request.url, headers=headers)
+            response.raise_for_status()  # Raise an exception for HTTP errors
+        with phase("parse"):
+            extract_readable_content = lazy_import_webpage()
+            content = extract_readable_content(response.text)
         return PdfText(text=content)
     except requests.exceptions.RequestException as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch website content: {e}")
@@ -611,6 +1290,7 @@ async def read_website(request: ReadWebsiteRequest):
 @router.post("/api/detect_lang")
 async def detect_lang(request: DetectLangRequest):
     try:
+        detect = lazy_import_langdetect()
         lang = detect(request.text)
         return JSONResponse(content={"language": lang})
     except Exception as e:
@@ -726,6 +1406,12 @@ async def delete_book_route(username: str, book_id: str):
 
 @router.delete("/api/users/{username}/podcasts/{podcast_id}")
 async def delete_podcast_route(username: str, podcast_id: str):
+    user_data = user_manager.get_user_data(username)
+    podcast = (user_data or {}).get('podcasts', {}).get(podcast_id)
+    if podcast and podcast.get('status') == 'ready' and podcast.get('audio_url'):
+        # The audio may be evicted from the cache again.
+        audio_cache.unpin(os.path.basename(podcast['audio_url']))
+
     success = user_manager.delete_podcast(username, podcast_id)
     if not success:
         raise HTTPException(status_code=404, detail="Podcast not found or user does not exist.")
@@ -741,16 +1427,22 @@ async def edit_book_route(username: str, book_id: str, book_update: BookUpdate):
         raise HTTPException(status_code=404, detail="Book not found.")
     return {"message": "Book updated successfully."}
 
-async def _generate_and_update_podcast_audio(username: str, podcast_id: str, request: SynthesizeRequest, output_path: str, audio_url: str):
+def _generate_and_update_podcast_audio(username: str, podcast_id: str, request: SynthesizeRequest, output_path: str, audio_url: str):
     try:
-        _generate_audio_file(request, output_path)
-        user_manager.update_podcast(username, podcast_id, {"status": "ready", "audio_url": audio_url})
+        # Kept out of cache eviction until the podcast is deleted.
+        _generate_audio_file(request, output_path, pinned=True)
+        if not user_manager.update_podcast(username, podcast_id, {"status": "ready", "audio_url": audio_url}):
+            # Deleted while it was generating, before there was a pin to drop.
+            audio_cache.unpin(output_path)
+            return
+        event_bus.publish("podcast", owners={f"user:{username}"}, status="ready", podcast_id=podcast_id, audio_url=audio_url)
     except Exception as e:
         print(f"Error generating podcast audio for {username}/{podcast_id}: {e}")
         user_manager.update_podcast(username, podcast_id, {"status": "failed", "error": str(e)})
+        event_bus.publish("podcast", owners={f"user:{username}"}, status="failed", podcast_id=podcast_id, detail=str(e))
 
 @router.post("/api/users/{username}/podcast")
-async def generate_podcast_route(username: str, podcast: PodcastGenerate, background_tasks: BackgroundTasks):
+async def generate_podcast_route(username: str, podcast: PodcastGenerate):
     if not podcast.text.strip():
         raise HTTPException(status_code=400, detail="Podcast text cannot be empty.")
 
@@ -762,12 +1454,7 @@ async def generate_podcast_route(username: str, podcast: PodcastGenerate, backgr
         api_key=podcast.api_key
     )
 
-    # Generate a unique hash for the audio file
-    hash_input = f"{podcast.text}-{podcast.voice}-{podcast.engine}"
-    unique_hash = hashlib.sha256(hash_input.encode('utf-8')).hexdigest()
-    output_filename = f"{unique_hash}.wav"
-    output_path = os.path.join(AUDIO_CACHE_DIR, output_filename)
-    audio_url = f"/static/audio_cache/{output_filename}"
+    output_path, audio_url = _cache_path(synthesize_request)
 
     # Add initial podcast entry with 'Generating' status
     podcast_data = podcast.dict()
@@ -778,8 +1465,13 @@ async def generate_podcast_route(username: str, podcast: PodcastGenerate, backgr
     if not success:
         raise HTTPException(status_code=404, detail="User not found or failed to add podcast.")
     
-    # Schedule the audio generation as a background task
-    background_tasks.add_task(_generate_and_update_podcast_audio, username, podcast_id, synthesize_request, output_path, audio_url)
+    # Schedule the audio generation behind interactive reader requests.
+    # Not keyed: each podcast entry needs its own status update.
+    try:
+        synthesis_scheduler.submit(podcast.engine, _generate_and_update_podcast_audio, username, podcast_id, synthesize_request, output_path, audio_url, priority=PRIORITY_BACKGROUND)
+    except QueueFullError as e:
+        user_manager.update_podcast(username, podcast_id, {"status": "failed", "error": str(e)})
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
 
     return JSONResponse(content={
         "message": "Podcast generation started.",
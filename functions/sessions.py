@@ -0,0 +1,136 @@
+import threading
+import time
+import uuid
+
+from functions.jobs import synthesis_scheduler, QueueFullError, PRIORITY_INTERACTIVE, PRIORITY_READ_AHEAD
+
+class ReadSession:
+    def __init__(self, chunks, engine: str, voice: str, lang: str, api_key: str, window: int, response_format: str = "wav", speed: float = 1.0, owner: str = None):
+        self.id = uuid.uuid4().hex
+        # Who the chunks' completion events go to.
+        self.owner = owner
+        self.chunks = chunks
+        self.engine = engine
+        self.voice = voice
+        self.lang = lang
+        self.api_key = api_key
+        self.response_format = response_format
+        self.speed = speed
+        self.window = max(1, window)
+        self.position = 0
+        self.jobs = {}
+        self.last_active = time.time()
+        self.lock = threading.Lock()
+
+class SessionManager:
+    """
+    Keeps a window of upcoming chunks synthesizing ahead of each reader's cursor.
+
+    `schedule(session, index, priority)` queues one chunk and returns
+    (job or None if cached, audio_url); `is_ready(session, index)` tells
+    whether the chunk's audio is already published. Both come from routes.py,
+    which owns the audio cache layout.
+    """
+
+    def __init__(self, schedule, is_ready, idle_timeout: float):
+        self.schedule = schedule
+        self.is_ready = is_ready
+        self.idle_timeout = idle_timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def create(self, chunks, engine: str, voice: str, lang: str, api_key: str, window: int, position: int = 0, response_format: str = "wav", speed: float = 1.0, owner: str = None) -> ReadSession:
+        self.prune()
+        session = ReadSession(chunks, engine, voice, lang, api_key, window, response_format, speed, owner)
+        with self._lock:
+            self._sessions[session.id] = session
+        self.seek(session, position)
+        return session
+
+    def get(self, session_id: str):
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is not None:
+            session.last_active = time.time()
+        return session
+
+    def close(self, session_id: str) -> bool:
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        self._cancel_all(session)
+        return True
+
+    def prune(self):
+        """Closes sessions nobody has touched for idle_timeout seconds."""
+        now = time.time()
+        with self._lock:
+            expired = [s for s in self._sessions.values() if now - s.last_active > self.idle_timeout]
+            for session in expired:
+                del self._sessions[session.id]
+        for session in expired:
+            self._cancel_all(session)
+
+    def _cancel_all(self, session: ReadSession):
+        with session.lock:
+            for job in session.jobs.values():
+                synthesis_scheduler.cancel(job.id)
+            session.jobs.clear()
+
+    def _ensure(self, session: ReadSession, index: int, priority: int):
+        """Queues a chunk, or raises its queued job to `priority`. Must hold session.lock."""
+        job = session.jobs.get(index)
+        if job is not None and not job.done:
+            # Never lowered, like submit() joining a key: the job may be shared
+            # with an interactive request for the same chunk.
+            if job.status == "queued" and priority < job.priority:
+                synthesis_scheduler.reprioritize(job.id, priority)
+            return job
+        if self.is_ready(session, index):
+            return None
+        job, _ = self.schedule(session, index, priority)
+        if job is not None:
+            session.jobs[index] = job
+        return job
+
+    def seek(self, session: ReadSession, position: int):
+        """
+        Moves the playback cursor and re-prioritizes the read-ahead window.
+
+        Queued chunks that fell out of the window are cancelled, the chunk under
+        the cursor is promoted to interactive priority and the rest of the window
+        is queued behind it. Raises QueueFullError only if the cursor chunk
+        itself can't be queued.
+        """
+        with session.lock:
+            session.last_active = time.time()
+            session.position = max(0, min(position, len(session.chunks) - 1))
+            start = session.position
+            end = min(start + session.window, len(session.chunks))
+
+            for index, job in list(session.jobs.items()):
+                if job.done:
+                    del session.jobs[index]
+                elif (index < start or index >= end) and synthesis_scheduler.cancel(job.id):
+                    del session.jobs[index]
+
+            for index in range(start, end):
+                priority = PRIORITY_INTERACTIVE if index == start else PRIORITY_READ_AHEAD
+                try:
+                    self._ensure(session, index, priority)
+                except QueueFullError:
+                    if index == start:
+                        raise
+                    # The rest of the window will be queued on the next seek.
+                    break
+
+    def request_chunk(self, session: ReadSession, index: int):
+        """Makes sure one chunk is being rendered at interactive priority and returns its job."""
+        with session.lock:
+            session.last_active = time.time()
+            return self._ensure(session, index, PRIORITY_INTERACTIVE)
+
+    def stats(self):
+        with self._lock:
+            return {"sessions": len(self._sessions)}
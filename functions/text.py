@@ -0,0 +1,105 @@
+import re
+
+# Sentence terminators, including CJK full-width punctuation.
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?;:。！？；])\s+|\n\s*\n')
+
+def split_long_text(text: str, max_chars: int):
+    """Splits a run of text longer than max_chars at the last comma or space that fits."""
+    pieces = []
+    while len(text) > max_chars:
+        cut = max(text.rfind(', ', 0, max_chars), text.rfind('，', 0, max_chars))
+        if cut > max_chars // 2:
+            cut += 1
+        else:
+            cut = text.rfind(' ', 0, max_chars)
+        if cut <= 0:
+            cut = max_chars
+        pieces.append(text[:cut].strip())
+        text = text[cut:].strip()
+    if text:
+        pieces.append(text)
+    return pieces
+
+def split_sentences(text: str, max_chars: int = 300):
+    """
+    Splits text into sentences for incremental synthesis.
+
+    Sentences longer than max_chars are broken further at commas or spaces,
+    so no single piece holds up the pipeline for too long.
+    """
+    sentences = []
+    for sentence in _SENTENCE_BOUNDARY.split(text):
+        sentence = " ".join(sentence.split())
+        if sentence:
+            sentences.extend(split_long_text(sentence, max_chars))
+    return sentences
+
+def split_by_bytes(text: str, max_bytes: int):
+    """
+    Packs whole sentences into pieces of at most max_bytes of UTF-8, for APIs
+    that limit request size in bytes. Text that already fits is returned as is.
+    """
+    if len(text.encode("utf-8")) <= max_bytes:
+        return [text]
+    pieces = []
+    current = ""
+    for sentence in split_sentences(text, max_bytes):
+        # A UTF-8 character takes at most 4 bytes.
+        parts = [sentence] if len(sentence.encode("utf-8")) <= max_bytes else split_long_text(sentence, max(1, max_bytes // 4))
+        for part in parts:
+            candidate = f"{current} {part}" if current else part
+            if len(candidate.encode("utf-8")) <= max_bytes:
+                current = candidate
+            else:
+                if current:
+                    pieces.append(current)
+                current = part
+    if current:
+        pieces.append(current)
+    return pieces
+
+def split_text_into_chunks(text: str, chunk_size: int = 200):
+    """
+    Splits text into reader chunks, keeping words, phrases and HTML tags intact.
+
+    Mirrors splitTextIntoChunks in static/js/helpers.js so server-side sessions
+    produce the same chunks as the browser. Returns dicts with the chunk text
+    and its start and end offsets in `text`.
+    """
+    chunks = []
+    current = 0
+    length = len(text)
+
+    while current < length:
+        chunk_end = min(current + chunk_size, length)
+
+        if chunk_end < length:
+            word_boundary = text.rfind(' ', 0, chunk_end + 1)
+            sentence_boundary = max(text.rfind('. ', 0, chunk_end + 2), text.rfind('! ', 0, chunk_end + 2), text.rfind('? ', 0, chunk_end + 2))
+            if sentence_boundary != -1:
+                sentence_boundary += 1 # Keep the punctuation with its sentence
+
+            tag_boundary = -1
+            for i in range(chunk_end, current - 1, -1):
+                if text[i] == '>':
+                    tag_boundary = i + 1
+                    break
+                elif text[i] == '<':
+                    tag_boundary = i
+                    break
+
+            best_boundary = max(word_boundary, sentence_boundary, tag_boundary)
+            if best_boundary > current and best_boundary > current + chunk_size * 0.5:
+                chunk_end = best_boundary
+            elif word_boundary > current:
+                chunk_end = word_boundary
+
+        chunk_text = text[current:chunk_end].strip()
+        if chunk_text:
+            chunks.append({"text": chunk_text, "start": current, "end": chunk_end})
+
+        current = chunk_end
+        while current < length and text[current].isspace():
+            current += 1
+
+    return chunks
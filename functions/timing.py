@@ -0,0 +1,114 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from config import SLOW_REQUEST_LOG, SLOW_REQUEST_SECONDS
+
+# Endpoints whose responses carry a Server-Timing header.
+TIMED_PATHS = ("/api/synthesize", "/api/jobs/", "/api/read_pdf", "/api/pdf/", "/api/read_website", "/api/speech_to_text", "/v1/audio/speech")
+
+class RequestTimer:
+    """
+    Phase durations of one request, reported in its Server-Timing header.
+
+    `params` holds what the slow-request log should record about the request
+    (engine, voice, text length...), filled in by the handler.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = {}
+        self.params = {}
+
+    def add(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def header(self) -> str:
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.phases.items()]
+        entries.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(entries)
+
+_current = ContextVar("request_timer", default=None)
+
+def current_timer():
+    """The timer of the request being handled, or None outside a timed request."""
+    return _current.get()
+
+@contextmanager
+def phase(name: str):
+    """Times a block as a phase of the current request, if it's a timed one."""
+    timer = _current.get()
+    if timer is None:
+        yield
+        return
+    with timer.phase(name):
+        yield
+
+def set_params(**params):
+    """Records request parameters for the slow-request log, if the request is timed."""
+    timer = _current.get()
+    if timer is not None:
+        timer.params.update(params)
+
+def add_phases(phases: dict):
+    """Adds durations measured elsewhere (e.g. a render on a worker thread) to the current request."""
+    timer = _current.get()
+    if timer is not None and phases:
+        for name, seconds in phases.items():
+            timer.add(name, seconds)
+
+class SlowRequestLog:
+    """Appends requests and renders that took longer than `threshold` seconds to a JSON lines file."""
+
+    def __init__(self, path: str, threshold: float):
+        self.path = path
+        self.threshold = threshold
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, seconds: float, phases: dict = None, **params):
+        if self.threshold <= 0 or seconds < self.threshold:
+            return
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "kind": kind,
+            "seconds": round(seconds, 3),
+            "phases": {name: round(value, 3) for name, value in (phases or {}).items()},
+            **params,
+        }
+        line = json.dumps(entry, ensure_ascii=False)
+        print(f"Slow {kind}: {line}")
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            print(f"Couldn't write to the slow request log {self.path}: {e}")
+
+slow_log = SlowRequestLog(SLOW_REQUEST_LOG, SLOW_REQUEST_SECONDS)
+
+async def server_timing_middleware(request, call_next):
+    """Times requests to TIMED_PATHS, sets their Server-Timing header and logs slow ones."""
+    path = request.url.path
+    if not path.startswith(TIMED_PATHS):
+        return await call_next(request)
+    timer = RequestTimer()
+    token = _current.set(timer)
+    try:
+        response = await call_next(request)
+    finally:
+        _current.reset(token)
+    response.headers["Server-Timing"] = timer.header()
+    slow_log.record("request", timer.elapsed(), timer.phases, path=path, status=response.status_code, **timer.params)
+    return response
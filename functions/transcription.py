@@ -0,0 +1,290 @@
+import multiprocessing
+import os
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import config
+from config import WHISPER_CHUNK_SECONDS, WHISPER_WORKERS
+from functions.audio import frame_levels, split_on_silence
+from functions.metrics import TRANSCRIPTION_SECONDS
+from functions.models import model_registry
+
+# Whisper works on 16 kHz mono audio.
+SAMPLE_RATE = 16000
+
+def _load(size: str, device: str):
+    import whisper
+    return whisper.load_model(size, device=device)
+
+def available_models():
+    import whisper
+    return whisper.available_models()
+
+def get_model(size: str):
+    """The resident Whisper model of this size, loaded on first use."""
+    return model_registry.get("whisper", size, config.DEVICE, lambda: _load(size, config.DEVICE))
+
+def load_audio(path: str) -> np.ndarray:
+    """Decodes any format ffmpeg reads to 16 kHz mono float32."""
+    import whisper
+    return whisper.load_audio(path, sr=SAMPLE_RATE)
+
+def _transcribe(model, audio: np.ndarray, language: str = None, offset: float = 0.0, prompt: str = None):
+    result = model.transcribe(audio, language=language, initial_prompt=prompt, fp16=(str(model.device) != "cpu"))
+    segments = [
+        {"start": round(s["start"] + offset, 2), "end": round(s["end"] + offset, 2), "text": s["text"].strip()}
+        for s in result.get("segments", [])
+    ]
+    return {"text": result["text"].strip(), "language": result.get("language"), "segments": segments}
+
+# --- Worker processes ---
+
+# Parameters of each Whisper model, in millions. Workers run on CPU in
+# float32, so each copy holds about four bytes per parameter.
+_MODEL_PARAMS = {"tiny": 39, "base": 74, "small": 244, "medium": 769, "large": 1550, "turbo": 809}
+
+def _model_bytes(size: str) -> int:
+    name = "turbo" if "turbo" in size else size.split(".")[0].split("-")[0]
+    return _MODEL_PARAMS.get(name, _MODEL_PARAMS["large"]) * 1_000_000 * 4
+
+def _worker_count(size: str) -> int:
+    """
+    Processes a recording is spread across with this model. Each keeps its
+    own copy, so there are no more than fit in MODEL_MEMORY_BUDGET_MB next to
+    the models already resident in this process.
+    """
+    budget = config.MODEL_MEMORY_BUDGET_MB * 1024 * 1024
+    if budget <= 0:
+        return WHISPER_WORKERS
+    budget -= model_registry.resident_bytes()
+    return max(1, min(WHISPER_WORKERS, budget // _model_bytes(size)))
+
+# Model loaded in this worker process, as (size, model).
+_worker_model = None
+
+def _init_worker(threads: int):
+    # Split the cores between processes instead of every one using all of them.
+    import torch
+    torch.set_num_threads(threads)
+
+def _transcribe_piece(size: str, audio: np.ndarray, language: str, offset: float):
+    global _worker_model
+    if _worker_model is None or _worker_model[0] != size:
+        # One model per worker, so its memory stays what _worker_count() allowed for.
+        _worker_model = None
+        _worker_model = (size, _load(size, "cpu"))
+    return _transcribe(_worker_model[1], audio, language, offset)
+
+# The pool and the model size it was sized for.
+_pool = None
+_pool_size = None
+_pool_lock = threading.Lock()
+
+def _submit(size: str, pieces):
+    """
+    Queues each (audio, language, offset) piece on the worker pool for this
+    model size, replacing a pool sized for another model. The lookup and
+    every submit share one lock, so a concurrent replacement can't shut the
+    pool down in between.
+    """
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is None or _pool_size != size:
+            if _pool is not None:
+                # Pieces already submitted still finish on the old pool.
+                _pool.shutdown(wait=False)
+            workers = _worker_count(size)
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            # Spawned rather than forked: torch doesn't survive fork with threads running.
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(threads,),
+            )
+            _pool_size = size
+        return [_pool.submit(_transcribe_piece, size, *piece) for piece in pieces]
+
+def _merge(pieces):
+    """Joins per-piece results in order; the language is the one most pieces detected."""
+    languages = Counter(p["language"] for p in pieces if p["language"])
+    return {
+        "text": " ".join(p["text"] for p in pieces if p["text"]),
+        "language": languages.most_common(1)[0][0] if languages else None,
+        "segments": [s for p in pieces for s in p["segments"]],
+    }
+
+def transcribe_file(path: str, size: str = None, language: str = None):
+    """
+    Transcribes an audio file and returns its text, language, timestamped
+    segments, duration and the time spent per phase.
+
+    Recordings longer than about 1.5 x WHISPER_CHUNK_SECONDS are cut at pauses
+    and the pieces transcribed in parallel by up to WHISPER_WORKERS processes
+    (on CPU; a GPU runs them one after another on the resident model), then
+    merged with their timestamps shifted back into place. Each process loads
+    its own copy of the model, so the count is capped to what fits in
+    MODEL_MEMORY_BUDGET_MB; if only one fits, the resident model is used.
+    """
+    size = size or config.WHISPER_MODEL
+    phases = {}
+    start = time.perf_counter()
+    audio = load_audio(path)
+    phases["decode"] = time.perf_counter() - start
+
+    ranges = split_on_silence(audio, SAMPLE_RATE, WHISPER_CHUNK_SECONDS)
+    with TRANSCRIPTION_SECONDS.time(model=size):
+        if len(ranges) > 1 and _worker_count(size) > 1 and config.DEVICE == "cpu":
+            started = time.perf_counter()
+            futures = _submit(size, [(audio[a:b], language, a / SAMPLE_RATE) for a, b in ranges])
+            result = _merge([f.result() for f in futures])
+            phases["transcribe"] = time.perf_counter() - started
+        else:
+            started = time.perf_counter()
+            model = get_model(size)
+            phases["load"] = time.perf_counter() - started
+            started = time.perf_counter()
+            result = _merge([_transcribe(model, audio[a:b], language, a / SAMPLE_RATE) for a, b in ranges])
+            phases["transcribe"] = time.perf_counter() - started
+
+    result["duration"] = round(len(audio) / SAMPLE_RATE, 2)
+    result["pieces"] = len(ranges)
+    result["phases"] = phases
+    return result
+
+# --- Live transcription ---
+
+def transcribe_segment(audio: np.ndarray, size: str = None, language: str = None, offset: float = 0.0, prompt: str = None):
+    """
+    Transcribes one utterance of a live stream on the resident model.
+    `prompt` is the text before it, which Whisper uses as context.
+    """
+    return _transcribe(get_model(size or config.WHISPER_MODEL), audio, language, offset, prompt)
+
+class SpeechSegmenter:
+    """
+    Cuts a live 16 kHz stream into utterances with energy-based voice
+    activity detection.
+
+    A frame is speech when it's `threshold_db` above the noise floor (and
+    above `floor_db`). The floor follows quiet frames down at once and rises
+    slowly, so the pauses between words keep it at the background level. An
+    utterance starts at the first speech frame, with `pre_roll_seconds` of
+    audio before it so soft onsets aren't clipped, and ends after
+    `silence_seconds` without speech or once it's `max_seconds` long.
+    Utterances with less than `min_speech_seconds` of speech (clicks, bumps)
+    are dropped. Only the utterance in progress is kept, so memory stays
+    bounded however long the stream runs.
+    """
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, silence_seconds: float = 0.6, max_seconds: float = 30.0,
+                 pre_roll_seconds: float = 0.3, min_speech_seconds: float = 0.2, threshold_db: float = 10.0,
+                 floor_db: float = -50.0, frame_ms: float = 30.0):
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.frame = max(1, int(sample_rate * frame_ms / 1000))
+        self.threshold_db = threshold_db
+        self.floor_db = floor_db
+        self.silence_frames = max(1, round(silence_seconds * 1000 / frame_ms))
+        self.max_frames = max(1, int(max_seconds * 1000 / frame_ms))
+        self.min_speech_frames = max(1, round(min_speech_seconds * 1000 / frame_ms))
+        self._pre_roll = deque(maxlen=round(pre_roll_seconds * 1000 / frame_ms))
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._odd_byte = b""
+        self._frames = []
+        self._speech = 0
+        self._silent = 0
+        self._start = 0
+        self._noise = None
+        # Samples consumed so far, in whole frames.
+        self.position = 0
+        # Number of the utterance in progress (or the next one).
+        self.index = 0
+
+    @property
+    def active(self) -> bool:
+        return bool(self._frames)
+
+    @property
+    def duration(self) -> float:
+        """Length of the utterance in progress, in seconds."""
+        return len(self._frames) * self.frame / self.sample_rate
+
+    def current(self):
+        """(index, start seconds, audio) of the utterance in progress, or None."""
+        if not self._frames:
+            return None
+        return self.index, self._start / self.sample_rate, np.concatenate(self._frames)
+
+    def _is_speech(self, level: float) -> bool:
+        if self._noise is None:
+            self._noise = level
+        speech = level > max(self._noise + self.threshold_db, self.floor_db)
+        if level < self._noise:
+            self._noise = level
+        else:
+            self._noise += 0.01 * (level - self._noise)
+        return speech
+
+    def _finish(self):
+        frames, speech, silent = self._frames, self._speech, self._silent
+        self._frames = []
+        self._speech = self._silent = 0
+        if speech < self.min_speech_frames:
+            return None
+        # Keep no more trailing silence than the pre-roll before it.
+        keep = len(frames) - max(0, silent - self._pre_roll.maxlen)
+        segment = (self.index, self._start / self.sample_rate, np.concatenate(frames[:keep]))
+        self.index += 1
+        return segment
+
+    def feed(self, audio: np.ndarray):
+        """Adds float32 samples; returns the utterances they finished as (index, start seconds, audio)."""
+        if self._pending.size:
+            audio = np.concatenate([self._pending, audio])
+        count = len(audio) // self.frame
+        # Copied so a held frame doesn't keep the whole input buffer alive.
+        self._pending = audio[count * self.frame:].copy()
+        framed = audio[:count * self.frame].reshape(count, self.frame)
+        levels = frame_levels(framed.reshape(-1), self.sample_rate, self.frame_ms)
+
+        finished = []
+        for frame, level in zip(framed, levels):
+            position = self.position
+            self.position += self.frame
+            speech = self._is_speech(level)
+            if not self._frames:
+                if speech:
+                    self._start = position - len(self._pre_roll) * self.frame
+                    self._frames = list(self._pre_roll) + [frame]
+                    self._speech = 1
+                    self._pre_roll.clear()
+                else:
+                    self._pre_roll.append(frame)
+                continue
+            self._frames.append(frame)
+            if speech:
+                self._speech += 1
+                self._silent = 0
+            else:
+                self._silent += 1
+            if self._silent >= self.silence_frames or len(self._frames) >= self.max_frames:
+                segment = self._finish()
+                if segment is not None:
+                    finished.append(segment)
+        return finished
+
+    def feed_pcm(self, pcm: bytes):
+        """feed() for 16-bit little-endian PCM, which may arrive split mid-sample."""
+        pcm = self._odd_byte + pcm
+        usable = len(pcm) - len(pcm) % 2
+        self._odd_byte = pcm[usable:]
+        return self.feed(np.frombuffer(pcm[:usable], dtype="<i2").astype(np.float32) / 32768.0)
+
+    def flush(self):
+        """Ends the stream; returns the utterance in progress, if any."""
+        return self._finish() if self._frames else None
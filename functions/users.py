@@ -106,6 +106,16 @@ class UserManager:
             return [{**podcast_data, 'id': podcast_id} for podcast_id, podcast_data in podcasts_data.items()]
         return []
 
+    def all_podcasts(self):
+        """Podcasts of every user, read straight from the user files."""
+        podcasts = []
+        for entry in os.scandir(self.users_dir):
+            user_file = os.path.join(entry.path, "user_data.json")
+            if entry.is_dir() and os.path.exists(user_file):
+                with open(user_file, 'r') as f:
+                    podcasts.extend(json.load(f).get('podcasts', {}).values())
+        return podcasts
+
     def get_pdf_books(self, username):
         user_data = self.get_user_data(username)
         if user_data:
@@ -0,0 +1,148 @@
+import json
+import os
+import threading
+import time
+import wave
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+from config import COQUI_DIR, PIPER_DIR, KOKORO_DIR
+
+class Voice(BaseModel):
+    id: str
+    name: str
+    language: Optional[str] = None
+    sample_rate: Optional[int] = None
+    size_bytes: Optional[int] = None
+    quality: Optional[str] = None
+
+# Seconds between directory mtime checks.
+CHECK_INTERVAL = 1.0
+
+# Kokoro voice ids start with a letter for their language.
+KOKORO_LANGUAGES = {
+    "a": "en-US", "b": "en-GB", "e": "es", "f": "fr", "h": "hi",
+    "i": "it", "j": "ja", "p": "pt-BR", "z": "zh",
+}
+
+# Kitten doesn't need model files. And currently
+# has a limited selection of voices.
+KITTEN_VOICES = [
+    "expr-voice-2-m",
+    "expr-voice-2-f",
+    "expr-voice-3-m",
+    "expr-voice-3-f",
+    "expr-voice-4-m",
+    "expr-voice-4-f",
+    "expr-voice-5-m",
+    "expr-voice-5-f",
+]
+
+def _piper_voice(directory: str, file_name: str) -> Voice:
+    voice_id = file_name[:-len(".onnx")]
+    path = os.path.join(directory, file_name)
+    language = sample_rate = quality = None
+    # Piper ships each model with a config describing it.
+    try:
+        with open(f"{path}.json", encoding="utf-8") as f:
+            model_config = json.load(f)
+        language = model_config.get("language", {}).get("code")
+        sample_rate = model_config.get("audio", {}).get("sample_rate")
+        quality = model_config.get("audio", {}).get("quality")
+    except (OSError, ValueError):
+        pass
+    return Voice(id=voice_id, name=f"Piper: {voice_id}", language=language, sample_rate=sample_rate, size_bytes=os.path.getsize(path), quality=quality)
+
+def _kokoro_voice(directory: str, file_name: str) -> Voice:
+    voice_id = file_name[:-len(".pt")]
+    return Voice(id=voice_id, name=f"Kokoro: {voice_id}", language=KOKORO_LANGUAGES.get(voice_id[:1]), sample_rate=24000, size_bytes=os.path.getsize(os.path.join(directory, file_name)))
+
+def _coqui_voice(directory: str, file_name: str) -> Voice:
+    voice_id = file_name[:-len(".wav")]
+    path = os.path.join(directory, file_name)
+    sample_rate = None
+    try:
+        with wave.open(path, "rb") as f:
+            sample_rate = f.getframerate()
+    except (wave.Error, EOFError, OSError):
+        pass
+    return Voice(id=voice_id, name=f"Coqui: {voice_id}", sample_rate=sample_rate, size_bytes=os.path.getsize(path))
+
+class VoiceRegistry:
+    """
+    Installed voices per engine, scanned once and kept in memory.
+
+    A model directory is rescanned only when its mtime changes (checked at
+    most every CHECK_INTERVAL seconds), which happens whenever a voice file is
+    added, removed or renamed. Listing and lookups are served from memory.
+    """
+
+    # engine: (directory, file extension, builder)
+    SOURCES = {
+        "piper": (PIPER_DIR, ".onnx", _piper_voice),
+        "kokoro": (KOKORO_DIR, ".pt", _kokoro_voice),
+        "coqui": (COQUI_DIR, ".wav", _coqui_voice),
+    }
+
+    def __init__(self):
+        self._voices: Dict[str, List[Voice]] = {}
+        self._by_id: Dict[str, Dict[str, Voice]] = {}
+        self._mtimes: Dict[str, Optional[int]] = {}
+        self._checked: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        # Bumped on every rescan that found a change, so derived data can be cached too.
+        self.version = 0
+        kitten = [Voice(id=v, name=f"Kitten: {v}", language="en-US", sample_rate=24000) for v in KITTEN_VOICES]
+        self._set("kitten", kitten)
+
+    def _set(self, engine: str, voices: List[Voice]):
+        self._voices[engine] = voices
+        self._by_id[engine] = {v.id: v for v in voices}
+        self.version += 1
+
+    def _refresh(self, engine: str):
+        if engine not in self.SOURCES:
+            return
+        now = time.monotonic()
+        if now - self._checked.get(engine, 0) < CHECK_INTERVAL and engine in self._voices:
+            return
+        directory, extension, build = self.SOURCES[engine]
+        with self._lock:
+            self._checked[engine] = now
+            try:
+                mtime = os.stat(directory).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            if engine in self._voices and self._mtimes.get(engine) == mtime:
+                return
+
+            voices = []
+            if mtime is not None:
+                for file_name in sorted(os.listdir(directory)):
+                    if file_name.endswith(extension) and not file_name.startswith("."):
+                        try:
+                            voices.append(build(directory, file_name))
+                        except OSError:
+                            # Removed while scanning; the next change rescans.
+                            pass
+            self._mtimes[engine] = mtime
+            self._set(engine, voices)
+
+    def voices(self, engine: str) -> List[Voice]:
+        self._refresh(engine)
+        return self._voices.get(engine, [])
+
+    def get(self, engine: str, voice_id: str) -> Optional[Voice]:
+        self._refresh(engine)
+        return self._by_id.get(engine, {}).get(voice_id)
+
+    def invalidate(self, engine: str = None):
+        """Forces a rescan, e.g. right after a download wrote into a directory."""
+        with self._lock:
+            for name in ([engine] if engine else list(self.SOURCES)):
+                self._mtimes.pop(name, None)
+                self._checked.pop(name, None)
+
+# Shared registry for every voice listing.
+voice_registry = VoiceRegistry()
@@ -0,0 +1,62 @@
+import threading
+import time
+
+from functions.jobs import synthesis_scheduler, PRIORITY_BACKGROUND
+
+def parse_preload(spec: str):
+    """Parses "engine:voice,engine:voice" into [(engine, voice), ...]."""
+    targets = []
+    for item in (spec or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        engine, _, voice = item.partition(":")
+        if not engine or not voice:
+            raise ValueError(f"Expected engine:voice, got '{item}'")
+        targets.append((engine, voice))
+    return targets
+
+class Warmup:
+    """
+    Loads chosen engines and voices in the background after startup.
+
+    Each target runs as a background-priority job on its engine's queue, so
+    the server accepts requests immediately and real requests for the same
+    engine go first. status() reports progress for the /ready endpoint.
+    """
+
+    def __init__(self):
+        self._targets = []
+        self._lock = threading.Lock()
+
+    def start(self, targets, warm):
+        """Queues `warm(engine, voice)` for each target."""
+        for engine, voice in targets:
+            target = {"engine": engine, "voice": voice, "status": "pending", "seconds": None, "error": None}
+            with self._lock:
+                self._targets.append(target)
+            synthesis_scheduler.submit(engine, self._run, target, warm, priority=PRIORITY_BACKGROUND, key=f"warmup:{engine}:{voice}")
+
+    def _run(self, target, warm):
+        with self._lock:
+            target["status"] = "loading"
+        start = time.perf_counter()
+        try:
+            warm(target["engine"], target["voice"])
+            status, error = "ready", None
+        except Exception as e:
+            status, error = "failed", str(getattr(e, "detail", None) or e)
+            print(f"Warm-up of {target['engine']}:{target['voice']} failed: {error}")
+        with self._lock:
+            target.update(status=status, error=error, seconds=round(time.perf_counter() - start, 3))
+
+    def status(self):
+        with self._lock:
+            targets = [dict(t) for t in self._targets]
+        return {
+            "ready": all(t["status"] in ("ready", "failed") for t in targets),
+            "targets": targets,
+        }
+
+# Shared warm-up state, started once at server startup.
+warmup = Warmup()
@@ -24,6 +24,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const cacheSizeDisplay = document.getElementById('cache-size-display');
     const chunkSizeSlider = document.getElementById('chunk-size-slider');
     const chunkSizeDisplay = document.getElementById('chunk-size-display');
+    const audioFormatSelect = document.getElementById('audio-format-select');
 
     const downloadStatus = document.getElementById('download-status');
     const googleVoiceInput = document.getElementById('google-voice');
@@ -170,6 +171,8 @@ document.addEventListener('DOMContentLoaded', () => {
             chunkSizeDisplay.textContent = prefs.chunkSize;
         }
 
+        audioFormatSelect.value = prefs.audioFormat || '';
+
         prefs.accessibleFontEnabled = accessibleFontCheckbox.checked || false;
         prefs.accessibleFontUIEnabled = accessibleFontUICheckbox.checked || false;
 
@@ -218,6 +221,13 @@ document.addEventListener('DOMContentLoaded', () => {
 
     });
 
+    audioFormatSelect.addEventListener('change', () => {
+
+        prefs.audioFormat = audioFormatSelect.value || null;
+        handlePrefs(prefs);
+
+    });
+
     const apiKeyContainer = document.getElementById('explanation-container');
     apiKeyContainer.style.display = 'none';
 
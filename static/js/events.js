@@ -0,0 +1,110 @@
+/**
+ * -- events.js
+ * --
+ * -- Single shared connection to the server's /api/events stream, which
+ * -- pushes `synthesis`, `ocr` and `podcast` job completions.
+ *
+ */
+
+// Identifies this tab to the server, which only announces the jobs it asked for.
+export const clientId = (typeof crypto !== 'undefined' && crypto.randomUUID)
+    ? crypto.randomUUID()
+    : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+const listeners = new Set();
+// Recent events, so a job that finishes before anyone waits on it isn't missed.
+const recentEvents = [];
+const RECENT_EVENTS_KEPT = 500;
+let eventSource = null;
+// Logged-in user whose podcast events the stream also carries.
+let eventUser = null;
+
+/**
+ * Headers that tie a request's jobs to this tab's event stream.
+ * @returns {object}
+ */
+export function clientHeaders() {
+    return { 'X-Client-Id': clientId };
+}
+
+/**
+ * Opens the event stream if it isn't already open.
+ * @returns {boolean} Whether server events are available in this browser.
+ */
+export function connectServerEvents() {
+    if (typeof EventSource === 'undefined') return false;
+    if (eventSource) return true;
+
+    const params = new URLSearchParams({ client: clientId });
+    if (eventUser) params.set('user', eventUser);
+    eventSource = new EventSource(`/api/events?${params}`);
+
+    for (const type of ['synthesis', 'ocr', 'podcast']) {
+        eventSource.addEventListener(type, (message) => {
+            let event;
+            try {
+                event = JSON.parse(message.data);
+            } catch (error) {
+                console.warn('Ignoring malformed server event:', message.data);
+                return;
+            }
+            recentEvents.push(event);
+            if (recentEvents.length > RECENT_EVENTS_KEPT) recentEvents.shift();
+            listeners.forEach(listener => listener(event));
+        });
+    }
+
+    eventSource.onerror = () => {
+        // EventSource reconnects by itself, just note it.
+        console.debug('Server event stream interrupted, reconnecting...');
+    };
+
+    return true;
+}
+
+/**
+ * Sets the user whose podcast events to receive, reconnecting if it changed.
+ * @param {string|null} username The logged-in user, or null after logout.
+ */
+export function setServerEventsUser(username) {
+    if (eventUser === username) return;
+    eventUser = username;
+    if (eventSource) {
+        eventSource.close();
+        eventSource = null;
+        connectServerEvents();
+    }
+}
+
+/**
+ * Calls back for every server event.
+ * @param {function} listener Receives the parsed event object.
+ * @returns {function} Call to unsubscribe.
+ */
+export function onServerEvent(listener) {
+    connectServerEvents();
+    listeners.add(listener);
+    return () => listeners.delete(listener);
+}
+
+/**
+ * Resolves with the first event (recent or future) matching a predicate.
+ * @param {function} predicate Tests an event object.
+ * @returns {{promise: Promise<object>, cancel: function}} The pending event and a way to stop waiting.
+ */
+export function waitForServerEvent(predicate) {
+    let unsubscribe = () => {};
+    const promise = new Promise((resolve) => {
+        const recent = recentEvents.find(predicate);
+        if (recent) {
+            resolve(recent);
+            return;
+        }
+        unsubscribe = onServerEvent((event) => {
+            if (predicate(event)) {
+                unsubscribe();
+                resolve(event);
+            }
+        });
+    });
+    return { promise, cancel: () => unsubscribe() };
+}
@@ -10,7 +10,10 @@
 import { getPodcasts, generatePodcast, deletePodcast } from './podcast.js';
 
 // Import Speech Generation functions
-import { generateSpeech } from "./speechGen.js";
+import { generateSpeech, startReadingSession, generateSessionChunk, updateReadingPosition, endReadingSession } from "./speechGen.js";
+
+// Import server event stream
+import { clientHeaders, connectServerEvents, onServerEvent, setServerEventsUser, waitForServerEvent } from "./events.js";
 
 // Import helpers
 import {
@@ -154,6 +157,8 @@ document.addEventListener('DOMContentLoaded', () => {
             isPaused: false,
             allTextChunks: [],
             currentChunkIndex: 0,
+            readingSession: null, // Promise of the server-side read-ahead session id
+            synthesisSpeed: 1, // Speed the engine renders the current page at
             localPrefs: handlePrefs(),
             pdfTextContent: {},
 
@@ -930,6 +935,12 @@ document.addEventListener('DOMContentLoaded', () => {
         const currentAudio = appState.variables.audioQueue[appState.variables.currentChunkIndex];
         updateTextChunkReader(appState);
 
+        // Let the server move its read-ahead window along with playback.
+        const playingIndex = appState.variables.currentChunkIndex;
+        appState.variables.readingSession?.then(sessionId => {
+            if (sessionId) updateReadingPosition(sessionId, playingIndex);
+        });
+
         if (appState.variables.pdfDoc)
         await highlightPdfChunk(currentAudio.text);
         else {
@@ -942,7 +953,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
         appState.elements.audioPlayer.src = currentAudio.url;
         appState.elements.downloadAudioBtn.href = currentAudio.url;
-        appState.elements.audioPlayer.playbackRate = appState.elements.playbackSpeed.value;
+        appState.elements.audioPlayer.playbackRate = appState.elements.playbackSpeed.value / (currentAudio.speed || 1);
         
         // Add a retry counter to currentAudio object if it doesn't exist
         if (typeof currentAudio.retries === 'undefined') {
@@ -997,7 +1008,16 @@ document.addEventListener('DOMContentLoaded', () => {
         };
     }
 
+    function closeReadingSession() {
+        const session = appState.variables.readingSession;
+        appState.variables.readingSession = null;
+        session?.then(sessionId => {
+            if (sessionId) endReadingSession(sessionId);
+        });
+    }
+
     function stopAudioQueue() {
+        closeReadingSession();
         appState.variables.currentReadingPage = null;
         appState.variables.currentChunkIndex = 0;
         appState.elements.currentChunk.classList.add('hidden');
@@ -1099,6 +1119,20 @@ document.addEventListener('DOMContentLoaded', () => {
         appState.elements.speechToTextSection.classList.add('hidden');
         appState.variables.audioQueue = [];      
 
+        // The engine renders at the chosen speed; playbackRate only covers later changes.
+        appState.variables.synthesisSpeed = parseFloat(appState.elements.playbackSpeed.value) || 1;
+
+        // Hand the page's chunks to the server so it can synthesize ahead of playback.
+        closeReadingSession();
+        appState.variables.readingSession = startReadingSession(
+            appState.variables.allTextChunks.map(chunk => chunk.text.replaceAll('\n', ' ')),
+            appState.variables.bookDetectedLang,
+            appState.elements.engineSelect.value,
+            appState.elements.voiceSelect.value,
+            0,
+            appState.variables.synthesisSpeed
+        );
+
         const initialBufferSize = Math.min(3, appState.variables.allTextChunks.length);
         for (let i = 0; i < initialBufferSize; i++) {
             processAndQueueChunk(i);
@@ -1118,10 +1152,17 @@ document.addEventListener('DOMContentLoaded', () => {
 
         const chunk = appState.variables.allTextChunks[chunkIndex];
         let cleanedChunk = chunk.text.replaceAll('\n', ' '); // Clean new lines
+        const speed = appState.variables.synthesisSpeed || 1;
         
-        generateSpeech(cleanedChunk, appState.variables.bookDetectedLang, appState.elements.engineSelect.value, appState.elements.voiceSelect.value).then(audioUrl => {
+        // Prefer the reading session, fall back to a standalone request without one.
+        const session = appState.variables.readingSession || Promise.resolve(null);
+        session
+            .then(sessionId => sessionId ? generateSessionChunk(sessionId, chunkIndex) : null)
+            .then(audioUrl => audioUrl !== null ? audioUrl :
+                generateSpeech(cleanedChunk, appState.variables.bookDetectedLang, appState.elements.engineSelect.value, appState.elements.voiceSelect.value, speed))
+            .then(audioUrl => {
             if (audioUrl) {
-                appState.variables.audioQueue[chunkIndex] = { url: audioUrl, text: chunk };
+                appState.variables.audioQueue[chunkIndex] = { url: audioUrl, text: chunk, speed };
                 // If playback isn't running and this is the chunk we're waiting for, start playing.
                 if (!appState.variables.isPlaying && chunkIndex === appState.variables.currentChunkIndex)
                 playAudioQueue();
@@ -1422,7 +1463,9 @@ document.addEventListener('DOMContentLoaded', () => {
     });
 
     appState.elements.playbackSpeed.addEventListener('input', () => {
-        appState.elements.audioPlayer.playbackRate = appState.elements.playbackSpeed.value;
+        // Audio already rendered at another speed is adjusted in the browser.
+        const renderedSpeed = appState.variables.audioQueue[appState.variables.currentChunkIndex]?.speed || 1;
+        appState.elements.audioPlayer.playbackRate = appState.elements.playbackSpeed.value / renderedSpeed;
         appState.elements.playbackSpeedDisplay.textContent = appState.elements.playbackSpeed.value.toString() + "x";
     });
 
@@ -1494,17 +1537,22 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     function pollOcrResult(taskId, bookId = null) {
-        const interval = setInterval(async () => {
+        let finished = false;
+        let interval = null;
+        // Length of the partial OCR text shown so far.
+        let shownLength = 0;
+
+        const checkOcrResult = async () => {
+            if (finished) return;
             try {
-                const response = await fetch(`/api/ocr_result/${taskId}`);
+                const response = await fetch(`/api/ocr_result/${taskId}`, { headers: clientHeaders() });
                 if (!response.ok) {
-                    clearInterval(interval);
                     throw new Error('Failed to get OCR status.');
                 }
                 const data = await response.json();
     
                 if (data.status === 'completed') {
-                    clearInterval(interval);
+                    stopWaiting();
                     showNotification('PDF OCR completed successfully.', 'success');
 
                     if (bookId && currentUser) {
@@ -1519,6 +1567,7 @@ document.addEventListener('DOMContentLoaded', () => {
                         }
                     } else {
                         // Anonymous user flow
+                        appState.variables.fullBookText = data.text;
                         if (appState.variables.activeBook?.source === 'local') {
                             appState.variables.localBooks[appState.variables.activeBook.id].text = appState.variables.fullBookText;
                             saveLocalBooks(appState);
@@ -1527,24 +1576,44 @@ document.addEventListener('DOMContentLoaded', () => {
                     }
     
                 } else if (data.status === 'failed') {
-                    clearInterval(interval);
+                    stopWaiting();
                     console.error('OCR failed:', data.detail);
                     showBookModal(`OCR failed: ${data.detail}`, 'error');
     
-                } else console.log('OCR in progress...');
+                } else {
+                    // Pages are recognized in order; show what's done so reading can start.
+                    if (data.text && data.text.length > shownLength) {
+                        appState.variables.fullBookText = data.text;
+                        appState.variables.totalTextPages = Math.max(1, Math.ceil(data.text.length / appState.variables.charsPerPage));
+                        if (shownLength === 0) renderTextPage(1);
+                        shownLength = data.text.length;
+                    }
+                    console.log(`OCR in progress: ${data.pages_done} of ${data.ocr_pages} pages`);
+                }
             } catch (error) {
-                clearInterval(interval);
+                stopWaiting();
                 console.error('Error polling for OCR result:', error);
                 showNotification(`An error occurred while checking OCR status: ${error.message}`, 'error');
             }
-        }, 2000); // Poll every 2 seconds
+        };
+
+        // The server pushes an event when OCR finishes; polling is only a slow safety net.
+        const pending = waitForServerEvent(event => event.type === 'ocr' && event.task_id === taskId);
+        const stopWaiting = () => {
+            finished = true;
+            clearInterval(interval);
+            pending.cancel();
+        };
+
+        pending.promise.then(checkOcrResult);
+        interval = setInterval(checkOcrResult, connectServerEvents() ? 10000 : 2000);
     }
 
     async function handlePdfUpload(file, bookId = null) {
         try {
             const formData = new FormData();
             formData.append('file', file);
-            const response = await fetch('/api/read_pdf', { method: 'POST', body: formData });
+            const response = await fetch('/api/read_pdf', { method: 'POST', body: formData, headers: clientHeaders() });
             if (!response.ok) {
                 const errorData = await response.json();
                 throw new Error(errorData.detail || 'Failed to read PDF.');
@@ -1563,7 +1632,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 appState.variables.totalTextPages = Math.max(1, Math.ceil(appState.variables.fullBookText.length / appState.variables.charsPerPage));
                 renderTextPage(1);
             } else if (data.status === 'ocr_started') {
-                showNotification('PDF contains no text. Starting background OCR...', 'info');
+                showNotification(`${data.ocr_pages} of ${data.page_count} PDF pages contain no text. Starting background OCR...`, 'info');
                 pollOcrResult(data.task_id, bookId);
             } else {
                 throw new Error('Received an unexpected response from the server.');
@@ -1992,6 +2061,7 @@ document.addEventListener('DOMContentLoaded', () => {
             const data = await response.json();
             appState.variables.currentUser = data.username;
             sessionStorage.setItem('currentUser', appState.variables.currentUser);
+            setServerEventsUser(appState.variables.currentUser);
             updateCurrentUserUI(appState);
             hideLoginModal();
             showNotification('Login successful!', 'success');
@@ -2005,6 +2075,7 @@ document.addEventListener('DOMContentLoaded', () => {
     function handleLogout() {
         appState.variables.currentUser = null;
         sessionStorage.removeItem('currentUser');
+        setServerEventsUser(null);
         appState.variables.onlineBooks = [];
         appState.variables.onlinePodcasts = [];
         renderOnlineBooks();
@@ -2593,10 +2664,19 @@ document.addEventListener('DOMContentLoaded', () => {
 
     if (savedUser) {
         appState.variables.currentUser = savedUser;
+        setServerEventsUser(savedUser);
         updateCurrentUserUI(appState);
         fetchAndRenderOnlineBooks();
         fetchAndRenderPodcasts();
     }
+
+    // Refresh the podcast list as soon as one of ours finishes.
+    onServerEvent(event => {
+        if (event.type !== 'podcast' || !appState.variables.currentUser) return;
+        if (appState.variables.onlinePodcasts.some(podcast => podcast.id === event.podcast_id)) {
+            fetchAndRenderPodcasts();
+        }
+    });
     
     setBodyFont();
     renderNotifications(appState);
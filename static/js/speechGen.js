@@ -1,3 +1,59 @@
+import { clientHeaders, connectServerEvents, waitForServerEvent } from './events.js';
+import { handlePrefs } from './helpers.js';
+
+// Safety-net polling interval, for events missed while the stream reconnects.
+const FALLBACK_POLL_MS = 10000;
+// Polling interval when the browser has no EventSource support.
+const POLL_MS = 2000;
+
+/**
+ * Checks whether a generated audio file has been published.
+ * @param {string} audioUrl URL returned by the API.
+ * @returns {Promise<boolean>}
+ */
+async function isAudioReady(audioUrl) {
+    try {
+        const headResponse = await fetch(audioUrl, { method: 'HEAD' });
+        return headResponse.status == 200;
+    } catch (error) {
+        // Network error, keep waiting, but log it for debugging
+        console.warn('Checking audio file, network error:', error);
+        return false;
+    }
+}
+
+/**
+ * Waits until the server announces that an audio file is ready.
+ * @param {string} audioUrl URL returned by the API.
+ * @param {string} jobId Job rendering it, so stale events for the same URL are ignored.
+ * @returns {Promise<string|false>} The URL, or false if generation failed.
+ */
+function waitForAudio(audioUrl, jobId) {
+    const hasEvents = connectServerEvents();
+    const pending = waitForServerEvent(event => event.type === 'synthesis' && event.job_id === jobId);
+
+    return new Promise((resolve) => {
+        let poll = null;
+        const finish = (result) => {
+            clearInterval(poll);
+            pending.cancel();
+            resolve(result);
+        };
+
+        pending.promise.then(event => {
+            if (event.status === 'ready') finish(audioUrl);
+            else {
+                console.error('Speech generation failed:', event.detail);
+                finish(false);
+            }
+        });
+
+        poll = setInterval(async () => {
+            if (await isAudioReady(audioUrl)) finish(audioUrl);
+        }, hasEvents ? FALLBACK_POLL_MS : POLL_MS);
+    });
+}
+
 /**
  * Call the API to generate a chunk of text using a selected TTS engine and voice.
  * It is recommended to be careful with this function and audio chunking, as it is
@@ -6,9 +62,10 @@
  * @param {string} [lang] ISO language code.
  * @param {string} engine Available engines: gemini, piper, kokoro, kitten, coqui.
  * @param {string} voice This must be previously adquired from the API.
+ * @param {number} [speed] Speaking rate the engine renders at.
  * @returns 
  */
-export async function generateSpeech(textChunk, lang='en', engine, voice) {
+export async function generateSpeech(textChunk, lang='en', engine, voice, speed = 1) {
 
     if (!textChunk) return false;
     if (!voice) return false;
@@ -19,8 +76,14 @@ export async function generateSpeech(textChunk, lang='en', engine, voice) {
         if (!apiKey) return false
     }
 
+    // Subscribe before requesting, so a fast render's event isn't missed.
+    connectServerEvents();
+
     try {
-        const requestBody = { engine, lang, voice, text: textChunk };
+        const requestBody = { engine, lang, voice, text: textChunk, speed };
+        // Unset means the server's default format.
+        const format = handlePrefs('audioFormat');
+        if (format) requestBody.format = format;
 
         console.debug('Generating request: ', requestBody);        
 
@@ -30,6 +93,7 @@ export async function generateSpeech(textChunk, lang='en', engine, voice) {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
+                ...clientHeaders(),
             },
             body: JSON.stringify(requestBody),
         });
@@ -42,22 +106,7 @@ export async function generateSpeech(textChunk, lang='en', engine, voice) {
         const data = await response.json();
 
         if (data.status === 'generating') {
-            // Poll the audio URL until it's ready
-            return new Promise((resolve, reject) => {
-                const poll = setInterval(async () => {
-                    try {
-                        const headResponse = await fetch(data.audio_url, { method: 'HEAD' });
-                        // We need exactly 200, otherwise we get 206 partial content and skip over text.
-                        if (headResponse.status == 200) {
-                            clearInterval(poll);
-                            resolve(data.audio_url);
-                        }
-                    } catch (error) {
-                        // Network error, keep polling, but log it for debugging
-                        console.warn('Polling for audio file, network error:', error);
-                    }
-                }, 2000); // Polling rate
-            });
+            return await waitForAudio(data.audio_url, data.job_id);
         } else {
             return data.audio_url;
         }
@@ -66,4 +115,94 @@ export async function generateSpeech(textChunk, lang='en', engine, voice) {
         console.error('Error generating speech:', error);
         return false;
     }
-}
\ No newline at end of file
+}
+/**
+ * Registers the chunks about to be read, so the server can synthesize ahead
+ * of the playback position instead of waiting for each request.
+ * @param {string[]} chunks Chunk texts, in reading order.
+ * @param {string} [lang] ISO language code.
+ * @param {string} engine TTS engine.
+ * @param {string} voice Voice for the engine.
+ * @param {int} [position] Chunk to start reading from.
+ * @param {number} [speed] Speaking rate the engine renders at.
+ * @returns {Promise<string|null>} The session id, or null if it couldn't be created.
+ */
+export async function startReadingSession(chunks, lang='en', engine, voice, position = 0, speed = 1) {
+    if (!chunks.length || !voice) return null;
+
+    const requestBody = { engine, lang, voice, chunks, position, speed };
+    const format = handlePrefs('audioFormat');
+    if (format) requestBody.format = format;
+    if (engine === 'gemini') {
+        const apiKey = localStorage.getItem('geminiApiKey');
+        if (!apiKey) return null;
+        requestBody.api_key = apiKey;
+    }
+
+    try {
+        const response = await fetch('/api/sessions', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                ...clientHeaders(),
+            },
+            body: JSON.stringify(requestBody),
+        });
+        if (!response.ok) throw new Error(`Server answered ${response.status}`);
+        const data = await response.json();
+        return data.session_id;
+    } catch (error) {
+        console.warn('Could not start a reading session, falling back to per-chunk requests:', error);
+        return null;
+    }
+}
+
+/**
+ * Gets the audio for one chunk of a reading session, waiting for it if needed.
+ * @param {string} sessionId Session returned by startReadingSession.
+ * @param {int} index Chunk index.
+ * @returns {Promise<string|false|null>} The audio URL, false on failure, or null if the session is gone.
+ */
+export async function generateSessionChunk(sessionId, index) {
+    connectServerEvents();
+
+    try {
+        const response = await fetch(`/api/sessions/${sessionId}/chunks/${index}`, { method: 'POST' });
+        if (response.status === 404) return null;
+        if (!response.ok) {
+            const errorData = await response.json();
+            throw new Error(errorData.detail || 'Failed to generate speech.');
+        }
+
+        const data = await response.json();
+        if (data.status === 'ready') return data.audio_url;
+        return await waitForAudio(data.audio_url, data.job_id);
+    } catch (error) {
+        console.error('Error generating session chunk:', error);
+        return false;
+    }
+}
+
+/**
+ * Tells the server where playback is, so it re-prioritizes its read-ahead.
+ * @param {string} sessionId Session returned by startReadingSession.
+ * @param {int} position Chunk index being played.
+ */
+export function updateReadingPosition(sessionId, position) {
+    fetch(`/api/sessions/${sessionId}`, {
+        method: 'PATCH',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ position }),
+    }).catch(error => console.warn('Failed to update reading position:', error));
+}
+
+/**
+ * Ends a reading session and cancels its pending read-ahead.
+ * @param {string} sessionId Session returned by startReadingSession.
+ */
+export function endReadingSession(sessionId) {
+    fetch(`/api/sessions/${sessionId}`, { method: 'DELETE' })
+        .catch(error => console.warn('Failed to close reading session:', error));
+}